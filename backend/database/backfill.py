@@ -0,0 +1,61 @@
+from sqlalchemy import text
+
+from services.dashboard import refresh_dashboard_snapshots
+
+
+def add_project_version_columns(conn):
+    """create_all не добавляет колонки в существующие таблицы — добавляем версию проекта вручную."""
+    conn.execute(text("ALTER TABLE projects ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 1"))
+    conn.execute(text("ALTER TABLE projects ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT timezone('utc', now())"))
+
+
+def backfill_keyword_states(conn):
+    """Заполняет keyword_states последней позицией каждого ключа, если таблица ещё пуста."""
+    conn.execute(text(
+        "INSERT INTO keyword_states (keyword_id, position, previous_position, frequency, cost, trend, checked_at) "
+        "SELECT DISTINCT ON (keyword_id) keyword_id, position, previous_position, frequency, cost, trend, checked_at "
+        "FROM positions "
+        "WHERE keyword_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM keyword_states) "
+        "ORDER BY keyword_id, checked_at DESC "
+        "ON CONFLICT (keyword_id) DO NOTHING"
+    ))
+
+
+def backfill_keyword_rollups(conn):
+    """Строит дневные и двухнедельные сводки из истории positions, если они ещё пусты."""
+    conn.execute(text(
+        "INSERT INTO keyword_daily_stats (keyword_id, day, bucket, cost) "
+        "SELECT DISTINCT ON (keyword_id, checked_at::date) keyword_id, checked_at::date, "
+        "CASE WHEN position BETWEEN 1 AND 3 THEN 3 "
+        "WHEN position BETWEEN 4 AND 5 THEN 5 "
+        "WHEN position BETWEEN 6 AND 10 THEN 10 END, "
+        "cost "
+        "FROM positions "
+        "WHERE keyword_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM keyword_daily_stats) "
+        "ORDER BY keyword_id, checked_at::date, checked_at DESC "
+        "ON CONFLICT DO NOTHING"
+    ))
+    conn.execute(text(
+        "INSERT INTO keyword_interval_stats "
+        "(keyword_id, interval_start, days_top3, days_top5, days_top10, cost) "
+        "SELECT d.keyword_id, "
+        "pr.created_at::date + (floor((d.day - pr.created_at::date) / 14.0) * 14)::int AS interval_start, "
+        "count(*) FILTER (WHERE d.bucket = 3), "
+        "count(*) FILTER (WHERE d.bucket = 5), "
+        "count(*) FILTER (WHERE d.bucket = 10), "
+        "coalesce(sum(d.cost), 0) "
+        "FROM keyword_daily_stats d "
+        "JOIN keywords k ON k.id = d.keyword_id "
+        "JOIN groups g ON g.id = k.group_id "
+        "JOIN projects pr ON pr.id = g.project_id "
+        "WHERE NOT EXISTS (SELECT 1 FROM keyword_interval_stats) "
+        "GROUP BY d.keyword_id, interval_start "
+        "ON CONFLICT DO NOTHING"
+    ))
+
+
+def backfill_dashboard_snapshots(conn):
+    """Строит снимки дашборда для всех проектов, если таблица ещё пуста."""
+    if conn.execute(text("SELECT EXISTS (SELECT 1 FROM dashboard_snapshots)")).scalar():
+        return
+    refresh_dashboard_snapshots(conn)
@@ -1,11 +1,14 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, declared_attr
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession
+import logging
 import os
+import time
 from dotenv import load_dotenv
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 load_dotenv()
 
@@ -19,8 +22,26 @@ DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT
 engine = create_async_engine(DATABASE_URL, echo=True)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+# Необязательная реплика для тяжёлых отчётов (client_view, выгрузки, интервалы).
+# Если REPLICA_HOST не задан, чтение идёт с основной базы.
+REPLICA_HOST = os.getenv("REPLICA_HOST")
+REPLICA_PORT = os.getenv("REPLICA_PORT", DB_PORT)
+# Допустимое отставание реплики; при большем отставании отчёты читаются с основной базы
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+# Как часто перепроверять отставание реплики
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "10"))
+
+if REPLICA_HOST:
+    REPLICA_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{REPLICA_HOST}:{REPLICA_PORT}/{DB_NAME}"
+    read_engine = create_async_engine(REPLICA_DATABASE_URL, echo=True, pool_pre_ping=True)
+    read_session_maker = async_sessionmaker(read_engine, expire_on_commit=False)
+else:
+    REPLICA_DATABASE_URL = None
+    read_engine = None
+    read_session_maker = None
+
 # Для синхронного подключения
-DATABASE_URL_SYNC = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL_SYNC = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine_sync = create_engine(DATABASE_URL_SYNC)
 SyncSessionLocal = sessionmaker(engine_sync, expire_on_commit=False)
 
@@ -35,11 +56,24 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 
 async def create_tables():
+    from database.partitions import convert_positions_to_partitioned, ensure_position_partitions
+    from database.backfill import (backfill_keyword_states, backfill_keyword_rollups, add_project_version_columns,
+                                   backfill_dashboard_snapshots)
+
     print(f"DATABASE_URL: {DATABASE_URL}")
 
     async with engine.begin() as conn:
+        # Старая непартиционированная positions переносится до create_all
+        await conn.run_sync(convert_positions_to_partitioned)
+        # Нужно для триграммного индекса по домену проекта
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         # Создаёт все таблицы, описанные в Base.metadata
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_project_version_columns)
+        await conn.run_sync(ensure_position_partitions)
+        await conn.run_sync(backfill_keyword_states)
+        await conn.run_sync(backfill_keyword_rollups)
+        await conn.run_sync(backfill_dashboard_snapshots)
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -48,3 +82,54 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             yield session
         finally:
             await session.close()
+
+
+# Отставание реплики считаем по времени последней применённой транзакции.
+# Если всё полученное WAL уже применено, реплика актуальна независимо от возраста транзакции.
+REPLICA_LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_replica_status = {"checked_at": 0.0, "usable": False}
+
+
+async def replica_is_usable() -> bool:
+    """Результат проверки кешируется на REPLICA_LAG_CHECK_INTERVAL секунд."""
+    if read_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - _replica_status["checked_at"] < REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_status["usable"]
+
+    try:
+        async with read_engine.connect() as conn:
+            lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar() or 0)
+        usable = lag <= REPLICA_MAX_LAG_SECONDS
+        if not usable:
+            logging.warning(f"Replica lag {lag:.1f}s exceeds {REPLICA_MAX_LAG_SECONDS}s, reading from primary")
+    except Exception as e:
+        logging.error(f"Replica is unavailable, reading from primary: {e}")
+        usable = False
+
+    _replica_status.update(checked_at=now, usable=usable)
+    return usable
+
+
+@asynccontextmanager
+async def read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия только для чтения: реплика, если она настроена и не отстаёт, иначе основная база."""
+    session_maker = read_session_maker if await replica_is_usable() else async_session_maker
+    async with session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session() as session:
+        yield session
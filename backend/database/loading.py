@@ -0,0 +1,34 @@
+from sqlalchemy.orm import selectinload, noload, load_only
+
+from database.models import Project, Group, Keyword
+
+# Профили загрузки связанных объектов. Group.keywords по умолчанию не подгружается,
+# каждый эндпоинт явно выбирает нужный профиль.
+
+
+def project_summary():
+    """Проект с группами без ключевых слов (удаление, архивация, списки id)."""
+    return selectinload(Project.groups).noload(Group.keywords)
+
+
+def project_detail():
+    """Проект с группами и ключевыми словами; последнее состояние ключа подтягивается join-ом."""
+    return selectinload(Project.groups).selectinload(Group.keywords)
+
+
+def group_detail():
+    """Группа с ключевыми словами и их последним состоянием."""
+    return selectinload(Group.keywords)
+
+
+def project_ingest():
+    """
+    Для снятия позиций: у ключей загружаются только текст, флаги и цены.
+    Keyword.state остаётся (lazy="joined") — он нужен для предыдущей позиции.
+    """
+    return selectinload(Project.groups).selectinload(Group.keywords).options(
+        load_only(
+            Keyword.id, Keyword.group_id, Keyword.keyword, Keyword.is_check, Keyword.priority,
+            Keyword.price_top_1_3, Keyword.price_top_4_5, Keyword.price_top_6_10,
+        )
+    )
@@ -1,9 +1,9 @@
 import enum
 import uuid
-from sqlalchemy import (Column, String, Integer, DateTime, ForeignKey, Enum,
-                        UniqueConstraint, Boolean, BigInteger, Text, JSON, Table)
+from sqlalchemy import (Column, String, Integer, DateTime, Date, ForeignKey, Enum,
+                        UniqueConstraint, Boolean, BigInteger, Text, JSON, Table, Index, func)
 from sqlalchemy.sql import desc
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database.db_init import Base
@@ -48,12 +48,49 @@ class Keyword(Base):
 
     positions = relationship("Position", back_populates="keyword")
     group = relationship("Group", back_populates="keywords")
-
+    # Последнее снятое состояние ключа, поддерживается задачей снятия позиций
+    state = relationship("KeywordState", uselist=False, lazy="joined", back_populates="keyword",
+                         cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         UniqueConstraint('group_id', 'keyword', name='uq_group_keyword'),
     )
 
+    # Поля текущего состояния для KeywordOut
+    @property
+    def currentPosition(self):
+        return self.state.position if self.state else None
+
+    @property
+    def previousPosition(self):
+        return self.state.previous_position if self.state else None
+
+    @property
+    def lastChecked(self):
+        return self.state.checked_at if self.state else None
+
+    @property
+    def cost(self):
+        return self.state.cost if self.state else 0
+
+    @property
+    def trend(self):
+        return self.state.trend if self.state else TrendEnum.stable
+
+
+class KeywordState(Base):
+    __tablename__ = "keyword_states"
+
+    keyword_id = Column(UUID(as_uuid=True), ForeignKey("keywords.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, nullable=True)
+    previous_position = Column(Integer, nullable=True)
+    frequency = Column(Integer, nullable=True)
+    cost = Column(Integer, default=0, nullable=False)
+    trend = Column(Enum(TrendEnum), default=TrendEnum.stable, nullable=False)
+    checked_at = Column(DateTime, nullable=True)
+
+    keyword = relationship("Keyword", back_populates="state")
+
 
 class Group(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -67,8 +104,8 @@ class Group(Base):
     project = relationship("Project", back_populates="groups")
     keywords = relationship("Keyword",
                             order_by=[desc(Keyword.priority), Keyword.keyword],
-                            lazy="selectin",
-                            back_populates="group", cascade="all, delete-orphan")
+                            back_populates="group", cascade="all, delete-orphan",
+                            passive_deletes=True)
 
     __table_args__ = (
         UniqueConstraint('project_id', 'title', 'region', name='uq_project_group_region'),
@@ -85,8 +122,12 @@ class Project(Base):
     client_link = Column(String, unique=True, nullable=False)
     topvisor_id = Column(BigInteger, unique=True, nullable=True)  # Topvisor ID
     owner = Column(String, nullable=False)
+    # Версия данных проекта: растёт при снятии позиций и при любых правках (для ETag)
+    version = Column(BigInteger, default=1, server_default="1", nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
 
-    groups = relationship("Group", back_populates="project", cascade="all, delete-orphan")
+    groups = relationship("Group", back_populates="project", cascade="all, delete-orphan",
+                          passive_deletes=True)
     users = relationship(
         "User",
         secondary=user_project_link,
@@ -94,6 +135,11 @@ class Project(Base):
     )
 
 
+# Триграммный индекс для поиска проектов по подстроке домена (расширение pg_trgm)
+Index("ix_projects_domain_trgm", Project.domain, postgresql_using="gin",
+      postgresql_ops={"domain": "gin_trgm_ops"})
+
+
 class Position(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     keyword_id = Column(
@@ -101,7 +147,8 @@ class Position(Base):
         ForeignKey("keywords.id", ondelete="SET NULL"),
         nullable=True
     )
-    checked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Ключ партиционирования должен входить в первичный ключ
+    checked_at = Column(DateTime, default=datetime.utcnow, nullable=False, primary_key=True)
     position = Column(Integer, nullable=True)
     frequency = Column(Integer, nullable=True)
     previous_position = Column(Integer, nullable=True)
@@ -110,6 +157,61 @@ class Position(Base):
 
     keyword = relationship("Keyword", back_populates="positions")
 
+    # Таблица партиционирована по месяцам, партиции создаёт database/partitions.py
+    __table_args__ = {"postgresql_partition_by": "RANGE (checked_at)"}
+
+
+# Индекс на партиционированной таблице автоматически создаётся в каждой партиции
+Index("ix_positions_keyword_id_checked_at", Position.keyword_id, Position.checked_at.desc())
+
+
+class PositionArchive(Base):
+    """
+    Архив старой истории: одна строка на ключ и месяц, значения дней упакованы в массивы
+    одинаковой длины (i-й элемент каждого массива относится к одной проверке).
+    """
+    __tablename__ = "position_archives"
+
+    keyword_id = Column(UUID(as_uuid=True), ForeignKey("keywords.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    checked_at = Column(ARRAY(DateTime), nullable=False)
+    positions = Column(ARRAY(Integer), nullable=False)
+    frequencies = Column(ARRAY(Integer), nullable=False)
+    previous_positions = Column(ARRAY(Integer), nullable=False)
+    costs = Column(ARRAY(Integer), nullable=False)
+    trends = Column(ARRAY(String), nullable=False)
+
+
+class KeywordDailyStat(Base):
+    """Дневная сводка по ключу: в какой топ попал (3, 5, 10 или None) и стоимость за день."""
+    __tablename__ = "keyword_daily_stats"
+
+    keyword_id = Column(UUID(as_uuid=True), ForeignKey("keywords.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    bucket = Column(Integer, nullable=True)
+    cost = Column(Integer, default=0, nullable=False)
+
+
+class KeywordIntervalStat(Base):
+    """Двухнедельный агрегат по ключу; интервалы отсчитываются от даты создания проекта."""
+    __tablename__ = "keyword_interval_stats"
+
+    keyword_id = Column(UUID(as_uuid=True), ForeignKey("keywords.id", ondelete="CASCADE"), primary_key=True)
+    interval_start = Column(Date, primary_key=True)
+    days_top3 = Column(Integer, default=0, nullable=False)
+    days_top5 = Column(Integer, default=0, nullable=False)
+    days_top10 = Column(Integer, default=0, nullable=False)
+    cost = Column(Integer, default=0, nullable=False)
+
+
+class DashboardSnapshot(Base):
+    """Готовая сводка проекта для дашборда; пересчитывается в конце каждого снятия позиций."""
+    __tablename__ = "dashboard_snapshots"
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    data = Column(JSON, nullable=False)
+    refreshed_at = Column(DateTime, nullable=False)
+
 
 class UserRole(str, enum.Enum):
     admin = "admin"
@@ -0,0 +1,89 @@
+import logging
+import os
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database.models import Position
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# На сколько месяцев вперёд заранее создаются партиции positions
+POSITIONS_PARTITIONS_AHEAD = int(os.getenv("POSITIONS_PARTITIONS_AHEAD", "3"))
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"positions_y{month.year}m{month.month:02d}"
+
+
+def create_month_partition(conn, month: date):
+    month = month_start(month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF positions "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_position_partitions(conn, start: date = None, end: date = None,
+                               months_ahead: int = POSITIONS_PARTITIONS_AHEAD):
+    """
+    Создаёт месячные партиции positions с месяца start по месяц end (включительно)
+    и на months_ahead месяцев вперёд от текущего. Вызов идемпотентен.
+    """
+    today = datetime.utcnow().date()
+    first = month_start(start or today)
+    last = max(month_start(end or today), add_months(month_start(today), months_ahead))
+
+    month = first
+    while month <= last:
+        create_month_partition(conn, month)
+        month = add_months(month, 1)
+
+    # Страховка для строк вне созданных диапазонов (например, импорт очень старой истории)
+    conn.execute(text("CREATE TABLE IF NOT EXISTS positions_default PARTITION OF positions DEFAULT"))
+
+
+def positions_relkind(conn):
+    # relkind имеет тип "char", asyncpg отдаёт его байтами — приводим к text
+    return conn.execute(text(
+        "SELECT c.relkind::text FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = 'positions' AND n.nspname = current_schema()"
+    )).scalar()
+
+
+def convert_positions_to_partitioned(conn):
+    """
+    Разовая миграция: обычная таблица positions переносится в партиционированную.
+    Старая таблица переименовывается, создаётся новая, данные копируются по месяцам.
+    """
+    if positions_relkind(conn) != "r":
+        return
+
+    logger.info("Converting positions table to a monthly partitioned table")
+    conn.execute(text("ALTER TABLE positions RENAME TO positions_legacy"))
+    conn.execute(text("ALTER TABLE positions_legacy RENAME CONSTRAINT positions_pkey TO positions_legacy_pkey"))
+
+    # Тип trendenum остаётся от старой таблицы, повторно его не создаём
+    Position.__table__.create(conn, checkfirst=True)
+
+    bounds = conn.execute(text("SELECT min(checked_at), max(checked_at) FROM positions_legacy")).one()
+    ensure_position_partitions(conn, start=bounds[0], end=bounds[1])
+
+    conn.execute(text(
+        "INSERT INTO positions (id, keyword_id, checked_at, position, frequency, previous_position, cost, trend) "
+        "SELECT id, keyword_id, checked_at, position, frequency, previous_position, cost, trend "
+        "FROM positions_legacy"
+    ))
+    conn.execute(text("DROP TABLE positions_legacy"))
@@ -1,6 +1,8 @@
 from fastapi import (FastAPI, Request, Depends, UploadFile, File,
                      Form, status)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from brotli_asgi import BrotliMiddleware
 
 from database.db_init import get_db, create_tables
 from routers.projects_router import router as projects_router
@@ -9,6 +11,7 @@ from routers.users_router import router as users_router
 
 from routers.auth_router import router as auth_router
 from routers.task_status_router import router as task_status_router
+from routers.dashboard_router import router as dashboard_router
 from database.models import Keyword, Project, Group, SearchEngineEnum
 from services.topvizor_utils import (import_keywords, add_searcher_region,
                                      get_region_key_index_static, add_searcher_to_project,
@@ -20,6 +23,7 @@ from sqlalchemy.orm import selectinload
 import aiohttp
 import logging
 import asyncio
+import os
 from uuid import uuid4
 
 logging.basicConfig(
@@ -29,7 +33,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="SEO Position parser")
+app = FastAPI(title="SEO Position parser", default_response_class=ORJSONResponse)
+
+# Ответы меньше порога не сжимаются; Excel-выгрузки уже сжаты (xlsx — zip)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
 
 origins = [
     "http://localhost:5173",
@@ -45,6 +52,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Partial-Response", "X-Next-Cursor", "ETag", "Last-Modified"],
+)
+
+# brotli для клиентов, которые его поддерживают, иначе gzip
+app.add_middleware(
+    BrotliMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    gzip_fallback=True,
+    excluded_handlers=[r"/positions/export", r"/stream$"],
 )
 
 app.include_router(projects_router, prefix="/api/projects", tags=["projects"])
@@ -52,6 +68,7 @@ app.include_router(groups_router, prefix="/api/groups", tags=["groups"])
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(task_status_router, prefix="/api/task-status", tags=["tasks"])
 app.include_router(users_router, prefix="/api/users", tags=["users"])
+app.include_router(dashboard_router, prefix="/api/dashboard", tags=["dashboard"])
 
 
 # Создание таблиц (запускайте один раз)
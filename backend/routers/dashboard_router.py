@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+import logging
+
+from database.db_init import get_read_db
+from database.models import DashboardSnapshot, Project, User, UserRole, user_project_link
+from routers.schemas import DashboardOut
+from services.auth_utils import get_current_user
+from services.dashboard import summarize_dashboard
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/", response_model=DashboardOut)
+async def get_dashboard(
+        db: AsyncSession = Depends(get_read_db),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Сводка по всему портфелю из готовых снимков dashboard_snapshots — одна выборка
+    по первичному ключу без пересчёта позиций.
+    """
+    try:
+        if current_user.role not in (UserRole.admin, UserRole.manager):
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        stmt = (
+            select(DashboardSnapshot.project_id, DashboardSnapshot.data, DashboardSnapshot.refreshed_at)
+            .join(Project, Project.id == DashboardSnapshot.project_id)
+            .order_by(Project.domain)
+        )
+        # Менеджер видит только свои проекты
+        if current_user.role == UserRole.manager:
+            stmt = stmt.join(user_project_link, user_project_link.c.project_id == DashboardSnapshot.project_id) \
+                .where(user_project_link.c.user_id == current_user.id)
+
+        rows = (await db.execute(stmt)).all()
+        return summarize_dashboard(rows)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to get dashboard: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Query, status, UploadFile, File, Request, Response
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, literal, Date, update, cast, exists, and_, or_, any_, union_all
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta, date
@@ -9,13 +12,16 @@ from io import BytesIO
 import pandas as pd
 import logging
 
-from database.db_init import get_db
-from database.models import Project, Keyword, Position, Group, SearchEngineEnum
+from database.db_init import get_db, get_read_db
+from database.loading import project_detail, group_detail
+from database.models import (Project, Keyword, Position, Group, SearchEngineEnum,
+                             KeywordDailyStat, KeywordIntervalStat, KeywordState)
 from routers.schemas import (ProjectCreate, ProjectUpdate, KeywordUpdate,
-                             ProjectOut, ClientProjectOut, PositionOut,
+                             ProjectOut, ClientProjectOut, PositionOut, PositionHistoryOut,
                              KeywordCreate, KeywordUpdate, KeywordOut,
                              IntervalSumOut, KeywordIntervals, GroupOut,
-                             GroupCreate, GroupUpdate)
+                             GroupCreate, GroupUpdate, KeywordBulkUpdate, KeywordBulkUpdateResult,
+                             KeywordPricesBulkUpdate)
 
 from services.topvizor_utils import (create_project_in_topvisor,
                                      add_or_update_keyword_topvisor,
@@ -26,6 +32,12 @@ from services.topvizor_utils import (create_project_in_topvisor,
                                      get_region_key_index_static,
                                      add_searcher_to_project,
                                      add_searcher_region)
+from services.rollups import INTERVAL_DAYS
+from services.project_version import (bump_project_version, bump_group_project_versions,
+                                      get_project_version, conditional_get)
+from services.api_utils import contains_pattern
+from services.keyword_prices import PRICE_COLUMNS, apply_keyword_prices, price_lists_from_frame
+from services.position_archive import positions_source
 from services.lk_seo_data import get_positions_lk_seo_korenev, get_positions_intervals_lk_seo_korenev
 import aiohttp
 import os
@@ -94,15 +106,14 @@ async def create_group(group_in: GroupCreate, db: AsyncSession = Depends(get_db)
                 raise HTTPException(status_code=500, detail="Ошибка добавления региона в Topvisor")
 
             db.add(group)
+            await bump_project_version(db, project_id=group_in.project_id)
             await db.commit()
             await db.refresh(group)
 
             # Загружаем полный проект с группами и ключевыми словами
             full_project_query = await db.execute(
                 select(Project)
-                .options(
-                    selectinload(Project.groups).selectinload(Group.keywords)
-                )
+                .options(project_detail())
                 .where(Project.id == group_in.project_id)
             )
             full_project = full_project_query.scalar_one_or_none()
@@ -135,7 +146,7 @@ async def update_group(
         if not group:
             raise HTTPException(status_code=404, detail="Group not found")
 
-        update_data = group_in.dict(exclude_unset=True, by_alias=False)
+        update_data = group_in.model_dump(exclude_unset=True, by_alias=False)
 
         # Флаг поменялось ли доменное имя проекта (domain) в родительском проекте нет, но search_engine, region или title - могут поменяться
         domain_of_project = None
@@ -201,13 +212,12 @@ async def update_group(
             for key, value in update_data.items():
                 setattr(group, key, value)
 
+            await bump_project_version(db, group_id=group_id)
             await db.commit()
             await db.refresh(group)
             full_project_query = await db.execute(
                 select(Project)
-                .options(
-                    selectinload(Project.groups).selectinload(Group.keywords)
-                )
+                .options(project_detail())
                 .where(Project.id == group.project_id)
             )
             full_project = full_project_query.scalar_one_or_none()
@@ -242,6 +252,7 @@ async def delete_group(group_id: UUID, db: AsyncSession = Depends(get_db)):
                 logging.error(f"Не удалось удалить проект Topvisor с ID {group.topvisor_id}: {e}")
                 raise HTTPException(status_code=500, detail="Ошибка удаления группы из Topvisor")
 
+        await bump_project_version(db, project_id=group.project_id)
         await db.delete(group)
         await db.commit()
         return
@@ -259,12 +270,10 @@ async def toggle_archive_group(
         db: AsyncSession = Depends(get_db)
 ):
     try:
-        # Загружаем группу с полным проектом
+        # Загружаем только саму группу с её ключевыми словами (они нужны в ответе)
         result = await db.execute(
             select(Group)
-            .options(
-                selectinload(Group.project).selectinload(Project.groups).selectinload(Group.keywords)
-            )
+            .options(group_detail())
             .where(Group.id == group_id)
         )
         group = result.scalar_one_or_none()
@@ -273,8 +282,8 @@ async def toggle_archive_group(
 
         # ✅ Toggle: переключаем статус архива
         group.is_archived = not group.is_archived
+        await bump_project_version(db, project_id=group.project_id)
         await db.commit()
-        await db.refresh(group)
 
         return group
 
@@ -293,7 +302,7 @@ async def get_group(
     try:
         result = await db.execute(
             select(Group)
-            .options(selectinload(Group.keywords))  # жёсткая загрузка ключевых слов
+            .options(group_detail())  # жёсткая загрузка ключевых слов
             .where(Group.id == group_id)
         )
         group = result.scalar_one_or_none()
@@ -355,10 +364,11 @@ async def create_keyword(group_id: UUID, keyword_in: KeywordCreate, db: AsyncSes
             is_check=True
         )
         db.add(new_keyword)
+        await bump_project_version(db, group_id=group_id)
         await db.commit()
         await db.refresh(new_keyword)
 
-        return new_keyword  # если используете pydantic-модели с orm_mode=True
+        return new_keyword  # KeywordOut строится из ORM-объекта (from_attributes=True)
 
     except HTTPException:
         raise
@@ -432,6 +442,7 @@ async def upload_keywords(
             inserted_keywords.append(new_keyword)
 
         # Коммитим все добавленные ключи
+        await bump_project_version(db, group_id=group_id)
         await db.commit()
 
         # Обновляем объекты, чтобы получить id и данные из базы
@@ -478,35 +489,19 @@ async def update_keywords_from_file(
         # Приводим имена колонок к нижнему регистру
         df.columns = map(str.lower, df.columns)
 
-        # Загружаем все ключевые слова из базы для этой группы в словарь для быстрого поиска
-        result = await db.execute(select(Keyword).where(Keyword.group_id == group_id))
-        keywords_in_db = {kw.keyword: kw for kw in result.scalars().all()}
-
-        updated_count = 0
-        for _, row in df.iterrows():
-            keyword_str = str(row["ключевое слово"]).strip()
-            if keyword_str not in keywords_in_db:
-                # Ключевое слово из файла отсутствует в группе - пропускаем
-                logging.info(f"Keyword '{keyword_str}' not in group {group_id}, skipping update.")
-                continue
-
-            # Берем объект ключевого слова из базы
-            keyword_db = keywords_in_db[keyword_str]
-
-            # Обновляем цены, если они указаны (иначе оставляем как есть)
-            price_top_1_3 = row.get("топ 3")
-            price_top_4_5 = row.get("топ 5")
-            price_top_6_10 = row.get("топ 10")
-
-            if pd.notna(price_top_1_3):
-                keyword_db.price_top_1_3 = price_top_1_3
-            if pd.notna(price_top_4_5):
-                keyword_db.price_top_4_5 = price_top_4_5
-            if pd.notna(price_top_6_10):
-                keyword_db.price_top_6_10 = price_top_6_10
-
-            updated_count += 1
-
+        # Цены собираются векторно и применяются одним UPDATE по тексту ключа в группе;
+        # ключи, которых нет в группе, просто не совпадут
+        keys, prices = price_lists_from_frame(df, "ключевое слово", {
+            "price_top_1_3": "топ 3",
+            "price_top_4_5": "топ 5",
+            "price_top_6_10": "топ 10",
+        })
+        # Возвращается group_id каждой обновлённой строки (здесь он один и тот же) — нужно только их число
+        updated_count = len(await apply_keyword_prices(db, keys, prices, by="keyword", group_id=group_id))
+        if updated_count < len(keys):
+            logging.info(f"{len(keys) - updated_count} keywords from file not found in group {group_id}, skipped")
+
+        await bump_project_version(db, group_id=group_id)
         await db.commit()
 
         return {"updated_count": updated_count}
@@ -541,7 +536,7 @@ async def update_keyword(
         old_group = keyword.group
         old_topvisor_id = old_group.topvisor_id if old_group else None
 
-        update_data = keyword_in.dict(exclude_unset=True, by_alias=False)
+        update_data = keyword_in.model_dump(exclude_unset=True, by_alias=False)
 
         # Обработка смены группы (если указана новая группа)
         new_group_id = update_data.get("group_id")
@@ -613,6 +608,7 @@ async def update_keyword(
         if new_keyword_text:
             keyword.keyword = new_keyword_text
 
+        await bump_project_version(db, group_id=group_id)
         await db.commit()
         await db.refresh(keyword)
 
@@ -650,6 +646,7 @@ async def delete_keyword(
         # Удаляем ключ в Topvisor - если неудача, выброс Exception и не меняем БД
         await delete_keyword_topvisor(keyword.group.topvisor_id, keyword.keyword)
 
+        await bump_project_version(db, group_id=group_id)
         await db.delete(keyword)
         await db.commit()
         return
@@ -662,19 +659,58 @@ async def delete_keyword(
 
 # --- Получение позиций с фильтром по периоду ---
 
-@router.get("/{group_id}/positions")  # , response_model=List[PositionOut])
+async def get_positions_columnar(db: AsyncSession, group_id: UUID, start_date, end_date):
+    """
+    Компактный формат: id ключей передаются один раз, для каждого ключа — параллельные массивы
+    дат, позиций, частотностей и стоимостей (i-й элемент массивов относится к одной проверке).
+    """
+    source = positions_source(start_date, end_date)
+    stmt = (
+        select(source.c.keyword_id, source.c.checked_at, source.c.position, source.c.frequency, source.c.cost)
+        .join(Keyword, Keyword.id == source.c.keyword_id)
+        .where(Keyword.group_id == group_id)
+        .order_by(source.c.keyword_id, source.c.checked_at)
+    )
+    if start_date and end_date:
+        stmt = stmt.where(source.c.checked_at >= start_date, source.c.checked_at < end_date)
+
+    result = await db.execute(stmt)
+
+    data = {"keyword_ids": [], "dates": [], "positions": [], "frequencies": [], "costs": []}
+    current_keyword_id = None
+    for keyword_id, checked_at, position, frequency, cost in result.all():
+        if keyword_id != current_keyword_id:
+            current_keyword_id = keyword_id
+            # asyncpg отдаёт собственный тип UUID, который orjson не сериализует
+            data["keyword_ids"].append(str(keyword_id))
+            for column in ("dates", "positions", "frequencies", "costs"):
+                data[column].append([])
+        data["dates"][-1].append(checked_at)
+        data["positions"][-1].append(position)
+        data["frequencies"][-1].append(frequency)
+        data["costs"][-1].append(cost)
+
+    return ORJSONResponse(data)
+
+
+@router.get("/{group_id}/positions", response_model=List[PositionHistoryOut])
 async def get_positions(
         group_id: UUID,
-        period: Optional[str] = Query("week", regex="^(week|month|custom)$"),
+        request: Request,
+        response: Response,
+        period: Optional[str] = Query("week", pattern="^(week|month|custom)$"),
         offset: int = Query(0, description="Сдвиг периода: 0 — текущий, -1 — предыдущий и т.д."),
         owner: str = Query("re-spond"),
+        format: str = Query("rows", pattern="^(rows|columnar)$",
+                            description="columnar — массивы значений по каждому ключу вместо объекта на строку"),
         db: AsyncSession = Depends(get_db)
 ):
     if owner != "re-spond":
         # Запрашиваем позиции в сервисе lk-seo.korenev.pro
         try:
             positions = await get_positions_lk_seo_korenev(group_id, period, offset)
-            return positions
+            # Сервис отдаёт None при ошибке — ответ всегда список
+            return positions or []
         except Exception as ex:
             logger.exception("Ошибка при запросе позиций сервиса lk-seo.korenev.pro % s", ex)
             return []
@@ -703,20 +739,35 @@ async def get_positions(
             start_date = None
             end_date = None
 
-        # Запрос позиций через соединение с Keyword и фильтрацией по group_id
+        # Версия проекта группы: при совпадающем ETag отвечаем 304 без запроса позиций
+        headers, not_modified = conditional_get(request, await get_project_version(db, group_id=group_id))
+        if not_modified:
+            return not_modified
+        response.headers.update(headers)
+
+        if format == "columnar":
+            columnar = await get_positions_columnar(db, group_id, start_date, end_date)
+            columnar.headers.update(headers)
+            return columnar
+
+        # Позиции ключей группы за период по порядку проверок; для периодов старше горизонта
+        # хранения источник включает архив — строки обоих источников одного вида
+        source = positions_source(start_date, end_date)
         stmt = (
-            select(Position)
-            .join(Position.keyword)
+            select(
+                source.c.keyword_id, source.c.checked_at, source.c.position, source.c.frequency,
+                source.c.previous_position, source.c.cost, source.c.trend,
+            )
+            .join(Keyword, Keyword.id == source.c.keyword_id)
             .where(Keyword.group_id == group_id)
+            .order_by(source.c.checked_at)
         )
-
         if start_date and end_date:
-            stmt = stmt.where(Position.checked_at >= start_date, Position.checked_at < end_date)
-
-        stmt = stmt.options(selectinload(Position.keyword))
+            stmt = stmt.where(source.c.checked_at >= start_date, source.c.checked_at < end_date)
 
         result = await db.execute(stmt)
-        positions = result.scalars().all()
+        positions = [dict(row._mapping) for row in result]
+
         return positions
 
     except HTTPException:
@@ -729,10 +780,12 @@ async def get_positions(
 @router.get("/{group_id}/positions/intervals") #, response_model=List[KeywordIntervals])
 async def get_positions_intervals(
         group_id: UUID,
-        period: str = Query("month", regex="^(week|month|custom)$"),
+        request: Request,
+        response: Response,
+        period: str = Query("month", pattern="^(week|month|custom)$"),
         offset: int = Query(0, description="Сдвиг периода: 0 — текущий, -1 — предыдущий и т.д."),
         owner: str = Query("re-spond"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     if owner != "re-spond":
         # Запрашиваем позиции в сервисе lk-seo.korenev.pro
@@ -743,6 +796,11 @@ async def get_positions_intervals(
             logger.exception("Ошибка при запросе позиций по интервалам сервиса lk-seo.korenev.pro % s", ex)
             return []
     try:
+        headers, not_modified = conditional_get(request, await get_project_version(db, group_id=group_id))
+        if not_modified:
+            return not_modified
+        response.headers.update(headers)
+
         current_utc_date = datetime.utcnow().date()
 
         # 1. Определяем границы периода
@@ -785,12 +843,14 @@ async def get_positions_intervals(
         project_start_date = group.project.created_at.date()
 
         # 3. Генерируем все 14-дневные интервалы от даты создания проекта до конца отображаемого периода
+        # (для custom — до текущей даты)
+        generation_end = period_display_end or current_utc_date
         all_biweekly_intervals = []
         interval_start = project_start_date
-        while interval_start <= period_display_end:
+        while interval_start <= generation_end:
             interval_end = interval_start + timedelta(days=13)
-            if interval_end > period_display_end:
-                interval_end = period_display_end
+            if interval_end > generation_end:
+                interval_end = generation_end
             all_biweekly_intervals.append((interval_start, interval_end))
             interval_start += timedelta(days=14)
 
@@ -809,81 +869,79 @@ async def get_positions_intervals(
         if not relevant_intervals:
             return []
 
-        # 5. Получаем ключевые слова группы
+        # 5. Получаем ключевые слова группы (нужны только id и цены)
         keywords_result = await db.execute(
-            select(Keyword)
+            select(Keyword.id, Keyword.price_top_1_3, Keyword.price_top_4_5, Keyword.price_top_6_10)
             .where(Keyword.group_id == group_id)
         )
-        keywords = keywords_result.scalars().all()
+        keywords = keywords_result.all()
 
         if not keywords:
             return []
 
-        keyword_ids = [k.id for k in keywords]
-        keywords_map = {k.id: k for k in keywords}
-
-        # 6. Получаем позиции ключевых слов в диапазоне дат
-        fetch_start_date = min(i[0] for i in relevant_intervals) - timedelta(days=14)
-        fetch_end_date = max(i[1] for i in relevant_intervals)
-        positions_result = await db.execute(
-            select(Position)
-            .where(
-                Position.keyword_id.in_(keyword_ids),
-                Position.checked_at >= fetch_start_date,
-                Position.checked_at <= fetch_end_date + timedelta(days=1)
+        # 6. Одним запросом считаем дни в топ-3/5/10 по каждому ключу и двухнедельному интервалу:
+        # полные интервалы берём из готовых агрегатов keyword_interval_stats,
+        # интервал, обрезанный концом периода, досчитываем по дневной сводке
+        sources = []
+        full_starts = [start_dt for start_dt, end_dt, _, _ in relevant_intervals
+                       if end_dt == start_dt + timedelta(days=INTERVAL_DAYS - 1)]
+        if full_starts:
+            sources.append(
+                select(KeywordIntervalStat.keyword_id, KeywordIntervalStat.interval_start,
+                       KeywordIntervalStat.days_top3, KeywordIntervalStat.days_top5, KeywordIntervalStat.days_top10)
+                .join(Keyword, Keyword.id == KeywordIntervalStat.keyword_id)
+                .where(Keyword.group_id == group_id, KeywordIntervalStat.interval_start.in_(full_starts))
             )
-        )
-        positions = positions_result.scalars().all()
-
-        # 7. Создаём карту позиций для быстрого доступа
-        positions_map = {}
-        for pos in positions:
-            positions_map.setdefault(pos.keyword_id, {})[pos.checked_at.date()] = pos
-
-        # 8. Подсчитываем суммы и формируем результат
+        for start_dt, end_dt, _, _ in relevant_intervals:
+            if start_dt in full_starts:
+                continue
+            sources.append(
+                select(KeywordDailyStat.keyword_id,
+                       literal(start_dt, Date).label("interval_start"),
+                       func.count().filter(KeywordDailyStat.bucket == 3),
+                       func.count().filter(KeywordDailyStat.bucket == 5),
+                       func.count().filter(KeywordDailyStat.bucket == 10))
+                .join(Keyword, Keyword.id == KeywordDailyStat.keyword_id)
+                .where(Keyword.group_id == group_id,
+                       KeywordDailyStat.day >= start_dt,
+                       KeywordDailyStat.day <= end_dt)
+                .group_by(KeywordDailyStat.keyword_id)
+            )
+        interval_rows = await db.execute(sources[0] if len(sources) == 1 else union_all(*sources))
+        days_map = {
+            (k_id, start_dt): (days_top3, days_top5, days_top10)
+            for k_id, start_dt, days_top3, days_top5, days_top10 in interval_rows
+        }
+
+        # 7. Считаем стоимости по текущим ценам и формируем результат.
+        # Ответ собирается словарями той же формы, что KeywordIntervals, и сразу отдаётся orjson:
+        # на тысячах ключей построчная сборка и кодирование моделей заметно дороже запроса
         results = []
-        for k_id in keyword_ids:
-            keyword = keywords_map[k_id]
+        for keyword in keywords:
             intervals_data = []
             for start_dt, end_dt, display_start, display_end in relevant_intervals:
-                days_top3 = 0
-                days_top5 = 0
-                days_top10 = 0
-
-                current_date = start_dt
-                while current_date <= end_dt:
-                    pos = positions_map.get(k_id, {}).get(current_date)
-                    if pos and pos.position is not None:
-                        if 1 <= pos.position <= 3:
-                            days_top3 += 1
-                        elif 4 <= pos.position <= 5:
-                            days_top5 += 1
-                        elif 6 <= pos.position <= 10:
-                            days_top10 += 1
-                    current_date += timedelta(days=1)
+                days_top3, days_top5, days_top10 = days_map.get((keyword.id, start_dt), (0, 0, 0))
 
                 cost_top3 = days_top3 * (keyword.price_top_1_3 or 0)
                 cost_top5 = days_top5 * (keyword.price_top_4_5 or 0)
                 cost_top10 = days_top10 * (keyword.price_top_6_10 or 0)
 
-                intervals_data.append(
-                    IntervalSumOut(
-                        start_date=start_dt,
-                        end_date=end_dt,
-                        display_start_date=display_start,
-                        display_end_date=display_end,
-                        sum_cost=cost_top3 + cost_top5 + cost_top10,
-                        days_top3=days_top3,
-                        cost_top3=keyword.price_top_1_3,
-                        days_top5=days_top5,
-                        cost_top5=keyword.price_top_4_5,
-                        days_top10=days_top10,
-                        cost_top10=keyword.price_top_6_10,
-                    )
-                )
-            results.append(KeywordIntervals(keyword_id=k_id, intervals=intervals_data))
-
-        return results
+                intervals_data.append({
+                    "start_date": start_dt,
+                    "end_date": end_dt,
+                    "display_start_date": display_start,
+                    "display_end_date": display_end,
+                    "sum_cost": float(cost_top3 + cost_top5 + cost_top10),
+                    "days_top3": days_top3,
+                    "cost_top3": keyword.price_top_1_3,
+                    "days_top5": days_top5,
+                    "cost_top5": keyword.price_top_4_5,
+                    "days_top10": days_top10,
+                    "cost_top10": keyword.price_top_6_10,
+                })
+            results.append({"keyword_id": str(keyword.id), "intervals": intervals_data})
+
+        return ORJSONResponse(results, headers=headers)
 
     except HTTPException:
         raise
@@ -892,8 +950,92 @@ async def get_positions_intervals(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.patch("/keywords/prices", response_model=KeywordBulkUpdateResult)
+async def bulk_update_keyword_prices(data: KeywordPricesBulkUpdate, db: AsyncSession = Depends(get_db)):
+    """Массовое изменение цен ключей одним UPDATE; не указанные цены не меняются."""
+    try:
+        # Повторный id в запросе: побеждает последний
+        items = list({item.id: item for item in data.items}.values())
+        keys = [item.id for item in items]
+        prices = {price: [getattr(item, price) for item in items] for price in PRICE_COLUMNS}
+
+        group_ids = await apply_keyword_prices(db, keys, prices)
+        updated_groups = set(group_ids)
+
+        await bump_group_project_versions(db, updated_groups)
+        await db.commit()
+        return KeywordBulkUpdateResult(updated=len(group_ids), groups=len(updated_groups))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to bulk update keyword prices: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 # --- Переключение ключевых слов в состояние снятие позиций и отключение
 
+# Фильтр bucket массового обновления: условие по keyword_states
+KEYWORD_BUCKET_FILTERS = {
+    "top3": KeywordState.position.between(1, 3),
+    "top5": KeywordState.position.between(4, 5),
+    "top10": KeywordState.position.between(6, 10),
+    "outside": and_(KeywordState.checked_at.isnot(None),
+                    or_(KeywordState.position.is_(None), KeywordState.position > 10)),
+}
+
+
+@router.patch("/keywords/bulk", response_model=KeywordBulkUpdateResult)
+async def bulk_update_keywords(data: KeywordBulkUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Включает/отключает снятие позиций и меняет приоритет сразу у многих ключей одним UPDATE.
+    Строки, где значение уже совпадает, не трогаются; версии затронутых проектов увеличиваются.
+    """
+    try:
+        values = {field: getattr(data, field) for field in ("is_check", "priority")
+                  if getattr(data, field) is not None}
+        if not values:
+            raise HTTPException(status_code=400, detail="Nothing to update: set is_check or priority")
+        if not data.ids and data.group_id is None:
+            raise HTTPException(status_code=400, detail="Specify ids or group_id")
+
+        conditions = []
+        if data.ids:
+            conditions.append(Keyword.id == any_(cast(data.ids, ARRAY(PG_UUID(as_uuid=True)))))
+        if data.group_id is not None:
+            conditions.append(Keyword.group_id == data.group_id)
+        if data.pattern:
+            conditions.append(Keyword.keyword.ilike(contains_pattern(data.pattern), escape="\\"))
+        if data.bucket == "unchecked":
+            conditions.append(~exists().where(KeywordState.keyword_id == Keyword.id,
+                                              KeywordState.checked_at.isnot(None)))
+        elif data.bucket:
+            conditions.append(exists().where(KeywordState.keyword_id == Keyword.id,
+                                             KEYWORD_BUCKET_FILTERS[data.bucket]))
+        # Пропускаем ключи, у которых значения уже такие
+        conditions.append(or_(*[getattr(Keyword, field).is_distinct_from(value) for field, value in values.items()]))
+
+        result = await db.execute(
+            update(Keyword)
+            .where(*conditions)
+            .values(**values)
+            .returning(Keyword.group_id)
+            .execution_options(synchronize_session=False)
+        )
+        group_ids = result.scalars().all()
+        updated_groups = set(group_ids)
+
+        await bump_group_project_versions(db, updated_groups)
+        await db.commit()
+        return KeywordBulkUpdateResult(updated=len(group_ids), groups=len(updated_groups))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to bulk update keywords: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @router.patch("/keywords/{keyword_id}/disable", status_code=status.HTTP_204_NO_CONTENT)
 async def disable_keyword_check(keyword_id: UUID, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Keyword).where(Keyword.id == keyword_id))
@@ -901,6 +1043,7 @@ async def disable_keyword_check(keyword_id: UUID, db: AsyncSession = Depends(get
     if not keyword:
         raise HTTPException(status_code=404, detail="Keyword not found")
     keyword.is_check = False
+    await bump_project_version(db, group_id=keyword.group_id)
     await db.commit()
     return
 
@@ -912,5 +1055,6 @@ async def enable_keyword_check(keyword_id: UUID, db: AsyncSession = Depends(get_
     if not keyword:
         raise HTTPException(status_code=404, detail="Keyword not found")
     keyword.is_check = True
+    await bump_project_version(db, group_id=keyword.group_id)
     await db.commit()
     return
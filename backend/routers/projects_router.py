@@ -1,28 +1,29 @@
-from fastapi import APIRouter, Query, Depends, HTTPException, status
+from fastapi import APIRouter, Query, Depends, HTTPException, status, Response, Request
 from typing import List, Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_
+from sqlalchemy import and_, func, tuple_, cast, Date, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from fastapi.responses import StreamingResponse
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
-import io
-import pandas as pd
 from datetime import datetime, timedelta, date
 import logging
-from openpyxl.styles import PatternFill, Font
-from openpyxl.utils import get_column_letter
 
-from database.db_init import get_db, SyncSessionLocal
-from database.models import Project, Keyword, Position, Group, SearchEngineEnum, User, UserRole
+from database.db_init import get_db, get_read_db, read_session, SyncSessionLocal
+from database.loading import project_summary, project_detail
+from database.models import Project, Keyword, Position, Group, SearchEngineEnum, User, UserRole, user_project_link
 from routers.schemas import (ProjectCreate, ProjectUpdate, KeywordUpdate,
                              ProjectOut, ClientProjectOut, PositionOut,
                              KeywordCreate, KeywordUpdate, KeywordOut,
                              IntervalSumOut, KeywordIntervals, GroupOut,
-                             GroupCreate, GroupUpdate)
+                             GroupCreate, GroupUpdate, ProjectSummaryOut, ProjectSummaryPage)
 
-from services.api_utils import generate_client_link
+from services.api_utils import (generate_client_link, encode_cursor, decode_cursor,
+                               encode_sort_cursor, decode_sort_cursor)
+from services.project_summary import (SUMMARY_SORT_COLUMNS, NEVER_CHECKED, project_summary_subquery,
+                                      page_project_summary_stmt)
 from services.auth_utils import get_current_user
 from services.topvizor_task import run_main_task_one_project
 from services.topvizor_utils import (create_project_in_topvisor,
@@ -34,9 +35,14 @@ from services.topvizor_utils import (create_project_in_topvisor,
                                      get_region_key_index_static,
                                      add_searcher_to_project,
                                      add_searcher_region)
-from services.lk_seo_data import get_lk_seo_korenev_projects
+from services.lk_seo_data import get_lk_seo_korenev_projects_cached
+from services.position_archive import positions_source
+from services.xlsx_stream import XLSX_MEDIA_TYPE, stream_xlsx
+from services.cache import get_cached_client_view, set_cached_client_view
+from services.project_version import bump_project_version, get_project_version, conditional_get
 
 import aiohttp
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -52,61 +58,158 @@ router = APIRouter()
 
 # --- Проекты ---
 
+async def attach_keyword_counts(db: AsyncSession, projects):
+    """Проставляет группам keywords_count одним агрегирующим запросом (для профиля без ключей)."""
+    group_ids = [group.id for project in projects for group in project.groups]
+    if not group_ids:
+        return
+    result = await db.execute(
+        select(Keyword.group_id, func.count(Keyword.id))
+        .where(Keyword.group_id.in_(group_ids))
+        .group_by(Keyword.group_id)
+    )
+    counts = dict(result.all())
+    for project in projects:
+        for group in project.groups:
+            group.keywords_count = counts.get(group.id, 0)
+
+
 
 @router.get("/", response_model=List[ProjectOut])
 async def get_projects(
+        response: Response,
+        limit: Optional[int] = Query(None, ge=1, le=500, description="Размер страницы (только для менеджера)"),
+        cursor: Optional[str] = Query(None, description="Значение X-Next-Cursor предыдущей страницы"),
+        with_keywords: bool = Query(True, description="False — группы без ключей, только их количество"),
         db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     try:
         logger.info(f"User role: {current_user.role}")
         if current_user.role == UserRole.admin:
+            # Проекты сервиса lk-seo.korenev.pro запрашиваем параллельно с базой,
+            # ожидание ограничено LK_SEO_BUDGET_SECONDS
+            lk_seo_task = asyncio.create_task(get_lk_seo_korenev_projects_cached())
+
             # Админ видит все проекты
             result = await db.execute(
-                select(Project).options(selectinload(Project.groups))
+                select(Project).options(project_detail())
             )
             results = result.scalars().all()
 
+            all_projects = [
+                ProjectOut.model_validate(project, from_attributes=True)
+                for project in results
+            ]
+
             # Добавляем проекты сервиса lk-seo.korenev.pro
             try:
-                lk_seo_korenev_projects = await get_lk_seo_korenev_projects()
-
-                all_projects = [
-                    ProjectOut.model_validate(project, from_attributes=True)
-                    for project in results
-                ]
-
-                if lk_seo_korenev_projects:
-                    all_projects.extend(lk_seo_korenev_projects)
-                return all_projects
+                lk_seo_korenev_projects, partial = await lk_seo_task
             except Exception as ex:
                 logger.exception("Ошибка при получении проектов сервиса lk-seo.korenev.pro %s", ex)
-                # ВАЖНО: Даже при ошибке нужно вернуть валидные схемы, а не ORM объекты!
-                # Если lk-сервис упал, возвращаем только локальные проекты, но правильно сериализованные
-                return [ProjectOut.model_validate(p, from_attributes=True) for p in results]
+                lk_seo_korenev_projects, partial = [], True
+
+            if partial:
+                # Фронт может показать, что список проектов lk-seo неполный или устарел
+                response.headers["X-Partial-Response"] = "lk_seo_korenev"
+            if lk_seo_korenev_projects:
+                all_projects.extend(lk_seo_korenev_projects)
+            return all_projects
 
         elif current_user.role == UserRole.manager:
-            # Менеджер видит только свои проекты
-            # Подгружаем проекты с группами
-            await db.refresh(current_user, ['projects'])  # загружаем связанные проекты
-            # Подгружаем группы проектов менеджера
-            for project in current_user.projects:
-                await db.refresh(project, ['groups'])
-            return current_user.projects
+            # Менеджер видит только свои проекты: один запрос через таблицу связей,
+            # страницы по курсору (created_at, id), новые проекты первыми
+            stmt = (
+                select(Project)
+                .join(user_project_link, user_project_link.c.project_id == Project.id)
+                .where(user_project_link.c.user_id == current_user.id)
+                .options(project_detail() if with_keywords else project_summary())
+                .order_by(Project.created_at.desc(), Project.id.desc())
+            )
+            if cursor:
+                try:
+                    cursor_created_at, cursor_id = decode_cursor(cursor)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Некорректный курсор")
+                stmt = stmt.where(tuple_(Project.created_at, Project.id) < tuple_(cursor_created_at, cursor_id))
+            if limit:
+                stmt = stmt.limit(limit + 1)
+
+            result = await db.execute(stmt)
+            projects = list(result.scalars().all())
+
+            if limit and len(projects) > limit:
+                projects = projects[:limit]
+                last = projects[-1]
+                response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+
+            if not with_keywords:
+                await attach_keyword_counts(db, projects)
+            return projects
 
         else:
             raise HTTPException(status_code=403, detail="Access denied")
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Failed to get projects: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get projects")
 
 
+@router.get("/summary", response_model=ProjectSummaryPage)
+async def get_projects_summary(
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+        sort: str = Query("created_at", pattern=f"^({'|'.join(SUMMARY_SORT_COLUMNS)})$"),
+        order: str = Query("desc", pattern="^(asc|desc)$"),
+        q: Optional[str] = Query(None, min_length=1, description="Поиск по подстроке домена"),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: User = Depends(get_current_user)
+):
+    try:
+        if current_user.role not in (UserRole.admin, UserRole.manager):
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        decoded_cursor = None
+        if cursor:
+            try:
+                decoded_cursor = decode_sort_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+        # Менеджер видит только свои проекты
+        user_id = current_user.id if current_user.role == UserRole.manager else None
+        summary = project_summary_subquery(datetime.utcnow().date(), user_id=user_id, search=q)
+        stmt = page_project_summary_stmt(summary, sort, order == "desc", limit, decoded_cursor)
+
+        rows = (await db.execute(stmt)).mappings().all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_sort_cursor(rows[-1][sort], rows[-1]["id"])
+
+        items = []
+        for row in rows:
+            item = dict(row)
+            if item["last_checked"] == NEVER_CHECKED:
+                item["last_checked"] = None
+            items.append(ProjectSummaryOut.model_validate(item))
+
+        return ProjectSummaryPage(items=items, next_cursor=next_cursor)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to get projects summary: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to get projects summary")
+
+
 @router.post("/", response_model=ProjectOut, status_code=201)
 async def create_project(project_in: ProjectCreate,
                          db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(get_current_user)):
     try:
-        project_data = project_in.dict(exclude={"groups"}, by_alias=False)
+        project_data = project_in.model_dump(exclude={"groups"}, by_alias=False)
 
         if not project_data.get("client_link"):
             project_data["client_link"] = generate_client_link()
@@ -128,7 +231,7 @@ async def create_project(project_in: ProjectCreate,
             # Повторно загружаем проект с группами и ключевыми словами
         result = await db.execute(
             select(Project)
-            .options(selectinload(Project.groups).selectinload(Group.keywords))
+            .options(project_detail())
             .where(Project.id == project.id)
         )
         project_with_relations = result.scalar_one()
@@ -141,13 +244,18 @@ async def create_project(project_in: ProjectCreate,
 
 
 @router.get("/{project_id}", response_model=ProjectOut)
-async def get_project(project_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_project(project_id: UUID, request: Request, response: Response,
+                      db: AsyncSession = Depends(get_db)):
     try:
+        # Сначала только версия проекта: при совпадающем ETag отвечаем 304 без загрузки дерева
+        headers, not_modified = conditional_get(request, await get_project_version(db, project_id=project_id))
+        if not_modified:
+            return not_modified
+        response.headers.update(headers)
+
         result = await db.execute(
             select(Project)
-            .options(
-                selectinload(Project.groups).selectinload(Group.keywords),
-            )
+            .options(project_detail())
             .where(Project.id == project_id)
         )
         project = result.scalar_one_or_none()
@@ -171,14 +279,14 @@ async def update_project(
         # Загружаем проект с группами и ключами
         result = await db.execute(
             select(Project)
-            .options(selectinload(Project.groups).selectinload(Group.keywords))
+            .options(project_detail())
             .where(Project.id == project_id)
         )
         project = result.scalar_one_or_none()
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
 
-        update_data = project_in.dict(exclude_unset=True, by_alias=False)
+        update_data = project_in.model_dump(exclude_unset=True, by_alias=False)
 
         domain_changed = "domain" in update_data and update_data["domain"] != project.domain
         new_domain = update_data.get("domain")
@@ -258,8 +366,9 @@ async def update_project(
             if "schedule" in update_data:
                 project.schedule = update_data["schedule"]
 
+            await bump_project_version(db, project_id=project.id)
             await db.commit()
-            await db.refresh(project)
+            # Сессия не сбрасывает объекты после commit, группы и ключи уже загружены
             return project
 
     except HTTPException:
@@ -279,9 +388,10 @@ async def delete_project(
         raise HTTPException(status_code=403, detail="Удалить проект может только администратор")
 
     try:
-        # Загружаем проект вместе с группами (чтобы получить topvisor_id подпроектов)
+        # Загружаем проект вместе с группами (чтобы получить topvisor_id подпроектов),
+        # ключевые слова не нужны — их удалит каскад в базе
         result = await db.execute(
-            select(Project).options(selectinload(Project.groups)).where(Project.id == project_id)
+            select(Project).options(project_summary()).where(Project.id == project_id)
         )
         project = result.scalar_one_or_none()
         if not project:
@@ -327,9 +437,7 @@ async def archive_project(
         # ЕДИНЫЙ запрос со ВСЕМИ связанными данными
         result = await db.execute(
             select(Project)
-            .options(
-                selectinload(Project.groups).selectinload(Group.keywords)
-            )
+            .options(project_detail())
             .where(Project.id == project_id)
         )
         project = result.scalar_one_or_none()
@@ -340,9 +448,9 @@ async def archive_project(
         for group in project.groups:
             group.is_archived = True
 
+        await bump_project_version(db, project_id=project.id)
         await db.commit()
-        # Обновляем ТОЛЬКО группы (ключи уже загружены)
-        await db.refresh(project, ["groups"])
+        # Сессия не сбрасывает объекты после commit, группы и ключи уже актуальны
 
         return project
 
@@ -364,8 +472,9 @@ async def run_position_check(project_id: UUID, db: AsyncSession = Depends(get_db
             raise HTTPException(status_code=404, detail="Project not found")
 
         # Запускаем фоновую задачу через Celery
-        run_main_task_one_project.delay(str(project_id))
-        return {"message": f"Парсер запущен для проекта {project.domain}"}
+        task = run_main_task_one_project.delay(str(project_id))
+        # По task_id фронтенд подписывается на прогресс: GET /api/task-status/{task_id}/stream
+        return {"message": f"Парсер запущен для проекта {project.domain}", "task_id": task.id}
     except HTTPException:
         raise
     except Exception as e:
@@ -375,115 +484,100 @@ async def run_position_check(project_id: UUID, db: AsyncSession = Depends(get_db
 
 # --- Экспорт в Excel ---
 
+# Колонки выгрузки позиций
+POSITIONS_EXPORT_COLUMNS = ["Проект", "Поисковая система", "Группа", "Ключевое слово", "Город", "Дата",
+                            "Позиция", "Частотность", "Динамика", "Тренд", "Стоимость"]
+POSITIONS_EXPORT_STYLES = {
+    "header": {"bold": True},
+    "total": {"bold": True, "fill": "F0F0F0"},
+}
+# Сколько строк за раз забирать из серверного курсора
+EXPORT_BATCH_SIZE = 2000
+
+
 @router.get("/{project_id}/positions/export")
 async def export_positions_excel(
         project_id: UUID,
         start_date: date = Query(..., description="Начальная дата периода"),
         end_date: date = Query(..., description="Конечная дата периода"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     try:
         if start_date > end_date:
             raise HTTPException(status_code=400, detail="start_date не может быть больше end_date")
 
-        project = await db.get(Project, project_id)
-        if not project:
+        domain = (await db.execute(select(Project.domain).where(Project.id == project_id))).scalar_one_or_none()
+        if domain is None:
             logging.error("Project not found")
             raise HTTPException(status_code=404, detail="Проект не найден")
 
-        # Запрос позиций с join и фильтрацией по project_id через Group и Keyword
-        stmt = (
-            select(Position)
-            .join(Position.keyword)
-            .join(Keyword.group)
-            .where(Keyword.group.has(Group.project_id == project_id))
-            .where(Position.checked_at >= datetime.combine(start_date, datetime.min.time()))
-            .where(Position.checked_at <= datetime.combine(end_date, datetime.max.time()))
-            .options(
-                selectinload(Position.keyword).selectinload(Keyword.group).selectinload(Group.project)
-            )
-            .order_by(Position.checked_at.desc())
+        # Позиции ключей проекта за период (для старых периодов источник включает архив истории)
+        period_start = datetime.combine(start_date, datetime.min.time())
+        period_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        source = positions_source(period_start, period_end)
+        project_keywords = select(Keyword.id).join(Group, Group.id == Keyword.group_id) \
+            .where(Group.project_id == project_id)
+        in_period = and_(
+            source.c.keyword_id.in_(project_keywords),
+            source.c.checked_at >= period_start,
+            source.c.checked_at < period_end,
         )
 
-        result = await db.execute(stmt)
-        positions = result.scalars().all()
-
-        if not positions:
+        has_positions = (await db.execute(select(select(source.c.keyword_id).where(in_period).exists()))).scalar()
+        if not has_positions:
             logging.error("Positions not found")
             raise HTTPException(status_code=404, detail="Данные за указанный период не найдены")
 
-        cleaned_positions_dict = dict()
-        for pos in positions:
-            key = (pos.keyword_id, pos.checked_at.date())
-            if key not in cleaned_positions_dict or pos.checked_at > cleaned_positions_dict[key].checked_at:
-                cleaned_positions_dict[key] = pos
-
-        cleaned_positions = list(cleaned_positions_dict.values())
-        cleaned_positions.sort(key=lambda x: x.checked_at)
-
-        data = []
-        for pos in cleaned_positions:
-            project = pos.keyword.group.project
-            group = pos.keyword.group
-            keyword = pos.keyword
-            data.append({
-                "Проект": project.domain if project else None,
-                "Поисковая система": group.search_engine.value if group and group.search_engine else None,
-                "Группа": group.title if group else None,
-                "Ключевое слово": keyword.keyword,
-                "Город": group.region if group else None,
-                "Дата": pos.checked_at.strftime("%Y-%m-%d"),
-                "Позиция": pos.position,
-                "Частотность": pos.frequency,
-                "Динамика": pos.previous_position,
-                "Тренд": pos.trend.value if pos.trend else None,
-                "Стоимость": pos.cost,
-            })
-
-        df = pd.DataFrame(data)
-        total_cost = df['Стоимость'].sum()
-        summary_row = pd.DataFrame([{
-            "Проект": "Итого",
-            "Поисковая система": "",
-            "Группа": "",
-            "Ключевое слово": "",
-            "Город": "",
-            "Дата": "",
-            "Позиция": "",
-            "Частотность": "",
-            "Динамика": "",
-            "Тренд": "",
-            "Стоимость": total_cost
-        }])
-
-        df_with_summary = pd.concat([df, summary_row], ignore_index=True)
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Записываем DataFrame без заголовков (они добавятся отдельно)
-            df_with_summary.to_excel(writer, index=False, sheet_name="Positions", startrow=0, startcol=0)
-
-            # Получаем лист для работы с форматированием
-            worksheet = writer.sheets["Positions"]
-
-            # Определяем номер строки с итогами (последняя строка)
-            summary_row_idx = len(
-                df_with_summary) + 1  # +1 потому что в Excel нумерация с 1, а у нас есть строка заголовков
-
-            # В openpyxl строки начинаются с 1, первая строка — заголовки, данные с 2-й, итоги — на len(df)+2
-            summary_row_num = len(df) + 2
-
-            # Создаём стили
-            bold_font = Font(bold=True)
-            gray_fill = PatternFill(start_color="F0F0F0", end_color="F0F0F0", fill_type="solid")
-
-            # Применяем стили ко всем ячейкам в строке итогов
-            for col_idx in range(1, len(df_with_summary.columns) + 1):  # колонки с 1 до N
-                cell = worksheet.cell(row=summary_row_num, column=col_idx)
-                cell.font = bold_font
-                cell.fill = gray_fill
-
-        output.seek(0)
+        # Последняя проверка каждого ключа за день — DISTINCT ON в базе, а не словарём в памяти
+        check_day = cast(source.c.checked_at, Date)
+        latest = (
+            select(source.c.keyword_id, source.c.checked_at, source.c.position, source.c.frequency,
+                   source.c.previous_position, source.c.trend, source.c.cost)
+            .where(in_period)
+            .distinct(source.c.keyword_id, check_day)
+            .order_by(source.c.keyword_id, check_day, source.c.checked_at.desc())
+            .subquery("latest")
+        )
+        stmt = (
+            select(latest, Keyword.keyword, Group.title, Group.region, Group.search_engine)
+            .join(Keyword, Keyword.id == latest.c.keyword_id)
+            .join(Group, Group.id == Keyword.group_id)
+            .order_by(latest.c.checked_at)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+
+        async def export_rows():
+            yield POSITIONS_EXPORT_COLUMNS, "header"
+            total_cost = 0
+            # Отдельная сессия: поток читается уже после выхода из обработчика
+            async with read_session() as stream_db:
+                result = await stream_db.stream(stmt)
+                async for pos in result:
+                    total_cost += pos.cost or 0
+                    yield [
+                        domain,
+                        getattr(pos.search_engine, "value", pos.search_engine),
+                        pos.title,
+                        pos.keyword,
+                        pos.region,
+                        pos.checked_at.strftime("%Y-%m-%d"),
+                        pos.position,
+                        pos.frequency,
+                        pos.previous_position,
+                        getattr(pos.trend, "value", pos.trend),
+                        pos.cost,
+                    ], None
+            # Строка итогов считается на лету по мере выгрузки
+            yield ["Итого"] + [""] * (len(POSITIONS_EXPORT_COLUMNS) - 2) + [total_cost], "total"
+
+        async def body():
+            try:
+                async for chunk in stream_xlsx(export_rows(), "Positions", styles=POSITIONS_EXPORT_STYLES):
+                    yield chunk
+            except Exception as e:
+                # Заголовки уже отправлены, остаётся только оборвать поток
+                logging.error(f"Failed to stream positions excel: {e}", exc_info=True)
+                raise
 
         filename = f"positions_{project_id}_{start_date}_{end_date}.xlsx"
 
@@ -491,11 +585,7 @@ async def export_positions_excel(
             'Content-Disposition': f'attachment; filename="{filename}"'
         }
 
-        return StreamingResponse(
-            output,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers=headers
-        )
+        return StreamingResponse(body(), media_type=XLSX_MEDIA_TYPE, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -508,10 +598,24 @@ async def export_positions_excel(
 @router.get("/client/{client_link}", response_model=ClientProjectOut)
 async def client_view(
         client_link: str,
-        period: Optional[str] = Query("week", regex="^(week|month|custom)$"),
-        db: AsyncSession = Depends(get_db)
+        request: Request,
+        period: Optional[str] = Query("week", pattern="^(week|month|custom)$"),
+        db: AsyncSession = Depends(get_read_db)
 ):
     try:
+        version_row = await get_project_version(db, client_link=client_link)
+        if not version_row:
+            raise HTTPException(status_code=404, detail="Проект не найден")
+
+        headers, not_modified = conditional_get(request, version_row)
+        if not_modified:
+            return not_modified
+
+        # Готовый ответ из кеша, действителен для текущей версии проекта
+        cached = await get_cached_client_view(client_link, period, version_row.version)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json", headers=headers)
+
         # Вычисляем дату начала периода для фильтрации позиций
         now = datetime.utcnow()
         if period == "week":
@@ -522,13 +626,18 @@ async def client_view(
             # Для произвольного периода можно принимать дополнительные параметры, например start_date и end_date
             start_date = None
 
+        # Позиции фильтруются по периоду в самом запросе, а не после загрузки всей истории
+        positions_load = Keyword.positions
+        if start_date:
+            positions_load = Keyword.positions.and_(Position.checked_at >= start_date)
+
         # Получаем проект по уникальной клиентской ссылке, вместе с ключевыми словами
         result = await db.execute(
             select(Project)
             .options(
                 selectinload(Project.groups)  # подгружаем группы проекта
                 .selectinload(Group.keywords)  # у групп подгружаем ключевые слова
-                .selectinload(Keyword.positions)  # у ключевых слов подгружаем позиции
+                .selectinload(positions_load)  # у ключевых слов подгружаем позиции за период
             )
             .where(Project.client_link == client_link)
         )
@@ -536,17 +645,9 @@ async def client_view(
         if not project:
             raise HTTPException(status_code=404, detail="Проект не найден")
 
-        # Фильтруем позиции по периоду (если задан start_date)
-        if start_date:
-            for group in project.groups:
-                for keyword in group.keywords:
-                    if hasattr(keyword, 'positions') and keyword.positions is not None:
-                        keyword.positions = [
-                            pos for pos in keyword.positions if pos.checked_at >= start_date
-                        ]
-
-        # Возвращаем проект с отфильтрованными позициями
-        return project
+        payload = ClientProjectOut.model_validate(project).model_dump_json(by_alias=True).encode()
+        await set_cached_client_view(client_link, period, version_row.version, payload)
+        return Response(content=payload, media_type="application/json", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -555,179 +656,131 @@ async def client_view(
 
 
 # --- Выгрузка таблицы в Эксель с динамикой по позициям ---
+# Стили сводной выгрузки: заливка ячейки позиции по попаданию в топ, тонкие границы у всех ячеек.
+# Заголовок и индекс без жирного шрифта — как в прежней выгрузке через pandas (с pandas 3 он не жирный)
+PIVOT_EXPORT_STYLES = {
+    "header": {"border": True},
+    "index": {"border": True},
+    "top3": {"fill": "b7fbd5", "border": True},
+    "top5": {"fill": "fef5c5", "border": True},
+    "top10": {"fill": "b4d2ff", "border": True},
+    "top30": {"fill": "f6f5f8", "border": True},
+    "other": {"fill": "ffffff", "border": True},
+}
+# Стиль ячейки по позиции 0..30 — таблица вместо проверки диапазонов для каждой ячейки
+PIVOT_POSITION_STYLES = ["other"] + ["top3"] * 3 + ["top5"] * 2 + ["top10"] * 5 + ["top30"] * 20
+PIVOT_INDEX_COLUMNS = ["Проект", "Группа", "Ключевое слово"]
+PIVOT_EMPTY = "--"
+
+
 @router.get("/{project_id}/positions/export_pivot")
 async def export_positions_pivot_excel(
         project_id: UUID,
         start_date: date = Query(..., description="Начальная дата периода"),
         end_date: date = Query(..., description="Конечная дата периода"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     try:
         if start_date > end_date:
             raise HTTPException(status_code=400, detail="start_date не может быть больше end_date")
 
-        project_obj = await db.get(Project, project_id)
-        if not project_obj:
+        domain = (await db.execute(select(Project.domain).where(Project.id == project_id))).scalar_one_or_none()
+        if domain is None:
             logging.error("Project not found")
             raise HTTPException(status_code=404, detail="Проект не найден")
 
-        # Получаем все ключевые слова проекта через Group
-        stmt_keywords = (
-            select(Keyword)
-            .join(Keyword.group)
+        # Заодно с проверкой наличия ключей — максимальные длины для ширины колонок
+        lengths = (await db.execute(
+            select(func.count(Keyword.id), func.max(func.length(Group.title)), func.max(func.length(Keyword.keyword)))
+            .join(Group, Group.id == Keyword.group_id)
             .where(Group.project_id == project_id)
-            .options(selectinload(Keyword.group))
-        )
-        result = await db.execute(stmt_keywords)
-        keywords = result.scalars().all()
-
-        if not keywords:
+        )).one()
+        if not lengths[0]:
             raise HTTPException(status_code=404, detail="Ключевые слова проекта не найдены")
 
-        # Получаем позиции за период
-        # Получаем позиции за период (с сортировкой по checked_at DESC)
-        stmt_positions = (
-            select(Position)
-            .join(Position.keyword)
-            .join(Keyword.group)
-            .where(and_(
-                Group.project_id == project_id,
-                Position.checked_at >= datetime.combine(start_date, datetime.min.time()),
-                Position.checked_at <= datetime.combine(end_date, datetime.max.time())
-            ))
-            .options(selectinload(Position.keyword))
-            .order_by(Position.checked_at.desc())  # сортировка по убыванию времени
-        )
-        result_pos = await db.execute(stmt_positions)
-        positions = result_pos.scalars().all()
-
-        # Словарь для быстрого доступа к позициям по (keyword_id, date)
-        pos_dict = {}
-        for pos in positions:
-            key = (pos.keyword.id, pos.checked_at.date())
-            if key not in pos_dict:  # берём только первую (самую позднюю) запись
-                pos_dict[key] = pos.position
-
-        # Собираем все даты в списке
-        date_list = []
-        current_date = start_date
-        while current_date <= end_date:
-            date_list.append(current_date)
-            current_date += timedelta(days=1)
-
-        rows = []
-        # Для каждого ключа и каждой даты добавляем строку с позицией или '--'
-        for kw in keywords:
-            proj = kw.group.project if kw.group else None
-            group = kw.group
-
-            for dt in date_list:
-                pos_value = pos_dict.get((kw.id, dt), "--")
-                rows.append({
-                    "Проект": proj.domain if proj else None,
-                    "Группа": group.title if group else None,
-                    "Ключевое слово": kw.keyword,
-                    "Дата": dt,
-                    "Позиция": pos_value
-                })
-
-        df = pd.DataFrame(rows)
-        if df.empty:
-            raise HTTPException(status_code=404, detail="Данные за указанный период не найдены")
+        date_list = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        date_headers = [dt.strftime("%Y-%m-%d") for dt in date_list]
 
-        pivot = df.pivot_table(
-            index=["Проект", "Группа", "Ключевое слово"],
-            columns="Дата",
-            values="Позиция",
-            aggfunc="first"
+        # Позиции ключей проекта за период (для старых периодов источник включает архив истории):
+        # последняя проверка ключа за день
+        period_start = datetime.combine(start_date, datetime.min.time())
+        period_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        source = positions_source(period_start, period_end)
+        project_keywords = select(Keyword.id).join(Group, Group.id == Keyword.group_id) \
+            .where(Group.project_id == project_id)
+        check_day = cast(source.c.checked_at, Date)
+        latest = (
+            select(source.c.keyword_id, check_day.label("day"), source.c.position)
+            .where(
+                source.c.keyword_id.in_(project_keywords),
+                source.c.checked_at >= period_start,
+                source.c.checked_at < period_end,
+            )
+            .distinct(source.c.keyword_id, check_day)
+            .order_by(source.c.keyword_id, check_day, source.c.checked_at.desc())
+            .subquery("latest")
         )
+        days = select(
+            cast(func.generate_series(period_start, period_end - timedelta(days=1), timedelta(days=1)), Date)
+            .label("day")
+        ).subquery("days")
 
-        # Заполняем пропуски (на всякий случай)
-        pivot = pivot.fillna("--")
-        pivot = pivot.reindex(sorted(pivot.columns), axis=1)
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            pivot.to_excel(writer, sheet_name="Positions")
-
-            wb = writer.book
-            ws = writer.sheets["Positions"]
-
-            # Определение заливок цвета
-            green_fill = PatternFill(start_color="b7fbd5", end_color="b7fbd5", fill_type="solid")
-            yellow_fill = PatternFill(start_color="fef5c5", end_color="fef5c5", fill_type="solid")
-            blue_fill = PatternFill(start_color="b4d2ff", end_color="b4d2ff", fill_type="solid")
-            grey_fill = PatternFill(start_color="f6f5f8", end_color="f6f5f8", fill_type="solid")
-            white_fill = PatternFill(start_color="ffffff", end_color="ffffff", fill_type="solid")
-
-            start_row = 2
-            start_col = 4
-            max_row = ws.max_row
-            max_col = ws.max_column
-
-            # Функция для определения цвета заливки
-            def get_fill(position):
-                if position == "--":
-                    return white_fill
-                try:
-                    pos_val = int(position)
-                except:
-                    return white_fill
-                if 1 <= pos_val <= 3:
-                    return green_fill
-                elif 4 <= pos_val <= 5:
-                    return yellow_fill
-                elif 6 <= pos_val <= 10:
-                    return blue_fill
-                elif 11 <= pos_val <= 30:
-                    return grey_fill
-                else:
-                    return white_fill
-
-            # Заливка ячеек
-            for row in range(start_row, max_row + 1):
-                for col in range(start_col, max_col + 1):
-                    cell = ws.cell(row=row, column=col)
-                    cell.fill = get_fill(cell.value)
-
-            # Установка тонких границ для ВСЕХ ячеек таблицы, включая заголовок и первые 3 столбца
-            from openpyxl.styles import Border, Side
-
-            thin_border = Border(
-                left=Side(style='thin', color='000000'),
-                right=Side(style='thin', color='000000'),
-                top=Side(style='thin', color='000000'),
-                bottom=Side(style='thin', color='000000')
+        # Сводная таблица целиком в базе: по строке на ключ, позиции по дням — массивом в порядке дат
+        stmt = (
+            select(
+                Group.title,
+                Keyword.keyword,
+                func.array_agg(aggregate_order_by(latest.c.position, days.c.day)).label("positions"),
             )
+            .select_from(Keyword)
+            .join(Group, Group.id == Keyword.group_id)
+            .join(days, true())
+            .outerjoin(latest, and_(latest.c.keyword_id == Keyword.id, latest.c.day == days.c.day))
+            .where(Group.project_id == project_id)
+            .group_by(Keyword.id, Group.title, Keyword.keyword)
+            .order_by(Group.title, Keyword.keyword)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
 
-            for row in range(1, max_row + 1):
-                for col in range(1, max_col + 1):
-                    cell = ws.cell(row=row, column=col)
-                    cell.border = thin_border
-
-            for col_idx in range(1, max_col + 1):
-                max_length = 0
-                col_letter = get_column_letter(col_idx)
-                for row_idx in range(1, max_row + 1):
-                    cell_value = ws.cell(row=row_idx, column=col_idx).value
-                    length = len(str(cell_value)) if cell_value is not None else 0
-                    if length > max_length:
-                        max_length = length
-                ws.column_dimensions[col_letter].width = max_length + 2
-
-                # Закрепляем первые три столбца
-            ws.freeze_panes = ws["D1"]
-
-        output.seek(0)
+        # Ширины считаются заранее, как автоподбор по самому длинному значению колонки
+        widths = [
+            max(len(PIVOT_INDEX_COLUMNS[0]), len(domain)) + 2,
+            max(len(PIVOT_INDEX_COLUMNS[1]), lengths[1] or 0) + 2,
+            max(len(PIVOT_INDEX_COLUMNS[2]), lengths[2] or 0) + 2,
+        ] + [len(header) + 2 for header in date_headers]
+
+        index_styles = ["index"] * len(PIVOT_INDEX_COLUMNS)
+
+        async def pivot_rows():
+            yield PIVOT_INDEX_COLUMNS + date_headers, "header"
+            async with read_session() as stream_db:
+                result = await stream_db.stream(stmt)
+                async for row in result:
+                    values = [domain, row.title, row.keyword]
+                    styles = list(index_styles)
+                    for position in row.positions:
+                        if position is None:
+                            values.append(PIVOT_EMPTY)
+                            styles.append("other")
+                        else:
+                            values.append(position)
+                            styles.append(PIVOT_POSITION_STYLES[position] if 0 <= position <= 30 else "other")
+                    yield values, styles
+
+        async def body():
+            try:
+                async for chunk in stream_xlsx(pivot_rows(), "Positions", styles=PIVOT_EXPORT_STYLES,
+                                               widths=widths, freeze_cols=len(PIVOT_INDEX_COLUMNS)):
+                    yield chunk
+            except Exception as e:
+                # Заголовки уже отправлены, остаётся только оборвать поток
+                logging.error(f"Failed to stream positions pivot excel: {e}", exc_info=True)
+                raise
 
         filename = f"positions_pivot_{project_id}_{start_date}_{end_date}.xlsx"
         headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
 
-        return StreamingResponse(
-            output,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers=headers
-        )
+        return StreamingResponse(body(), media_type=XLSX_MEDIA_TYPE, headers=headers)
 
     except HTTPException:
         raise
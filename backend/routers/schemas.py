@@ -46,8 +46,40 @@ class KeywordUpdate(BaseModel):
     price_top_6_10: Optional[int] = Field(None, ge=0)
     group_id: Optional[UUID] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
+
+
+class KeywordBulkUpdate(BaseModel):
+    """
+    Массовое изменение is_check / priority. Ключи выбираются списком ids или по группе;
+    pattern (подстрока ключа) и bucket (по последней позиции) дополнительно сужают выборку.
+    """
+    ids: Optional[List[UUID]] = None
+    group_id: Optional[UUID] = None
+    pattern: Optional[constr(min_length=1)] = None
+    bucket: Optional[constr(pattern="^(top3|top5|top10|outside|unchecked)$")] = None
+    is_check: Optional[bool] = None
+    priority: Optional[bool] = None
+
+
+class KeywordBulkUpdateResult(BaseModel):
+    updated: int  # ключи, у которых значение действительно изменилось
+    groups: int  # затронутые группы
+
+
+class KeywordPriceItem(BaseModel):
+    id: UUID
+    # Не указанная цена остаётся прежней
+    price_top_1_3: Optional[int] = Field(None, ge=0)
+    price_top_4_5: Optional[int] = Field(None, ge=0)
+    price_top_6_10: Optional[int] = Field(None, ge=0)
+
+
+class KeywordPricesBulkUpdate(BaseModel):
+    items: List[KeywordPriceItem]
 
 
 class KeywordOut(KeywordUpdate):
@@ -58,8 +90,10 @@ class KeywordOut(KeywordUpdate):
     cost: Optional[int] = 0
     trend: Optional[TrendEnum] = TrendEnum.stable
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
 
 
 # --- Group ---
@@ -84,24 +118,27 @@ class GroupUpdate(BaseModel):
     project_id: Optional[UUID] = None
     is_archived: Optional[bool] = None
 
-    class Config:
-        allow_population_by_field_name = True
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
 
 
 class GroupOut(GroupBase):
     id: UUID
     keywords: List[KeywordOut] = []
+    keywords_count: Optional[int] = None  # заполняется, когда ключи не загружаются
 
-    class Config:
-        allow_population_by_field_name = True
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
 
 
 # --- Position ---
 
-class PositionOut(BaseModel):
-    id: UUID
+class PositionHistoryOut(BaseModel):
+    """Строка истории позиций: одинаковая для горячей таблицы и архива (у архивных строк нет id)."""
     keyword_id: UUID
     checked_at: datetime
     position: Optional[int] = None
@@ -110,8 +147,14 @@ class PositionOut(BaseModel):
     cost: int
     trend: TrendEnum
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
+
+
+class PositionOut(PositionHistoryOut):
+    id: UUID
 
 
 class PositionOutType(PositionOut):
@@ -148,9 +191,10 @@ class KeywordIntervalsType(KeywordIntervals):
 class ProjectBase(BaseModel):
     domain: constr(min_length=1)
 
-    class Config:
-        allow_population_by_field_name = True
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
 
 
 class ProjectCreate(ProjectBase):
@@ -161,9 +205,10 @@ class ProjectUpdate(BaseModel):
     domain: Optional[constr(min_length=1)] = None
     groups: Optional[List[GroupUpdate]] = None
 
-    class Config:
-        allow_population_by_field_name = True
-        orm_mode = True
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
 
 
 class ProjectOut(ProjectBase):
@@ -260,3 +305,78 @@ class UserOut(BaseModel):
     model_config = ConfigDict(
         from_attributes=True,
     )
+
+
+# --- Сводка по проектам ---
+
+class ProjectSummaryOut(BaseModel):
+    id: UUID
+    domain: str
+    created_at: datetime = Field(..., alias="createdAt")
+    client_link: str = Field(..., alias="clientLink")
+    group_count: int = 0
+    active_keywords: int = 0
+    top10_share: float = 0  # доля активных ключей в топ-10, от 0 до 1
+    mtd_cost: int = 0  # стоимость с начала месяца
+    last_checked: Optional[datetime] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True
+    )
+
+
+class ProjectSummaryPage(BaseModel):
+    items: List[ProjectSummaryOut]
+    next_cursor: Optional[str] = None
+
+
+# --- Дашборд ---
+
+class DashboardFailingGroup(BaseModel):
+    id: UUID
+    title: str
+    region: str
+    failed_keywords: int = 0  # активные ключи без позиции за сегодня
+    last_checked: Optional[datetime] = None
+
+
+class DashboardProjectOut(BaseModel):
+    project_id: UUID
+    domain: str
+    keywords: int = 0
+    top3: int = 0
+    top5: int = 0
+    top10: int = 0
+    beyond_top10: int = 0
+    unchecked: int = 0
+    trend_up: int = 0
+    trend_down: int = 0
+    trend_stable: int = 0
+    cost_today: int = 0
+    cost_mtd: int = 0
+    last_checked: Optional[datetime] = None
+    failing_groups: List[DashboardFailingGroup] = []
+    refreshed_at: datetime
+
+
+class DashboardTotals(BaseModel):
+    projects: int = 0
+    keywords: int = 0
+    top3: int = 0
+    top5: int = 0
+    top10: int = 0
+    beyond_top10: int = 0
+    unchecked: int = 0
+    trend_up: int = 0
+    trend_down: int = 0
+    trend_stable: int = 0
+    cost_today: int = 0
+    cost_mtd: int = 0
+    failing_groups: int = 0
+
+
+class DashboardOut(BaseModel):
+    refreshed_at: Optional[datetime] = None
+    totals: DashboardTotals
+    projects: List[DashboardProjectOut]
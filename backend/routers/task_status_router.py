@@ -1,14 +1,76 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
+import asyncio
+
+from fastapi import APIRouter, Query, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta
 from sqlalchemy import and_, func, cast, Date
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.db_init import get_db
 from database.models import TaskStatus, TaskStatusEnum
 from sqlalchemy.future import select
+from services.check_planner import build_check_plan_async
+from services.task_progress import get_progress_broadcaster, get_progress_snapshot, is_terminal_event
 
 router = APIRouter()
 
 
+@router.get("/plan")
+async def get_check_plan(db: AsyncSession = Depends(get_db)):
+    """
+    Пробный (dry-run) план ночного снятия позиций: какие группы будут проверены,
+    в каком порядке, сколько запросов к API потребуется и уложится ли задача в окно.
+    """
+    return await build_check_plan_async(db)
+
+
+# Интервал комментария-пинга: держит соединение открытым через прокси
+SSE_HEARTBEAT_SECONDS = 15
+
+
+@router.get("/{task_id}/stream")
+async def stream_task_progress(task_id: str, request: Request):
+    """
+    Прогресс задачи снятия позиций в формате Server-Sent Events.
+    Сначала отправляется последний снимок, затем события по мере публикации; поток закрывается
+    после завершения задачи.
+    """
+    broadcaster = get_progress_broadcaster()
+
+    async def events():
+        # Снимок читается после подтверждённой подписки, чтобы не потерять события между ними
+        queue = await broadcaster.subscribe(task_id)
+        try:
+            snapshot = await get_progress_snapshot(task_id)
+            if snapshot is not None:
+                yield b"data: " + snapshot + b"\n\n"
+                if is_terminal_event(snapshot):
+                    return
+            while True:
+                if await request.is_disconnected():
+                    return
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Если подписка оборвалась, о завершении задачи узнаём из снимка
+                    snapshot = await get_progress_snapshot(task_id)
+                    if snapshot is not None and is_terminal_event(snapshot):
+                        yield b"data: " + snapshot + b"\n\n"
+                        return
+                    yield b": ping\n\n"
+                    continue
+                yield b"data: " + payload + b"\n\n"
+                if is_terminal_event(payload):
+                    return
+        finally:
+            broadcaster.unsubscribe(task_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/")
 async def get_task_status_by_date(
         date_str: str = Query(default=None, description="Дата в формате YYYY-MM-DD, например 2025-08-08"),
@@ -1,4 +1,46 @@
+import base64
+import json
 import uuid
+from datetime import datetime
+
 
 def generate_client_link():
-    return str(uuid.uuid4())
\ No newline at end of file
+    return str(uuid.uuid4())
+
+
+def contains_pattern(search: str) -> str:
+    """Шаблон ILIKE «содержит подстроку» с экранированием спецсимволов (использовать с escape="\\")."""
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def encode_cursor(created_at: datetime, item_id) -> str:
+    """Курсор keyset-пагинации: позиция последнего элемента страницы (created_at, id)."""
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Обратное к encode_cursor. Бросает ValueError на некорректном курсоре."""
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(item_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_sort_cursor(value, item_id) -> str:
+    """Курсор для keyset-пагинации по произвольной колонке сортировки: (значение, id)."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, str(item_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_sort_cursor(cursor: str):
+    """Возвращает (значение, UUID); значения-даты остаются строками ISO. Бросает ValueError."""
+    try:
+        value, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return value, uuid.UUID(item_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
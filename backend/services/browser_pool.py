@@ -0,0 +1,121 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "3"))
+# После скольких страниц сессия браузера пересоздаётся (утечки памяти Chrome, накопленные cookies)
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+BROWSER_ACQUIRE_TIMEOUT = int(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "300"))
+
+
+def create_chrome_driver() -> webdriver.Chrome:
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(options=options)
+
+
+class BrowserSession:
+    """Тёплая сессия headless Chrome, переиспользуемая между ключевыми словами."""
+
+    def __init__(self):
+        self.driver = create_chrome_driver()
+        self.pages = 0
+        # Выставляется вызывающим кодом, например после капчи: сессия будет пересоздана при возврате в пул
+        self.needs_recycle = False
+
+    def is_healthy(self) -> bool:
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии браузера: {e}")
+
+
+class BrowserPool:
+    """
+    Ограниченный пул сессий Chrome. Сессии создаются лениво, перед выдачей проверяются,
+    а после max_pages страниц или капчи закрываются и заменяются новыми.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.size = size
+        self.max_pages = max_pages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def _take_idle(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    @contextmanager
+    def session(self, timeout: int = BROWSER_ACQUIRE_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Нет свободных сессий браузера в пуле")
+
+        browser = None
+        try:
+            browser = self._take_idle()
+            if browser is not None and not browser.is_healthy():
+                logger.info("Сессия браузера не отвечает, пересоздаём")
+                browser.quit()
+                browser = None
+            if browser is None:
+                browser = BrowserSession()
+
+            yield browser
+            browser.pages += 1
+        except Exception:
+            if browser is not None:
+                browser.needs_recycle = True
+            raise
+        finally:
+            if browser is not None:
+                if self._closed or browser.needs_recycle or browser.pages >= self.max_pages:
+                    browser.quit()
+                else:
+                    self._idle.put(browser)
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        while True:
+            browser = self._take_idle()
+            if browser is None:
+                break
+            browser.quit()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Пул браузеров процесса воркера: создаётся один раз и живёт между задачами."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
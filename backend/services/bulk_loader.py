@@ -0,0 +1,190 @@
+import argparse
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database.db_init import engine_sync
+from database.partitions import ensure_position_partitions
+from services.dashboard import refresh_dashboard_snapshots
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Память под сортировки дублей и оконную функцию на время загрузки
+BULK_LOAD_WORK_MEM = os.getenv("BULK_LOAD_WORK_MEM", "64MB")
+
+# Колонки входного CSV (с заголовком). frequency можно оставить пустой.
+CSV_COLUMNS = ("keyword_id", "checked_at", "position", "frequency")
+
+STAGING_DDL = (
+    "CREATE TEMP TABLE positions_staging ("
+    "keyword_id uuid NOT NULL, "
+    "checked_at timestamp NOT NULL, "
+    "position integer, "
+    "frequency integer"
+    ") ON COMMIT DROP"
+)
+
+# Один set-based INSERT: дубли внутри файла схлопываются, previous_position и trend
+# считаются оконной функцией по загружаемой истории, стоимость — по текущим ценам ключа.
+# Для первой загружаемой проверки ключа предыдущей служит последняя уже записанная проверка до неё.
+# Строки неизвестных ключей и уже существующие проверки пропускаются.
+MERGE_SQL = (
+    "INSERT INTO positions (id, keyword_id, checked_at, position, frequency, previous_position, cost, trend) "
+    "SELECT gen_random_uuid(), s.keyword_id, s.checked_at, s.position, s.frequency, s.previous_position, "
+    "CASE WHEN s.position BETWEEN 1 AND 3 THEN k.price_top_1_3 "
+    "WHEN s.position BETWEEN 4 AND 5 THEN k.price_top_4_5 "
+    "WHEN s.position BETWEEN 6 AND 10 THEN k.price_top_6_10 ELSE 0 END, "
+    "CAST(CASE WHEN s.previous_position IS NULL OR s.position IS NULL THEN 'stable' "
+    "WHEN s.position < s.previous_position THEN 'up' "
+    "WHEN s.position > s.previous_position THEN 'down' ELSE 'stable' END AS trendenum) "
+    "FROM ("
+    "SELECT d.*, lag(d.position, 1, seed.position) OVER (PARTITION BY d.keyword_id ORDER BY d.checked_at) "
+    "AS previous_position "
+    "FROM (SELECT DISTINCT ON (keyword_id, checked_at) keyword_id, checked_at, position, frequency "
+    "FROM positions_staging ORDER BY keyword_id, checked_at) d "
+    "LEFT JOIN ("
+    "SELECT f.keyword_id, (SELECT p.position FROM positions p "
+    "WHERE p.keyword_id = f.keyword_id AND p.checked_at < f.first_checked_at "
+    "ORDER BY p.checked_at DESC LIMIT 1) AS position "
+    "FROM (SELECT keyword_id, min(checked_at) AS first_checked_at FROM positions_staging GROUP BY keyword_id) f"
+    ") seed ON seed.keyword_id = d.keyword_id"
+    ") s "
+    "JOIN keywords k ON k.id = s.keyword_id "
+    "WHERE NOT EXISTS (SELECT 1 FROM positions p "
+    "WHERE p.keyword_id = s.keyword_id AND p.checked_at = s.checked_at)"
+)
+
+AFFECTED_DDL = (
+    "CREATE TEMP TABLE positions_affected ON COMMIT DROP AS "
+    "SELECT s.keyword_id, min(s.checked_at)::date AS first_day, max(s.checked_at)::date AS last_day "
+    "FROM positions_staging s JOIN keywords k ON k.id = s.keyword_id "
+    "GROUP BY s.keyword_id"
+)
+
+REBUILD_STATES_SQL = (
+    "INSERT INTO keyword_states (keyword_id, position, previous_position, frequency, cost, trend, checked_at) "
+    "SELECT DISTINCT ON (p.keyword_id) p.keyword_id, p.position, p.previous_position, p.frequency, "
+    "p.cost, p.trend, p.checked_at "
+    "FROM positions p JOIN positions_affected a ON a.keyword_id = p.keyword_id "
+    "ORDER BY p.keyword_id, p.checked_at DESC "
+    "ON CONFLICT (keyword_id) DO UPDATE SET "
+    "position = excluded.position, previous_position = excluded.previous_position, "
+    "frequency = excluded.frequency, cost = excluded.cost, trend = excluded.trend, "
+    "checked_at = excluded.checked_at "
+    "WHERE keyword_states.checked_at IS NULL OR keyword_states.checked_at <= excluded.checked_at"
+)
+
+REBUILD_DAILY_SQL = (
+    "INSERT INTO keyword_daily_stats (keyword_id, day, bucket, cost) "
+    "SELECT DISTINCT ON (p.keyword_id, p.checked_at::date) p.keyword_id, p.checked_at::date, "
+    "CASE WHEN p.position BETWEEN 1 AND 3 THEN 3 "
+    "WHEN p.position BETWEEN 4 AND 5 THEN 5 "
+    "WHEN p.position BETWEEN 6 AND 10 THEN 10 END, "
+    "p.cost "
+    "FROM positions p JOIN positions_affected a ON a.keyword_id = p.keyword_id "
+    "WHERE p.checked_at >= a.first_day AND p.checked_at < a.last_day + 1 "
+    "ORDER BY p.keyword_id, p.checked_at::date, p.checked_at DESC "
+    "ON CONFLICT (keyword_id, day) DO UPDATE SET bucket = excluded.bucket, cost = excluded.cost"
+)
+
+REBUILD_INTERVALS_SQL = (
+    "INSERT INTO keyword_interval_stats "
+    "(keyword_id, interval_start, days_top3, days_top5, days_top10, cost) "
+    "SELECT d.keyword_id, "
+    "pr.created_at::date + (floor((d.day - pr.created_at::date) / 14.0) * 14)::int AS interval_start, "
+    "count(*) FILTER (WHERE d.bucket = 3), "
+    "count(*) FILTER (WHERE d.bucket = 5), "
+    "count(*) FILTER (WHERE d.bucket = 10), "
+    "coalesce(sum(d.cost), 0) "
+    "FROM keyword_daily_stats d "
+    "JOIN positions_affected a ON a.keyword_id = d.keyword_id "
+    "JOIN keywords k ON k.id = d.keyword_id "
+    "JOIN groups g ON g.id = k.group_id "
+    "JOIN projects pr ON pr.id = g.project_id "
+    "GROUP BY d.keyword_id, interval_start "
+    "ON CONFLICT (keyword_id, interval_start) DO UPDATE SET "
+    "days_top3 = excluded.days_top3, days_top5 = excluded.days_top5, "
+    "days_top10 = excluded.days_top10, cost = excluded.cost"
+)
+
+# Затронутые проекты получают новую версию, чтобы ETag отчётов сменился
+BUMP_PROJECT_VERSIONS_SQL = (
+    "UPDATE projects SET version = version + 1, updated_at = timezone('utc', now()) "
+    "WHERE id IN (SELECT g.project_id FROM positions_affected a "
+    "JOIN keywords k ON k.id = a.keyword_id JOIN groups g ON g.id = k.group_id)"
+)
+
+AFFECTED_PROJECTS_SQL = (
+    "SELECT DISTINCT g.project_id FROM positions_affected a "
+    "JOIN keywords k ON k.id = a.keyword_id JOIN groups g ON g.id = k.group_id"
+)
+
+
+def load_positions_csv(path: str, engine=engine_sync) -> dict:
+    """
+    Загружает историю позиций из CSV через COPY во временную таблицу и переносит её в positions
+    одним INSERT ... SELECT. Всё выполняется в одной транзакции; после вставки пересчитываются
+    keyword_states, сводки по затронутым ключам и снимки дашборда их проектов.
+    """
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        conn.execute(text(STAGING_DDL))
+
+        cursor = conn.connection.cursor()
+        with open(path, "r", encoding="utf-8") as f:
+            cursor.copy_expert(
+                f"COPY positions_staging ({', '.join(CSV_COLUMNS)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                f,
+            )
+        copied = cursor.rowcount
+        copy_seconds = time.perf_counter() - started
+
+        # У временной таблицы нет статистики: без ANALYZE планировщик рассчитывает на пару тысяч строк
+        conn.execute(text("ANALYZE positions_staging"))
+        conn.execute(text(f"SET LOCAL work_mem = '{BULK_LOAD_WORK_MEM}'"))
+
+        bounds = conn.execute(text("SELECT min(checked_at), max(checked_at) FROM positions_staging")).one()
+        if bounds[0] is None:
+            return {"rows": 0, "inserted": 0, "seconds": 0.0, "rows_per_second": 0}
+
+        # Партиции под весь загружаемый диапазон, иначе строки уйдут в positions_default
+        ensure_position_partitions(conn, start=bounds[0], end=bounds[1])
+
+        inserted = conn.execute(text(MERGE_SQL)).rowcount
+
+        # Повторная загрузка без новых строк ничего не меняет: версии и ETag отчётов остаются прежними
+        if inserted:
+            conn.execute(text(AFFECTED_DDL))
+            conn.execute(text(REBUILD_STATES_SQL))
+            conn.execute(text(REBUILD_DAILY_SQL))
+            conn.execute(text(REBUILD_INTERVALS_SQL))
+            conn.execute(text(BUMP_PROJECT_VERSIONS_SQL))
+            refresh_dashboard_snapshots(conn, conn.execute(text(AFFECTED_PROJECTS_SQL)).scalars().all())
+
+    seconds = time.perf_counter() - started
+    stats = {
+        "rows": copied,
+        "inserted": inserted,
+        "seconds": round(seconds, 2),
+        "copy_seconds": round(copy_seconds, 2),
+        "rows_per_second": int(copied / seconds) if seconds else copied,
+    }
+    logger.info(f"Bulk position load finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Загрузка истории позиций из CSV через COPY")
+    parser.add_argument("path", help=f"CSV с заголовком: {', '.join(CSV_COLUMNS)}")
+    args = parser.parse_args()
+
+    result = load_positions_csv(args.path)
+    print(f"{result['rows']} rows read, {result['inserted']} inserted in {result['seconds']}s "
+          f"({result['rows_per_second']} rows/s)")
@@ -0,0 +1,79 @@
+import logging
+import os
+from datetime import datetime
+
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Страховочный срок жизни кеша клиентского просмотра; обычно его сбрасывает задача снятия позиций
+CLIENT_VIEW_CACHE_TTL = int(os.getenv("CLIENT_VIEW_CACHE_TTL", "3600"))
+
+CLIENT_VIEW_PERIODS = ("week", "month", "custom")
+
+_async_client = None
+_sync_client = None
+
+
+def get_async_redis():
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(REDIS_URL)
+    return _async_client
+
+
+def get_sync_redis():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(REDIS_URL)
+    return _sync_client
+
+
+def client_view_key(client_link: str, period: str) -> str:
+    return f"client_view:{client_link}:{period}"
+
+
+def client_view_tag(version: int) -> bytes:
+    """
+    Метка записи кеша: версия проекта и текущая дата (UTC). Периоды week/month считаются
+    от текущего дня, поэтому после полуночи запись устаревает даже без новых данных — как ETag.
+    """
+    return f"{version}:{datetime.utcnow().date()}".encode()
+
+
+async def get_cached_client_view(client_link: str, period: str, version: int):
+    """
+    Сериализованный ответ client_view или None. Запись хранится вместе с версией проекта и датой,
+    поэтому любая правка проекта или смена дня делает её недействительной без явного сброса.
+    Ошибки Redis не мешают отдать ответ из базы.
+    """
+    try:
+        cached = await get_async_redis().get(client_view_key(client_link, period))
+    except Exception as e:
+        logger.error(f"Failed to read client view cache: {e}")
+        return None
+    if cached is None:
+        return None
+    cached_tag, _, payload = cached.partition(b"\n")
+    return payload if cached_tag == client_view_tag(version) else None
+
+
+async def set_cached_client_view(client_link: str, period: str, version: int, payload: bytes):
+    try:
+        await get_async_redis().set(client_view_key(client_link, period), client_view_tag(version) + b"\n" + payload,
+                                    ex=CLIENT_VIEW_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Failed to write client view cache: {e}")
+
+
+def invalidate_client_view(client_link: str):
+    """Сбрасывает кеш клиентского просмотра проекта (вызывается из Celery после записи позиций)."""
+    try:
+        get_sync_redis().delete(*[client_view_key(client_link, period) for period in CLIENT_VIEW_PERIODS])
+    except Exception as e:
+        logger.error(f"Failed to invalidate client view cache: {e}")
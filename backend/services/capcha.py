@@ -1,7 +1,6 @@
-from database.models import Project, Keyword, Position, TrendEnum
+from database.models import Project, Position, TrendEnum
 from datetime import datetime
 from uuid import UUID
-import requests
 import urllib.parse as urlparse
 from services.celery_app import celery_app
 import os
@@ -9,14 +8,20 @@ from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from concurrent.futures import ThreadPoolExecutor
 from selenium.webdriver.common.by import By
 import time
-from twocaptcha import TwoCaptcha
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
+from services.browser_pool import get_browser_pool
+from services.captcha_service import get_captcha_service, CAPTCHA_MAX_WAIT
+from services.keyword_state import calculate_cost, get_previous_position, apply_keyword_state
+from services.rollups import record_daily_rollup
+from services.cache import invalidate_client_view
+from services.project_version import bump_project_version_sync
+from services.dashboard import refresh_dashboard_snapshots_safe
+from services.serp_http import (SerpChallengeDetected, build_search_url, fetch_yandex_position_http,
+                                find_domain_position, import_browser_cookies)
 
 load_dotenv()
 
@@ -26,10 +31,7 @@ DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "seo_parser_db")
 
-API_KEY_CAPTCHA = os.getenv("API_KEY_CAPTCHA")
-solver = TwoCaptcha(API_KEY_CAPTCHA)
-
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 
@@ -45,78 +47,18 @@ def region_to_lr_code(region: str) -> int:
     }
     return mapping.get(region, 213)  # по умолчанию Москва
 
-def save_captcha_screenshot(driver, folder='uploads') -> str:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"captcha_{timestamp}.png"
-    filepath = os.path.join(folder, filename)
-    driver.save_screenshot(filepath)
-    logger.info(f"Скриншот капчи сохранён: {filepath}")
-    return filepath
-
-def solve_yandex_smartcaptcha(driver, api_key=API_KEY_CAPTCHA, max_wait=240, max_retries=3) -> bool:
+def solve_yandex_smartcaptcha(driver, max_wait=CAPTCHA_MAX_WAIT, max_retries=3) -> bool:
     """
     Решение SmartCaptcha через отправку скриншота на 2Captcha.
+    Скриншот не сохраняется на диск, ожидание решения не мешает другим сессиям браузера.
     """
+    captcha_service = get_captcha_service()
     for attempt in range(max_retries):
         logger.info(f"Попытка решения SmartCaptcha {attempt + 1} из {max_retries}")
         try:
-            screenshot_path = "captcha.png"
-            driver.save_screenshot(screenshot_path)
-            logger.info(f"Скриншот капчи сохранён: {screenshot_path}")
-
-            with open(screenshot_path, 'rb') as f:
-                files = {'file': f}
-                data = {
-                    'key': api_key,
-                    'method': 'post',
-                    'json': 1
-                }
-                resp_in = requests.post("http://2captcha.com/in.php", files=files, data=data)
-
-            if resp_in.status_code != 200:
-                logger.error(f"Ошибка отправки капчи: HTTP {resp_in.status_code}")
-                return False
-
-            resp_json = resp_in.json()
-            if resp_json.get('status') != 1:
-                logger.error(f"Ошибка отправки капчи: {resp_json.get('request')}")
-                return False
-
-            captcha_id = resp_json['request']
-            logger.info(f"Задача капчи принята, ID: {captcha_id}")
-
-            wait_time = 0
-            while wait_time < max_wait:
-                time.sleep(5)
-                wait_time += 5
-
-                resp_res = requests.get("http://2captcha.com/res.php", params={
-                    'key': api_key,
-                    'action': 'get',
-                    'id': captcha_id,
-                    'json': 1
-                })
-
-                if resp_res.status_code != 200:
-                    logger.warning(f"Ошибка получения решения капчи: HTTP {resp_res.status_code}")
-                    continue
-
-                res_json = resp_res.json()
-                if res_json.get('status') == 1:
-                    token = res_json['request']
-                    logger.info("SmartCaptcha решена, вставляем токен...")
-                    break
-                elif res_json.get('request') == 'CAPCHA_NOT_READY':
-                    logger.info("Решение капчи ещё не готово, ждём...")
-                    continue
-                else:
-                    logger.error(f"Ошибка при решении капчи: {res_json.get('request')}")
-                    return False
-            else:
-                logger.error("Таймаут ожидания решения капчи")
-                return False
+            screenshot = driver.get_screenshot_as_png()
+            token = captcha_service.submit_image(screenshot, max_wait=max_wait).result(timeout=max_wait + 30)
+            logger.info("SmartCaptcha решена, вставляем токен...")
 
             driver.execute_script("""
                 var el = document.querySelector('input[name="smart-token"]');
@@ -131,28 +73,17 @@ def solve_yandex_smartcaptcha(driver, api_key=API_KEY_CAPTCHA, max_wait=240, max
             except Exception:
                 logger.info("Кнопка отправки не найдена, возможно капча решилась автоматически")
 
-            time.sleep(7)
-
-            # Удаляем скриншот после использования
-            import os
-            if os.path.exists(screenshot_path):
-                os.remove(screenshot_path)
-
-            return True
+            return wait_for_serp(driver)
 
         except Exception as e:
-            logger.error(f"Ошибка при решении капчи: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            import os
-            if os.path.exists(screenshot_path):
-                os.remove(screenshot_path)
+            logger.error(f"Ошибка при решении капчи: {e}", exc_info=True)
             if attempt < max_retries - 1:
                 logger.info("Повторная попытка решения капчи через 10 секунд...")
                 time.sleep(10)
             else:
                 logger.error("Максимальное количество попыток исчерпано")
                 return False
+    return False
 
 
 def wait_for_recaptcha_iframe(driver, timeout=15):
@@ -195,7 +126,7 @@ def click_recaptcha_checkbox(driver, timeout=15) -> bool:
         driver.switch_to.default_content()
 
 
-def solve_recaptcha_v2(driver, api_key=API_KEY_CAPTCHA, max_wait=180) -> bool:
+def solve_recaptcha_v2(driver, max_wait=180) -> bool:
     try:
         sitekey_elem = WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, '.g-recaptcha'))
@@ -215,53 +146,13 @@ def solve_recaptcha_v2(driver, api_key=API_KEY_CAPTCHA, max_wait=180) -> bool:
     page_url = driver.current_url
     logger.info(f"Отправляем reCAPTCHA v2 на решение, sitekey: {sitekey}, url: {page_url}")
 
-    resp_in = requests.post("http://2captcha.com/in.php", data={
-        'key': api_key,
-        'method': 'userrecaptcha',
-        'googlekey': sitekey,
-        'pageurl': page_url,
-        'json': 1
-    })
-
-    if resp_in.status_code != 200:
-        logger.error(f"Ошибка отправки reCAPTCHA: HTTP {resp_in.status_code}")
-        return False
-
-    resp_json = resp_in.json()
-    if resp_json.get('status') != 1:
-        logger.error(f"Ошибка отправки reCAPTCHA: {resp_json.get('request')}")
-        return False
-
-    captcha_id = resp_json['request']
-    logger.info(f"Задача reCAPTCHA принята, ID: {captcha_id}")
-
-    wait_time = 0
-    while wait_time < max_wait:
-        time.sleep(5)
-        wait_time += 5
-        resp_res = requests.get("http://2captcha.com/res.php", params={
-            'key': api_key,
-            'action': 'get',
-            'id': captcha_id,
-            'json': 1
-        })
-        if resp_res.status_code != 200:
-            logger.warning(f"Ошибка получения решения reCAPTCHA: HTTP {resp_res.status_code}")
-            continue
-        res_json = resp_res.json()
-        if res_json.get('status') == 1:
-            token = res_json['request']
-            logger.info("reCAPTCHA решена, вставляем токен...")
-            break
-        elif res_json.get('request') == 'CAPCHA_NOT_READY':
-            logger.info("Решение reCAPTCHA ещё не готово, ждём...")
-            continue
-        else:
-            logger.error(f"Ошибка при решении reCAPTCHA: {res_json.get('request')}")
-            return False
-    else:
-        logger.error("Таймаут ожидания решения reCAPTCHA")
+    try:
+        token = get_captcha_service().submit_recaptcha_v2(sitekey, page_url, max_wait=max_wait) \
+            .result(timeout=max_wait + 30)
+    except Exception as e:
+        logger.error(f"Ошибка при решении reCAPTCHA: {e}")
         return False
+    logger.info("reCAPTCHA решена, вставляем токен...")
 
     driver.execute_script("""
         document.getElementById('g-recaptcha-response').style.display = 'block';
@@ -275,57 +166,95 @@ def solve_recaptcha_v2(driver, api_key=API_KEY_CAPTCHA, max_wait=180) -> bool:
     except Exception:
         logger.info("Кнопка отправки не найдена, возможно reCAPTCHA решилась автоматически")
 
-    time.sleep(7)
     return True
 
 
-def get_yandex_position_selenium(domain: str, keyword: str, region: str) -> int | None:
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(options=options)
+SERP_WAIT_TIMEOUT = 15
+
+
+def is_captcha_page(driver) -> bool:
+    return "captcha" in driver.current_url or "Подтвердите, что вы не робот" in driver.page_source
 
-    lr_code = region_to_lr_code(region)
-    search_url = f"https://yandex.ru/search/?text={keyword}&lr={lr_code}&numdoc=100"
 
+def serp_or_captcha_loaded(driver):
+    """Условие для WebDriverWait: загрузилась выдача или показана капча."""
+    if "captcha" in driver.current_url:
+        return "captcha"
+    if driver.find_elements(By.CSS_SELECTOR, ".serp-item"):
+        return "serp"
+    if "Подтвердите, что вы не робот" in driver.page_source:
+        return "captcha"
+    return False
+
+
+def wait_for_serp(driver, timeout=SERP_WAIT_TIMEOUT) -> bool:
     try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: "captcha" not in d.current_url and d.find_elements(By.CSS_SELECTOR, ".serp-item")
+        )
+        return True
+    except Exception:
+        return False
+
+
+def get_yandex_position_selenium(domain: str, keyword: str, region: str, browser_pool=None) -> int | None:
+    browser_pool = browser_pool or get_browser_pool()
+
+    lr_code = region_to_lr_code(region)
+    search_url = build_search_url(keyword, lr_code)
+
+    with browser_pool.session() as browser:
+        driver = browser.driver
         driver.get(search_url)
-        time.sleep(3)
 
-        if "captcha" in driver.current_url or "Подтвердите, что вы не робот" in driver.page_source:
+        try:
+            state = WebDriverWait(driver, SERP_WAIT_TIMEOUT).until(serp_or_captcha_loaded)
+        except Exception:
+            state = "captcha" if is_captcha_page(driver) else "serp"
+
+        if state == "captcha":
+            # После капчи сессию лучше не переиспользовать: Яндекс помечает её как подозрительную
+            browser.needs_recycle = True
             logger.info("Появилась капча, пытаемся кликнуть по чекбоксу...")
-            save_captcha_screenshot(driver)
 
             clicked = click_recaptcha_checkbox(driver)
             if clicked:
                 logger.info("Ждём обработки капчи после клика...")
-                time.sleep(5)
+                passed = wait_for_serp(driver)
             else:
-                logger.info("Клик по чекбоксу не удался, пытаемся решить через 2Captcha API...")
-                solved = solve_recaptcha_v2(driver, API_KEY_CAPTCHA)
-                if not solved:
+                passed = False
+
+            if not passed:
+                logger.info("Клик по чекбоксу не помог, пытаемся решить через 2Captcha API...")
+                solved = solve_recaptcha_v2(driver)
+                if not solved or not wait_for_serp(driver):
                     logger.error("Не удалось решить капчу, прерываем выполнение")
                     return None
-                time.sleep(3)
 
-        results = driver.find_elements(By.CSS_SELECTOR, ".serp-item")
-        position = None
-        for idx, item in enumerate(results, start=1):
-            try:
-                link = item.find_element(By.CSS_SELECTOR, "a.organic__url")
-                href = link.get_attribute("href").lower()
-                if domain.lower() in href:
-                    position = idx
-                    break
-            except Exception:
-                continue
+            # Cookies прошедшей проверку сессии позволяют следующим запросам снова идти по HTTP
+            import_browser_cookies(driver.get_cookies())
 
-        return position
+        hrefs = []
+        for item in driver.find_elements(By.CSS_SELECTOR, ".serp-item"):
+            links = item.find_elements(By.CSS_SELECTOR, "a.organic__url")
+            hrefs.append(links[0].get_attribute("href") if links else None)
 
-    finally:
-        driver.quit()
+        return find_domain_position(hrefs, domain)
+
+
+def get_yandex_position(domain: str, keyword: str, region: str, browser_pool=None) -> int | None:
+    """
+    Сначала пробуем получить выдачу обычным HTTP-запросом, браузер из пула
+    используется только если Яндекс показал капчу или JS-проверку.
+    """
+    try:
+        return fetch_yandex_position_http(domain, keyword, region_to_lr_code(region))
+    except SerpChallengeDetected as e:
+        logger.info(f"HTTP-запрос по '{keyword}' не прошёл ({e}), переключаемся на браузер")
+    except Exception as e:
+        logger.warning(f"Ошибка HTTP-запроса выдачи по '{keyword}': {e}, переключаемся на браузер")
+
+    return get_yandex_position_selenium(domain, keyword, region, browser_pool)
 
 
 @celery_app.task(name="tasks.parse_positions_task")
@@ -339,26 +268,31 @@ def parse_positions_task(project_id: str):
             logger.error(f"Проект {project_id} не найден")
             return
 
-        for keyword in project.keywords:
-            position = get_yandex_position_selenium(project.domain, keyword.keyword, project.region)
-            previous_position = None
-            last_position_record = (
-                session.query(Position)
-                .filter(Position.keyword_id == keyword.id)
-                .order_by(Position.checked_at.desc())
-                .first()
-            )
-            if last_position_record:
-                previous_position = last_position_record.position
-
-            if position is None or position > 10:
-                cost = 0
-            elif 1 <= position <= 3:
-                cost = keyword.price_top_1_3
-            elif 4 <= position <= 5:
-                cost = keyword.price_top_4_5
-            else:  # 6-10
-                cost = keyword.price_top_6_10
+        keywords = [
+            (keyword, group.region)
+            for group in project.groups if not group.is_archived
+            for keyword in group.keywords if keyword.is_check
+        ]
+
+        # Ключевые слова распределяются по сессиям пула параллельно, запись в БД — в этом потоке
+        browser_pool = get_browser_pool()
+
+        def check_keyword(item):
+            keyword, region = item
+            try:
+                return get_yandex_position(project.domain, keyword.keyword, region, browser_pool)
+            except Exception as e:
+                logger.error(f"Ошибка при проверке ключевого слова '{keyword.keyword}': {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=browser_pool.size) as executor:
+            positions = list(executor.map(check_keyword, keywords))
+
+        for (keyword, _), position in zip(keywords, positions):
+            checked_at = datetime.utcnow()
+            previous_position = get_previous_position(keyword, checked_at)
+
+            cost = calculate_cost(keyword, position)
 
             if previous_position is None:
                 trend = TrendEnum.stable
@@ -373,7 +307,7 @@ def parse_positions_task(project_id: str):
 
             pos_record = Position(
                 keyword_id=keyword.id,
-                checked_at=datetime.utcnow(),
+                checked_at=checked_at,
                 position=position,
                 previous_position=previous_position,
                 cost=cost,
@@ -381,7 +315,18 @@ def parse_positions_task(project_id: str):
             )
             session.add(pos_record)
 
+            state = keyword.state
+            checked_today = state is not None and state.checked_at is not None \
+                and state.checked_at.date() == checked_at.date()
+            record_daily_rollup(session, keyword.id, project.created_at.date(), checked_at.date(), position, cost,
+                                old_position=state.position if checked_today else None,
+                                old_cost=state.cost if checked_today else 0, replaced=checked_today)
+            apply_keyword_state(session, keyword, checked_at, position, previous_position, None, cost, trend)
+
+        bump_project_version_sync(session, project_id=project.id)
         session.commit()
+        invalidate_client_view(project.client_link)
+        refresh_dashboard_snapshots_safe(session, [project.id])
         logger.info(f"Парсер успешно завершён для проекта {project_id}")
 
     except Exception as e:
@@ -0,0 +1,163 @@
+import asyncio
+import base64
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import aiohttp
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+API_KEY_CAPTCHA = os.getenv("API_KEY_CAPTCHA")
+
+CAPTCHA_IN_URL = "http://2captcha.com/in.php"
+CAPTCHA_RES_URL = "http://2captcha.com/res.php"
+
+CAPTCHA_POLL_INTERVAL = 5
+CAPTCHA_MAX_WAIT = 240
+
+
+class CaptchaError(Exception):
+    pass
+
+
+class CaptchaService:
+    """
+    Асинхронный клиент 2Captcha. Работает в собственном event loop в фоновом потоке:
+    задачи отправляются сразу, а все ожидающие решения опрашиваются одним запросом
+    res.php?action=get&ids=... за цикл. Потоки браузеров получают concurrent Future
+    и ждут только свой токен, не блокируя остальные сессии.
+    """
+
+    def __init__(self, api_key: str = API_KEY_CAPTCHA, poll_interval: int = CAPTCHA_POLL_INTERVAL):
+        self.api_key = api_key
+        self.poll_interval = poll_interval
+        self._pending = {}  # captcha_id -> (Future, deadline)
+        self._loop = None
+        self._http = None
+        self._started = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="captcha-service", daemon=True)
+        thread.start()
+        self._started.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._poll_loop())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _get_http(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self._http
+
+    # --- Отправка задач ---
+
+    def submit_image(self, image_png: bytes, max_wait: int = CAPTCHA_MAX_WAIT) -> Future:
+        """Скриншот передаётся в памяти (base64), на диск ничего не пишется."""
+        data = {
+            "key": self.api_key,
+            "method": "base64",
+            "body": base64.b64encode(image_png).decode("ascii"),
+            "json": 1,
+        }
+        return self._submit(data, max_wait)
+
+    def submit_recaptcha_v2(self, sitekey: str, page_url: str, max_wait: int = CAPTCHA_MAX_WAIT) -> Future:
+        data = {
+            "key": self.api_key,
+            "method": "userrecaptcha",
+            "googlekey": sitekey,
+            "pageurl": page_url,
+            "json": 1,
+        }
+        return self._submit(data, max_wait)
+
+    def _submit(self, data: dict, max_wait: int) -> Future:
+        result = Future()
+        asyncio.run_coroutine_threadsafe(self._submit_async(data, max_wait, result), self._loop)
+        return result
+
+    async def _submit_async(self, data: dict, max_wait: int, result: Future):
+        try:
+            http = await self._get_http()
+            async with http.post(CAPTCHA_IN_URL, data=data) as resp:
+                if resp.status != 200:
+                    raise CaptchaError(f"Ошибка отправки капчи: HTTP {resp.status}")
+                resp_json = await resp.json(content_type=None)
+            if resp_json.get("status") != 1:
+                raise CaptchaError(f"Ошибка отправки капчи: {resp_json.get('request')}")
+
+            captcha_id = resp_json["request"]
+            logger.info(f"Задача капчи принята, ID: {captcha_id}")
+            self._pending[captcha_id] = (result, time.monotonic() + max_wait)
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+
+    # --- Общий цикл опроса ---
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._pending:
+                continue
+            try:
+                await self._poll_pending()
+            except Exception as e:
+                logger.warning(f"Ошибка опроса решений капчи: {e}")
+
+    async def _poll_pending(self):
+        now = time.monotonic()
+        for captcha_id, (result, deadline) in list(self._pending.items()):
+            if now > deadline:
+                self._pending.pop(captcha_id, None)
+                result.set_exception(CaptchaError(f"Таймаут ожидания решения капчи {captcha_id}"))
+
+        ids = list(self._pending)
+        if not ids:
+            return
+
+        http = await self._get_http()
+        params = {"key": self.api_key, "action": "get", "ids": ",".join(ids)}
+        async with http.get(CAPTCHA_RES_URL, params=params) as resp:
+            if resp.status != 200:
+                logger.warning(f"Ошибка получения решений капчи: HTTP {resp.status}")
+                return
+            text = await resp.text()
+
+        answers = text.split("|")
+        if len(answers) != len(ids):
+            logger.warning(f"Неожиданный ответ 2Captcha на пакетный запрос: {text[:200]}")
+            return
+
+        for captcha_id, answer in zip(ids, answers):
+            if answer == "CAPCHA_NOT_READY":
+                continue
+            result, _ = self._pending.pop(captcha_id)
+            if answer.startswith("ERROR") or answer.startswith("CAPCHA_"):
+                result.set_exception(CaptchaError(f"Ошибка при решении капчи {captcha_id}: {answer}"))
+            else:
+                logger.info(f"Капча {captcha_id} решена")
+                result.set_result(answer)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_captcha_service() -> CaptchaService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CaptchaService()
+            _service.start()
+        return _service
@@ -5,7 +5,7 @@ celery_app = Celery(
     "services",
     broker="redis://localhost:6379/0",
     backend="redis://localhost:6379/0",
-    include=["services.topvizor_task"]  # указываем модуль с задачами
+    include=["services.topvizor_task", "services.maintenance_task"]  # указываем модули с задачами
 )
 
 # Конфигурация Celery
@@ -20,4 +20,12 @@ celery_app.conf.beat_schedule = {
          "task": "services.topvizor_task.run_main_task",  # полный путь к задаче
          "schedule": crontab(hour=11, minute="30,55"), 
      },
+     "ensure_position_partitions": {
+         "task": "services.maintenance_task.ensure_position_partitions_task",
+         "schedule": crontab(hour=3, minute=0),
+     },
+     "archive_old_positions": {
+         "task": "services.maintenance_task.archive_old_positions_task",
+         "schedule": crontab(hour=3, minute=30),
+     },
  }
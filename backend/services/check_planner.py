@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta, timezone, time as dt_time
+from zoneinfo import ZoneInfo
+import os
+import logging
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select, and_
+
+from database.models import Project, Group, Keyword, TaskStatus, TaskStatusEnum
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Окно, в которое должна уложиться ночная задача снятия позиций, задаётся в часовом поясе celery beat.
+# В плане границы окна и время старта групп — naive UTC, как checked_at и остальные даты в базе.
+CHECK_WINDOW_START = os.getenv("CHECK_WINDOW_START", "11:30")
+CHECK_WINDOW_END = os.getenv("CHECK_WINDOW_END", "14:00")
+CHECK_WINDOW_TZ = os.getenv("CHECK_WINDOW_TZ", "Europe/Moscow")
+
+# Суточные лимиты API: 0 — без ограничения
+TOPVISOR_DAILY_QUOTA = int(os.getenv("TOPVISOR_DAILY_QUOTA", "0"))
+YANDEX_DAILY_QUOTA = int(os.getenv("YANDEX_DAILY_QUOTA", "0"))
+
+# Значения по умолчанию, пока нет истории запусков
+DEFAULT_SECONDS_PER_KEYWORD = float(os.getenv("DEFAULT_SECONDS_PER_KEYWORD", "1.5"))
+GROUP_OVERHEAD_SECONDS = float(os.getenv("GROUP_OVERHEAD_SECONDS", "5"))
+
+# Сколько последних успешных запусков учитывать при оценке задержки
+HISTORY_RUNS = 7
+
+# Яндекс Search API отдаёт по 10 результатов на страницу, ищем в первых 10 страницах
+YANDEX_PAGES_PER_KEYWORD = 10
+
+
+def _parse_window_time(value: str) -> dt_time:
+    hours, minutes = value.split(":")
+    return dt_time(int(hours), int(minutes))
+
+
+def check_window(now: datetime):
+    """Границы окна проверки на сутки, в которые попадает now (naive UTC); результат тоже naive UTC."""
+    tz = ZoneInfo(CHECK_WINDOW_TZ)
+    local_date = now.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    start = datetime.combine(local_date, _parse_window_time(CHECK_WINDOW_START), tzinfo=tz)
+    end = datetime.combine(local_date, _parse_window_time(CHECK_WINDOW_END), tzinfo=tz)
+    if end <= start:
+        end += timedelta(days=1)
+    return (local_date,
+            start.astimezone(timezone.utc).replace(tzinfo=None),
+            end.astimezone(timezone.utc).replace(tzinfo=None))
+
+
+def work_items_stmt():
+    """Активные группы с количеством ключей на проверку (is_check) и приоритетных ключей."""
+    checked = Keyword.is_check == True
+    return (
+        select(
+            Group.id.label("group_id"),
+            Group.title.label("group_title"),
+            Group.topvisor_id.label("topvisor_id"),
+            Project.id.label("project_id"),
+            Project.domain.label("domain"),
+            func.count(Keyword.id).filter(checked).label("keywords"),
+            func.count(Keyword.id).filter(and_(checked, Keyword.priority == True)).label("priority_keywords"),
+        )
+        .join(Project, Project.id == Group.project_id)
+        .join(Keyword, Keyword.group_id == Group.id)
+        .where(Group.is_archived == False, Group.topvisor_id != None)
+        .group_by(Group.id, Project.id)
+        .having(func.count(Keyword.id).filter(checked) > 0)
+    )
+
+
+def history_stmt():
+    """Результаты последних завершённых запусков run_main_task с замерами времени."""
+    return (
+        select(TaskStatus.result)
+        .where(
+            TaskStatus.task_name == "run_main_task",
+            TaskStatus.status == TaskStatusEnum.completed,
+        )
+        .order_by(TaskStatus.started_at.desc())
+        .limit(HISTORY_RUNS)
+    )
+
+
+def estimate_seconds_per_keyword(history_results) -> float:
+    total_seconds = 0.0
+    total_keywords = 0
+    for result in history_results:
+        timings = (result or {}).get("timings") or {}
+        seconds = timings.get("seconds") or 0
+        keywords = timings.get("keywords") or 0
+        groups = timings.get("groups") or 0
+        if keywords <= 0:
+            continue
+        # Убираем накладные расходы на группу, чтобы получить чистую задержку на ключ
+        total_seconds += max(seconds - groups * GROUP_OVERHEAD_SECONDS, 0)
+        total_keywords += keywords
+
+    if not total_keywords:
+        return DEFAULT_SECONDS_PER_KEYWORD
+    return total_seconds / total_keywords
+
+
+def build_check_plan(work_rows, history_results, now: datetime = None) -> dict:
+    """
+    Формирует план ночного снятия позиций: порядок групп, оценку числа запросов и длительности.
+    Группы с приоритетными ключами идут первыми. Всё, что не укладывается в квоту или окно,
+    помечается как отложенное.
+    """
+    now = now or datetime.utcnow()
+    plan_date, window_start, window_end = check_window(now)
+    window_seconds = (window_end - window_start).total_seconds()
+
+    seconds_per_keyword = estimate_seconds_per_keyword(history_results)
+
+    rows = sorted(
+        work_rows,
+        key=lambda r: (-r.priority_keywords, -r.keywords, r.domain, r.group_title)
+    )
+
+    items = []
+    planned_seconds = 0.0
+    topvisor_checks = 0
+    yandex_searches = 0
+    for row in rows:
+        duration = GROUP_OVERHEAD_SECONDS + row.keywords * seconds_per_keyword
+        row_searches = row.keywords * YANDEX_PAGES_PER_KEYWORD
+
+        deferred_reason = None
+        if TOPVISOR_DAILY_QUOTA and topvisor_checks + row.keywords > TOPVISOR_DAILY_QUOTA:
+            deferred_reason = "topvisor_quota"
+        elif YANDEX_DAILY_QUOTA and yandex_searches + row_searches > YANDEX_DAILY_QUOTA:
+            deferred_reason = "yandex_quota"
+        elif planned_seconds + duration > window_seconds:
+            deferred_reason = "window"
+
+        item = {
+            "group_id": str(row.group_id),
+            "group_title": row.group_title,
+            "project_id": str(row.project_id),
+            "domain": row.domain,
+            "topvisor_id": row.topvisor_id,
+            "keywords": row.keywords,
+            "priority_keywords": row.priority_keywords,
+            "estimated_seconds": round(duration, 1),
+            "deferred": deferred_reason is not None,
+            "deferred_reason": deferred_reason,
+        }
+        if deferred_reason is None:
+            planned_seconds += duration
+            topvisor_checks += row.keywords
+            yandex_searches += row_searches
+        items.append(item)
+
+    # Равномерно распределяем запас времени между группами, чтобы не было пиков нагрузки на API
+    planned_items = [item for item in items if not item["deferred"]]
+    slack = max(window_seconds - planned_seconds, 0)
+    gap = slack / len(planned_items) if planned_items else 0
+    cursor = window_start
+    for item in planned_items:
+        item["planned_start"] = cursor.isoformat()
+        cursor += timedelta(seconds=item["estimated_seconds"] + gap)
+
+    return {
+        "date": plan_date.isoformat(),
+        "window_start": window_start.isoformat(),
+        "window_end": window_end.isoformat(),
+        "seconds_per_keyword": round(seconds_per_keyword, 3),
+        "topvisor_quota": TOPVISOR_DAILY_QUOTA or None,
+        "yandex_quota": YANDEX_DAILY_QUOTA or None,
+        "planned_groups": len(planned_items),
+        "deferred_groups": len(items) - len(planned_items),
+        "planned_topvisor_checks": topvisor_checks,
+        "planned_yandex_searches": yandex_searches,
+        "estimated_seconds": round(planned_seconds, 1),
+        "fits_window": planned_seconds <= window_seconds and len(planned_items) == len(items),
+        "items": items,
+    }
+
+
+def build_check_plan_sync(session_db, now: datetime = None) -> dict:
+    work_rows = session_db.execute(work_items_stmt()).all()
+    history_results = session_db.execute(history_stmt()).scalars().all()
+    return build_check_plan(work_rows, history_results, now)
+
+
+async def build_check_plan_async(db, now: datetime = None) -> dict:
+    work_rows = (await db.execute(work_items_stmt())).all()
+    history_results = (await db.execute(history_stmt())).scalars().all()
+    return build_check_plan(work_rows, history_results, now)
@@ -0,0 +1,124 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+logger = logging.getLogger(__name__)
+
+# Счётчики снимка, которые суммируются в итог по всему портфелю
+DASHBOARD_COUNTERS = (
+    "keywords", "top3", "top5", "top10", "beyond_top10", "unchecked",
+    "trend_up", "trend_down", "trend_stable", "cost_today", "cost_mtd",
+)
+
+# Активные ключи — is_check в неархивных группах. Бакеты и тренды берутся из keyword_states,
+# стоимость — из keyword_daily_stats. Проблемная группа — в ней есть активный ключ,
+# который сегодня не получил позицию. Пустой :project_ids пересчитывает все проекты.
+REFRESH_SNAPSHOTS_SQL = text(
+    "WITH active AS ("
+    "SELECT g.project_id, g.id AS group_id, g.title, g.region, s.position, s.trend, s.checked_at "
+    "FROM groups g "
+    "JOIN keywords k ON k.group_id = g.id AND k.is_check "
+    "LEFT JOIN keyword_states s ON s.keyword_id = k.id "
+    "WHERE NOT g.is_archived AND (:project_ids IS NULL OR g.project_id = ANY(CAST(:project_ids AS uuid[])))"
+    "), keyword_stats AS ("
+    "SELECT project_id, count(*) AS keywords, "
+    "count(*) FILTER (WHERE position BETWEEN 1 AND 3) AS top3, "
+    "count(*) FILTER (WHERE position BETWEEN 4 AND 5) AS top5, "
+    "count(*) FILTER (WHERE position BETWEEN 6 AND 10) AS top10, "
+    "count(*) FILTER (WHERE checked_at IS NOT NULL AND (position IS NULL OR position > 10)) AS beyond_top10, "
+    "count(*) FILTER (WHERE checked_at IS NULL) AS unchecked, "
+    "count(*) FILTER (WHERE trend = 'up') AS trend_up, "
+    "count(*) FILTER (WHERE trend = 'down') AS trend_down, "
+    "count(*) FILTER (WHERE trend = 'stable') AS trend_stable, "
+    "max(checked_at) AS last_checked "
+    "FROM active GROUP BY project_id"
+    "), failing AS ("
+    "SELECT project_id, json_agg(json_build_object("
+    "'id', group_id, 'title', title, 'region', region, "
+    "'failed_keywords', failed_keywords, 'last_checked', last_checked) ORDER BY title) AS groups "
+    "FROM (SELECT project_id, group_id, title, region, max(checked_at) AS last_checked, "
+    "count(*) FILTER (WHERE checked_at IS NULL OR checked_at < :today) AS failed_keywords "
+    "FROM active GROUP BY project_id, group_id, title, region) per_group "
+    "WHERE failed_keywords > 0 GROUP BY project_id"
+    "), cost_stats AS ("
+    "SELECT g.project_id, "
+    "coalesce(sum(d.cost) FILTER (WHERE d.day = :today), 0) AS cost_today, "
+    "coalesce(sum(d.cost), 0) AS cost_mtd "
+    "FROM keyword_daily_stats d "
+    "JOIN keywords k ON k.id = d.keyword_id "
+    "JOIN groups g ON g.id = k.group_id "
+    "WHERE d.day >= :month_start AND d.day <= :today "
+    "AND (:project_ids IS NULL OR g.project_id = ANY(CAST(:project_ids AS uuid[]))) "
+    "GROUP BY g.project_id"
+    ") "
+    "INSERT INTO dashboard_snapshots (project_id, data, refreshed_at) "
+    "SELECT p.id, json_build_object("
+    "'domain', p.domain, "
+    "'keywords', coalesce(ks.keywords, 0), "
+    "'top3', coalesce(ks.top3, 0), "
+    "'top5', coalesce(ks.top5, 0), "
+    "'top10', coalesce(ks.top10, 0), "
+    "'beyond_top10', coalesce(ks.beyond_top10, 0), "
+    "'unchecked', coalesce(ks.unchecked, 0), "
+    "'trend_up', coalesce(ks.trend_up, 0), "
+    "'trend_down', coalesce(ks.trend_down, 0), "
+    "'trend_stable', coalesce(ks.trend_stable, 0), "
+    "'cost_today', coalesce(cs.cost_today, 0), "
+    "'cost_mtd', coalesce(cs.cost_mtd, 0), "
+    "'last_checked', ks.last_checked, "
+    "'failing_groups', coalesce(f.groups, '[]'::json)"
+    "), :refreshed_at "
+    "FROM projects p "
+    "LEFT JOIN keyword_stats ks ON ks.project_id = p.id "
+    "LEFT JOIN failing f ON f.project_id = p.id "
+    "LEFT JOIN cost_stats cs ON cs.project_id = p.id "
+    "WHERE :project_ids IS NULL OR p.id = ANY(CAST(:project_ids AS uuid[])) "
+    "ON CONFLICT (project_id) DO UPDATE SET data = excluded.data, refreshed_at = excluded.refreshed_at"
+).bindparams(bindparam("project_ids", type_=ARRAY(UUID(as_uuid=True))))
+
+
+def refresh_dashboard_snapshots(conn, project_ids=None):
+    """
+    Пересчитывает снимки дашборда одним INSERT ... SELECT (conn — синхронная сессия или соединение).
+    project_ids=None пересчитывает все проекты. Коммит остаётся за вызывающим кодом.
+    """
+    now = datetime.utcnow()
+    today = now.date()
+    conn.execute(REFRESH_SNAPSHOTS_SQL, {
+        "project_ids": list(project_ids) if project_ids is not None else None,
+        "today": today,
+        "month_start": today.replace(day=1),
+        "refreshed_at": now,
+    })
+
+
+def refresh_dashboard_snapshots_safe(session_db, project_ids=None):
+    """Обновление дашборда после снятия позиций: ошибка здесь не должна ломать саму задачу."""
+    try:
+        refresh_dashboard_snapshots(session_db, project_ids)
+        session_db.commit()
+    except Exception as e:
+        session_db.rollback()
+        logger.error(f"Failed to refresh dashboard snapshots: {e}", exc_info=True)
+
+
+def summarize_dashboard(rows) -> dict:
+    """Итог портфеля по строкам (project_id, data, refreshed_at) из dashboard_snapshots."""
+    totals = {counter: 0 for counter in DASHBOARD_COUNTERS}
+    totals["failing_groups"] = 0
+    projects = []
+    refreshed_at = None
+
+    for row in rows:
+        data = row.data
+        for counter in DASHBOARD_COUNTERS:
+            totals[counter] += data.get(counter) or 0
+        totals["failing_groups"] += len(data.get("failing_groups") or [])
+        if refreshed_at is None or row.refreshed_at > refreshed_at:
+            refreshed_at = row.refreshed_at
+        projects.append({"project_id": row.project_id, "refreshed_at": row.refreshed_at, **data})
+
+    totals["projects"] = len(projects)
+    return {"refreshed_at": refreshed_at, "totals": totals, "projects": projects}
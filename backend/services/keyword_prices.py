@@ -0,0 +1,63 @@
+import pandas as pd
+from sqlalchemy import update, func, cast, column, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from database.models import Keyword
+
+PRICE_COLUMNS = ("price_top_1_3", "price_top_4_5", "price_top_6_10")
+
+
+async def apply_keyword_prices(db, keys: list, prices: dict, by: str = "id", group_id=None) -> list:
+    """
+    Обновляет цены ключей одним UPDATE ... FROM unnest(...): keys — id ключей (by="id")
+    или их тексты в группе group_id (by="keyword"), prices — списки цен по PRICE_COLUMNS той же длины.
+    None в цене оставляет текущее значение. Возвращает group_id каждой обновлённой строки.
+    """
+    if not keys:
+        return []
+
+    if by == "keyword":
+        key_type, key_column = String(), Keyword.keyword
+    else:
+        key_type, key_column = UUID(as_uuid=True), Keyword.id
+
+    # Массивы передаются четырьмя параметрами: лимит параметров asyncpg не мешает и на десятках тысяч строк
+    incoming = func.unnest(
+        cast(keys, ARRAY(key_type)),
+        *[cast(prices[price], ARRAY(Integer)) for price in PRICE_COLUMNS],
+    ).table_valued(
+        column("key", key_type),
+        *[column(price, Integer) for price in PRICE_COLUMNS],
+    ).render_derived(name="incoming", with_types=False)
+
+    stmt = (
+        update(Keyword)
+        .where(key_column == incoming.c.key)
+        .values(**{price: func.coalesce(incoming.c[price], getattr(Keyword, price)) for price in PRICE_COLUMNS})
+        .returning(Keyword.group_id)
+        .execution_options(synchronize_session=False)
+    )
+    if group_id is not None:
+        stmt = stmt.where(Keyword.group_id == group_id)
+
+    return (await db.execute(stmt)).scalars().all()
+
+
+def price_lists_from_frame(df: pd.DataFrame, key: str, price_sources: dict):
+    """
+    Векторно готовит аргументы apply_keyword_prices из таблицы файла: чистит ключи, приводит цены
+    к целым (пустые и нечисловые — None), отбрасывает строки без цен и дубли (побеждает последняя).
+    price_sources — соответствие колонки цены из PRICE_COLUMNS и колонки файла.
+    """
+    frame = pd.DataFrame({"key": df[key].astype(str).str.strip()})
+    for price in PRICE_COLUMNS:
+        frame[price] = pd.to_numeric(df[price_sources[price]], errors="coerce").round().astype("Int64")
+
+    frame = frame[frame["key"] != ""].dropna(subset=list(PRICE_COLUMNS), how="all")
+    frame = frame.drop_duplicates(subset="key", keep="last")
+
+    prices = {
+        price: frame[price].astype(object).where(frame[price].notna(), None).tolist()
+        for price in PRICE_COLUMNS
+    }
+    return frame["key"].tolist(), prices
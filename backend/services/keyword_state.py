@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from database.models import Keyword, KeywordState, TrendEnum
+
+
+def calculate_cost(keyword: Keyword, position) -> int:
+    if position is None or position > 10:
+        return 0
+    elif 1 <= position <= 3:
+        return keyword.price_top_1_3
+    elif 4 <= position <= 5:
+        return keyword.price_top_4_5
+    return keyword.price_top_6_10
+
+
+def calculate_trend(previous_position, position) -> TrendEnum:
+    if previous_position is None or position is None:
+        return TrendEnum.stable
+    elif position < previous_position:
+        return TrendEnum.up
+    elif position > previous_position:
+        return TrendEnum.down
+    return TrendEnum.stable
+
+
+def get_previous_position(keyword: Keyword, checked_at: datetime):
+    """
+    Предыдущая позиция берётся из keyword_states, а не из истории positions.
+    Если ключ уже снимался в этот день (повторный запуск), предыдущей остаётся позиция до него.
+    """
+    state = keyword.state
+    if state is None or state.checked_at is None:
+        return None
+    if state.checked_at.date() == checked_at.date():
+        return state.previous_position
+    return state.position
+
+
+def apply_keyword_state(session_db, keyword: Keyword, checked_at: datetime, position, previous_position,
+                        frequency, cost: int, trend: TrendEnum):
+    """Обновляет состояние ключа в той же транзакции, что и запись позиции."""
+    state = keyword.state
+    if state is None:
+        state = KeywordState(keyword_id=keyword.id)
+        session_db.add(state)
+        keyword.state = state
+    elif state.checked_at is not None and state.checked_at > checked_at:
+        # Более свежее состояние уже записано (например, при догрузке старой истории)
+        return state
+
+    state.position = position
+    state.previous_position = previous_position
+    state.frequency = frequency
+    state.cost = cost
+    state.trend = trend
+    state.checked_at = checked_at
+    return state
@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
 import logging
@@ -18,6 +20,15 @@ load_dotenv()
 
 LK_SEO_KORENEV_API_KEY = os.getenv("LK_SEO_KORENEV_API_KEY", "")
 
+# Сколько секунд список проектов ждёт ответа lk-seo, прежде чем отдать кеш
+LK_SEO_BUDGET_SECONDS = float(os.getenv("LK_SEO_BUDGET_SECONDS", "2"))
+# Сколько секунд закешированный список проектов считается свежим
+LK_SEO_CACHE_TTL = int(os.getenv("LK_SEO_CACHE_TTL", "300"))
+
+# Кеш проектов lk-seo (stale-while-revalidate) и текущее фоновое обновление
+_projects_cache = {"projects": None, "fetched_at": 0.0}
+_projects_refresh = None
+
 
 async def get_lk_seo_korenev_projects():
     try:
@@ -45,6 +56,41 @@ async def get_lk_seo_korenev_projects():
         return None
 
 
+async def _refresh_projects_cache():
+    projects = await get_lk_seo_korenev_projects()
+    if projects is not None:
+        _projects_cache.update(projects=projects, fetched_at=time.monotonic())
+    return projects
+
+
+async def get_lk_seo_korenev_projects_cached(budget: float = LK_SEO_BUDGET_SECONDS):
+    """
+    Проекты lk-seo с ограничением по времени. Возвращает (projects, partial).
+    Свежий кеш отдаётся сразу. Иначе запрос к lk-seo ждём не дольше budget секунд;
+    если не успел или упал — отдаём устаревший кеш (partial=True), а запрос продолжает
+    выполняться в фоне и обновит кеш для следующих вызовов.
+    """
+    global _projects_refresh
+
+    cached = _projects_cache["projects"]
+    if cached is not None and time.monotonic() - _projects_cache["fetched_at"] < LK_SEO_CACHE_TTL:
+        return cached, False
+
+    # Одновременно выполняется не больше одного обновления
+    if _projects_refresh is None or _projects_refresh.done():
+        _projects_refresh = asyncio.create_task(_refresh_projects_cache())
+
+    try:
+        projects = await asyncio.wait_for(asyncio.shield(_projects_refresh), timeout=budget)
+    except asyncio.TimeoutError:
+        logger.warning("lk-seo.korenev.pro не ответил за %s с, отдаём кеш проектов", budget)
+        return cached or [], True
+
+    if projects is None:
+        return cached or [], True
+    return projects, False
+
+
 async def get_positions_lk_seo_korenev(group_id, period, offset):
     try:
         headers = {
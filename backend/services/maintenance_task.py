@@ -0,0 +1,31 @@
+import logging
+
+from database.db_init import engine_sync
+from database.partitions import ensure_position_partitions
+from services.celery_app import celery_app
+from services.position_archive import archive_old_positions
+from services.bulk_loader import load_positions_csv
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task
+def ensure_position_partitions_task():
+    """Заранее создаёт месячные партиции positions, чтобы вставки не попадали в DEFAULT."""
+    with engine_sync.begin() as conn:
+        ensure_position_partitions(conn)
+    logger.info("Position partitions are up to date")
+
+
+@celery_app.task
+def archive_old_positions_task():
+    """Переносит историю старше POSITIONS_RETENTION_DAYS из positions в компактный архив."""
+    archived = archive_old_positions(engine_sync)
+    logger.info(f"Archived {archived} month(s) of position history")
+    return {"archived_months": archived}
+
+
+@celery_app.task
+def bulk_load_positions_task(path: str):
+    """Загрузка истории позиций из CSV (миграция клиента, догрузка из Topvisor)."""
+    return load_positions_csv(path)
@@ -0,0 +1,136 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import select, union_all, func, cast, true, text
+
+from database.models import Position, PositionArchive
+from database.partitions import month_start, add_months, partition_name
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Сколько дней сырой истории хранится в positions; более старые месяцы уходят в position_archives
+POSITIONS_RETENTION_DAYS = int(os.getenv("POSITIONS_RETENTION_DAYS", "400"))
+
+
+def archive_cutoff() -> datetime:
+    """Начало первого месяца, который ещё целиком хранится в positions."""
+    cutoff = month_start(datetime.utcnow().date() - timedelta(days=POSITIONS_RETENTION_DAYS))
+    return datetime.combine(cutoff, datetime.min.time())
+
+
+def archived_positions_select(start: datetime = None, end: datetime = None):
+    """Разворачивает архивные массивы обратно в строки с колонками таблицы positions."""
+    unpacked = func.unnest(
+        PositionArchive.checked_at,
+        PositionArchive.positions,
+        PositionArchive.frequencies,
+        PositionArchive.previous_positions,
+        PositionArchive.costs,
+        PositionArchive.trends,
+    ).table_valued(
+        "checked_at", "position", "frequency", "previous_position", "cost", "trend"
+    ).render_derived(name="unpacked")
+
+    stmt = (
+        select(
+            PositionArchive.keyword_id.label("keyword_id"),
+            unpacked.c.checked_at.label("checked_at"),
+            unpacked.c.position.label("position"),
+            unpacked.c.frequency.label("frequency"),
+            unpacked.c.previous_position.label("previous_position"),
+            unpacked.c.cost.label("cost"),
+            cast(unpacked.c.trend, Position.trend.type).label("trend"),
+        )
+        .select_from(PositionArchive)
+        .join(unpacked, true())
+    )
+    if start is not None:
+        stmt = stmt.where(PositionArchive.month >= month_start(start), unpacked.c.checked_at >= start)
+    if end is not None:
+        stmt = stmt.where(PositionArchive.month < end, unpacked.c.checked_at < end)
+    return stmt
+
+
+def positions_source(start: datetime = None, end: datetime = None):
+    """
+    Источник истории позиций для чтения. Если период целиком в горячей таблице — это positions,
+    иначе объединение positions и развёрнутого архива с теми же колонками.
+    Вызывающий код фильтрует по source.c.checked_at как обычно.
+    """
+    if start is not None and start >= archive_cutoff():
+        return Position.__table__
+
+    hot = select(
+        Position.keyword_id, Position.checked_at, Position.position, Position.frequency,
+        Position.previous_position, Position.cost, Position.trend,
+    )
+    if start is not None:
+        hot = hot.where(Position.checked_at >= start)
+    if end is not None:
+        hot = hot.where(Position.checked_at < end)
+
+    return union_all(hot, archived_positions_select(start, end)).subquery("positions_all")
+
+
+def archive_month(conn, month):
+    """
+    Переносит один месяц из positions в position_archives в рамках одной транзакции.
+    Строки без keyword_id (ключ удалён) не архивируются — к ним нет доступа ни из одного отчёта.
+    """
+    month = month_start(month)
+    params = {"start": month, "end": add_months(month, 1)}
+
+    conn.execute(text(
+        "INSERT INTO position_archives "
+        "(keyword_id, month, checked_at, positions, frequencies, previous_positions, costs, trends) "
+        "SELECT keyword_id, CAST(:start AS date), "
+        "array_agg(checked_at ORDER BY checked_at), "
+        "array_agg(position ORDER BY checked_at), "
+        "array_agg(frequency ORDER BY checked_at), "
+        "array_agg(previous_position ORDER BY checked_at), "
+        "array_agg(cost ORDER BY checked_at), "
+        "array_agg(trend::text ORDER BY checked_at) "
+        "FROM positions "
+        "WHERE checked_at >= :start AND checked_at < :end AND keyword_id IS NOT NULL "
+        "GROUP BY keyword_id "
+        "ON CONFLICT (keyword_id, month) DO UPDATE SET "
+        "checked_at = position_archives.checked_at || excluded.checked_at, "
+        "positions = position_archives.positions || excluded.positions, "
+        "frequencies = position_archives.frequencies || excluded.frequencies, "
+        "previous_positions = position_archives.previous_positions || excluded.previous_positions, "
+        "costs = position_archives.costs || excluded.costs, "
+        "trends = position_archives.trends || excluded.trends"
+    ), params)
+
+    # Месячную партицию дешевле отсоединить и удалить целиком, чем чистить DELETE
+    partition = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar():
+        conn.execute(text(f"ALTER TABLE positions DETACH PARTITION {partition}"))
+        conn.execute(text(f"DROP TABLE {partition}"))
+    conn.execute(text("DELETE FROM positions WHERE checked_at >= :start AND checked_at < :end"), params)
+
+
+def archive_old_positions(engine) -> int:
+    """Архивирует все месяцы старше горизонта хранения, каждый месяц — отдельной транзакцией."""
+    cutoff = archive_cutoff()
+    with engine.connect() as conn:
+        oldest = conn.execute(
+            text("SELECT min(checked_at) FROM positions WHERE checked_at < :cutoff"), {"cutoff": cutoff}
+        ).scalar()
+
+    if oldest is None:
+        return 0
+
+    archived = 0
+    month = month_start(oldest)
+    while month < cutoff.date():
+        with engine.begin() as conn:
+            archive_month(conn, month)
+        logger.info(f"Positions for {month:%Y-%m} moved to position_archives")
+        archived += 1
+        month = add_months(month, 1)
+    return archived
@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+from sqlalchemy import select, func, and_, tuple_, cast, Float
+
+from database.models import Project, Group, Keyword, KeywordState, KeywordDailyStat, user_project_link
+from services.api_utils import contains_pattern
+
+# Колонки, по которым можно сортировать сводку
+SUMMARY_SORT_COLUMNS = ("created_at", "domain", "active_keywords", "top10_share", "mtd_cost", "last_checked")
+
+# NULL в колонке сортировки ломает keyset-сравнение, поэтому пустые даты заменяются этим значением
+NEVER_CHECKED = datetime(1970, 1, 1)
+
+
+def project_summary_subquery(today: date, user_id: int = None, search: str = None):
+    """
+    Агрегаты по проектам одним запросом: количество групп, активные ключи (is_check в неархивных
+    группах), доля активных ключей в топ-10 по keyword_states, стоимость с начала месяца
+    по keyword_daily_stats и дата последней проверки.
+    """
+    active = and_(Keyword.is_check.is_(True), Group.is_archived.is_(False))
+
+    keyword_stats = (
+        select(
+            Group.project_id.label("project_id"),
+            func.count(func.distinct(Group.id)).label("group_count"),
+            func.count(Keyword.id).filter(active).label("active_keywords"),
+            func.count(Keyword.id).filter(active, KeywordState.position.between(1, 10)).label("top10_keywords"),
+            func.max(KeywordState.checked_at).label("last_checked"),
+        )
+        .select_from(Group)
+        .outerjoin(Keyword, Keyword.group_id == Group.id)
+        .outerjoin(KeywordState, KeywordState.keyword_id == Keyword.id)
+        .group_by(Group.project_id)
+        .subquery("keyword_stats")
+    )
+
+    cost_stats = (
+        select(
+            Group.project_id.label("project_id"),
+            func.sum(KeywordDailyStat.cost).label("mtd_cost"),
+        )
+        .select_from(KeywordDailyStat)
+        .join(Keyword, Keyword.id == KeywordDailyStat.keyword_id)
+        .join(Group, Group.id == Keyword.group_id)
+        .where(KeywordDailyStat.day >= today.replace(day=1), KeywordDailyStat.day <= today)
+        .group_by(Group.project_id)
+        .subquery("cost_stats")
+    )
+
+    active_keywords = func.coalesce(keyword_stats.c.active_keywords, 0)
+    stmt = (
+        select(
+            Project.id.label("id"),
+            Project.domain.label("domain"),
+            Project.created_at.label("created_at"),
+            Project.client_link.label("client_link"),
+            func.coalesce(keyword_stats.c.group_count, 0).label("group_count"),
+            active_keywords.label("active_keywords"),
+            # double precision, чтобы значение без потерь проходило через курсор
+            func.coalesce(
+                cast(func.coalesce(keyword_stats.c.top10_keywords, 0), Float) / func.nullif(active_keywords, 0),
+                0,
+            ).label("top10_share"),
+            func.coalesce(cost_stats.c.mtd_cost, 0).label("mtd_cost"),
+            func.coalesce(keyword_stats.c.last_checked, NEVER_CHECKED).label("last_checked"),
+        )
+        .outerjoin(keyword_stats, keyword_stats.c.project_id == Project.id)
+        .outerjoin(cost_stats, cost_stats.c.project_id == Project.id)
+    )
+
+    if user_id is not None:
+        stmt = stmt.join(user_project_link, user_project_link.c.project_id == Project.id).where(
+            user_project_link.c.user_id == user_id
+        )
+
+    if search:
+        # ILIKE по подстроке использует триграммный индекс ix_projects_domain_trgm
+        stmt = stmt.where(Project.domain.ilike(contains_pattern(search), escape="\\"))
+
+    return stmt.subquery("project_summary")
+
+
+def page_project_summary_stmt(summary, sort: str, descending: bool, limit: int, cursor=None):
+    """Keyset-страница сводки: сортировка по (sort, id), cursor — (значение, id) последней строки."""
+    sort_column = summary.c[sort]
+    stmt = select(summary)
+
+    if cursor is not None:
+        value, item_id = cursor
+        if sort in ("created_at", "last_checked"):
+            value = datetime.fromisoformat(value)
+        key = tuple_(sort_column, summary.c.id)
+        stmt = stmt.where(key < tuple_(value, item_id) if descending else key > tuple_(value, item_id))
+
+    if descending:
+        stmt = stmt.order_by(sort_column.desc(), summary.c.id.desc())
+    else:
+        stmt = stmt.order_by(sort_column.asc(), summary.c.id.asc())
+    return stmt.limit(limit + 1)
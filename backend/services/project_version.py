@@ -0,0 +1,93 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import select, update
+
+from database.models import Project, Group
+
+
+def _bump_stmt(project_id=None, group_id=None):
+    if project_id is None:
+        project_id = select(Group.project_id).where(Group.id == group_id).scalar_subquery()
+    return (
+        update(Project)
+        .where(Project.id == project_id)
+        .values(version=Project.version + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def bump_project_version(db, project_id=None, group_id=None):
+    """Увеличивает версию проекта в текущей транзакции (проект можно указать через группу)."""
+    await db.execute(_bump_stmt(project_id, group_id))
+
+
+async def bump_group_project_versions(db, group_ids):
+    """Одним UPDATE увеличивает версии всех проектов, которым принадлежат группы."""
+    if not group_ids:
+        return
+    await db.execute(
+        update(Project)
+        .where(Project.id.in_(select(Group.project_id).where(Group.id.in_(group_ids))))
+        .values(version=Project.version + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bump_project_version_sync(session_db, project_id=None, group_id=None):
+    session_db.execute(_bump_stmt(project_id, group_id))
+
+
+async def get_project_version(db, project_id=None, group_id=None, client_link=None):
+    """Одна индексная выборка (id, version, updated_at) проекта — до любых тяжёлых запросов."""
+    stmt = select(Project.id, Project.version, Project.updated_at)
+    if group_id is not None:
+        stmt = stmt.join(Group, Group.project_id == Project.id).where(Group.id == group_id)
+    elif client_link is not None:
+        stmt = stmt.where(Project.client_link == client_link)
+    else:
+        stmt = stmt.where(Project.id == project_id)
+    return (await db.execute(stmt)).one_or_none()
+
+
+def build_etag(request: Request, version: int) -> str:
+    """
+    ETag зависит от версии проекта, параметров запроса и текущей даты:
+    периоды week/month сдвигаются со сменой дня даже без новых данных.
+    """
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    raw = f"{request.url.path}|{params}|{version}|{datetime.utcnow().date()}"
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:24]}"'
+
+
+def cache_headers(etag: str, updated_at: datetime) -> dict:
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def not_modified_response(request: Request, etag: str, headers: dict):
+    """Ответ 304, если клиент прислал совпадающий If-None-Match, иначе None."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+def conditional_get(request: Request, version_row):
+    """
+    По строке get_project_version возвращает (заголовки, ответ 304 или None).
+    Если проект не найден, заголовков нет и запрос обрабатывается как обычно.
+    """
+    if version_row is None:
+        return {}, None
+    etag = build_etag(request, version_row.version)
+    headers = cache_headers(etag, version_row.updated_at)
+    return headers, not_modified_response(request, etag, headers)
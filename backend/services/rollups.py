@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+from sqlalchemy.dialects.postgresql import insert
+
+from database.models import KeywordDailyStat, KeywordIntervalStat
+
+INTERVAL_DAYS = 14
+
+BUCKET_COLUMNS = {3: "days_top3", 5: "days_top5", 10: "days_top10"}
+
+
+def position_bucket(position):
+    if position is None:
+        return None
+    if 1 <= position <= 3:
+        return 3
+    if 4 <= position <= 5:
+        return 5
+    if 6 <= position <= 10:
+        return 10
+    return None
+
+
+def interval_start_for(project_start: date, day: date) -> date:
+    """Начало двухнедельного интервала, в который попадает день (отсчёт от создания проекта)."""
+    return project_start + timedelta(days=((day - project_start).days // INTERVAL_DAYS) * INTERVAL_DAYS)
+
+
+def record_daily_rollup(session_db, keyword_id, project_start: date, day: date,
+                        position, cost: int, old_position=None, old_cost: int = 0, replaced: bool = False):
+    """
+    Инкрементально обновляет дневную и двухнедельную сводки по ключу.
+    replaced=True означает, что за этот день уже была записана позиция old_position со стоимостью old_cost,
+    и её вклад в агрегат нужно заменить, а не прибавить.
+    """
+    bucket = position_bucket(position)
+
+    daily = insert(KeywordDailyStat).values(keyword_id=keyword_id, day=day, bucket=bucket, cost=cost)
+    session_db.execute(daily.on_conflict_do_update(
+        index_elements=[KeywordDailyStat.keyword_id, KeywordDailyStat.day],
+        set_={"bucket": bucket, "cost": cost},
+    ))
+
+    old_bucket = position_bucket(old_position) if replaced else None
+    cost_delta = cost - (old_cost if replaced else 0)
+    deltas = {column: 0 for column in BUCKET_COLUMNS.values()}
+    if bucket is not None:
+        deltas[BUCKET_COLUMNS[bucket]] += 1
+    if old_bucket is not None:
+        deltas[BUCKET_COLUMNS[old_bucket]] -= 1
+
+    if not cost_delta and not any(deltas.values()):
+        return
+
+    table = KeywordIntervalStat.__table__
+    interval = insert(KeywordIntervalStat).values(
+        keyword_id=keyword_id,
+        interval_start=interval_start_for(project_start, day),
+        cost=cost_delta,
+        **deltas,
+    )
+    session_db.execute(interval.on_conflict_do_update(
+        index_elements=[KeywordIntervalStat.keyword_id, KeywordIntervalStat.interval_start],
+        set_={
+            "cost": table.c.cost + cost_delta,
+            **{column: table.c[column] + delta for column, delta in deltas.items()},
+        },
+    ))
@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from urllib.parse import urlencode
+
+import requests
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SERP_HTTP_TIMEOUT = int(os.getenv("SERP_HTTP_TIMEOUT", "15"))
+
+YANDEX_SEARCH_URL = "https://yandex.ru/search/"
+
+SERP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+}
+
+CAPTCHA_MARKERS = ("Подтвердите, что вы не робот", "showcaptcha", "checkcaptcha", "smart-captcha")
+
+
+class SerpChallengeDetected(Exception):
+    """Яндекс ответил капчей или JS-проверкой: нужен полноценный браузер."""
+
+
+_local = threading.local()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Сессия на поток: пул соединений keep-alive и собственный cookie jar,
+    который сохраняется между запросами (в т.ч. cookies, полученные браузером после капчи).
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=1)
+        session.mount("https://", adapter)
+        session.headers.update(SERP_HEADERS)
+        _local.session = session
+    return session
+
+
+def import_browser_cookies(cookies: list):
+    """Переносит cookies из браузера (driver.get_cookies()) в HTTP-сессию текущего потока."""
+    session = get_http_session()
+    for cookie in cookies:
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+
+
+def build_search_url(keyword: str, lr_code: int) -> str:
+    return f"{YANDEX_SEARCH_URL}?{urlencode({'text': keyword, 'lr': lr_code, 'numdoc': 100})}"
+
+
+def find_domain_position(hrefs: list, domain: str) -> int | None:
+    """
+    Позиция домена в выдаче. hrefs — ссылки a.organic__url по порядку .serp-item
+    (None для элементов без органической ссылки, они всё равно занимают позицию).
+    """
+    domain = domain.lower()
+    for idx, href in enumerate(hrefs, start=1):
+        if href and domain in href.lower():
+            return idx
+    return None
+
+
+def extract_serp_hrefs(html: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
+    hrefs = []
+    for item in soup.select(".serp-item"):
+        link = item.select_one("a.organic__url")
+        hrefs.append(link.get("href") if link else None)
+    return hrefs
+
+
+def is_challenge_response(url: str, html: str) -> bool:
+    if "captcha" in url:
+        return True
+    return any(marker in html for marker in CAPTCHA_MARKERS)
+
+
+def fetch_yandex_position_http(domain: str, keyword: str, lr_code: int) -> int | None:
+    """
+    Лёгкая проверка позиции без браузера. Бросает SerpChallengeDetected, если вместо выдачи
+    пришла капча, JS-проверка или страница без результатов, которую нельзя разобрать.
+    """
+    response = get_http_session().get(build_search_url(keyword, lr_code), timeout=SERP_HTTP_TIMEOUT)
+    if response.status_code != 200:
+        raise SerpChallengeDetected(f"HTTP {response.status_code}")
+
+    html = response.text
+    if is_challenge_response(response.url, html):
+        raise SerpChallengeDetected("captcha")
+
+    hrefs = extract_serp_hrefs(html)
+    if not hrefs:
+        # Выдача рендерится скриптом или разметка изменилась — доверяем только браузеру
+        raise SerpChallengeDetected("empty serp")
+
+    return find_domain_position(hrefs, domain)
@@ -1,7 +1,12 @@
-from database.models import Project, Keyword, Position, TrendEnum
+from database.models import Project, Keyword, Position
 from datetime import datetime
 from uuid import UUID
 from services.celery_app import celery_app
+from services.keyword_state import calculate_cost, calculate_trend, get_previous_position, apply_keyword_state
+from services.rollups import record_daily_rollup
+from services.cache import invalidate_client_view
+from services.project_version import bump_project_version_sync
+from services.dashboard import refresh_dashboard_snapshots_safe
 import os
 import random
 from dotenv import load_dotenv
@@ -27,7 +32,7 @@ DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "seo_parser_db")
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 
@@ -207,50 +212,38 @@ async def parse_and_save_position_async(session_db, session_http, project: Proje
                                         semaphore: asyncio.Semaphore) -> bool:
     try:
         position = await find_position_async(session_http, domain=project.domain, keyword=keyword.keyword,
-                                             region=keyword.region, semaphore=semaphore)
+                                             region=keyword.group.region, semaphore=semaphore)
         if position is None:
             logger.warning(
                 f"Не удалось получить позицию для ключевого слова '{keyword.keyword}' в проекте {project.id}")
             return False
 
-        last_pos = (
-            session_db.query(Position)
-            .filter(Position.keyword_id == keyword.id)
-            .order_by(Position.checked_at.desc())
-            .first()
-        )
-        previous_position = last_pos.position if last_pos else None
-
-        if position is None or position > 10:
-            cost = 0
-        elif 1 <= position <= 3:
-            cost = keyword.price_top_1_3
-        elif 4 <= position <= 5:
-            cost = keyword.price_top_4_5
-        else:
-            cost = keyword.price_top_6_10
-
-        if previous_position is None:
-            trend = TrendEnum.stable
-        elif position is None:
-            trend = TrendEnum.down
-        elif position < previous_position:
-            trend = TrendEnum.up
-        elif position > previous_position:
-            trend = TrendEnum.down
-        else:
-            trend = TrendEnum.stable
+        checked_at = datetime.utcnow()
+        previous_position = get_previous_position(keyword, checked_at)
+
+        cost = calculate_cost(keyword, position)
+        trend = calculate_trend(previous_position, position)
 
         pos_record = Position(
             keyword_id=keyword.id,
-            checked_at=datetime.utcnow(),
+            checked_at=checked_at,
             position=position,
             previous_position=previous_position,
             cost=cost,
             trend=trend,
         )
         session_db.add(pos_record)
+
+        state = keyword.state
+        checked_today = state is not None and state.checked_at is not None \
+            and state.checked_at.date() == checked_at.date()
+        record_daily_rollup(session_db, keyword.id, project.created_at.date(), checked_at.date(), position, cost,
+                            old_position=state.position if checked_today else None,
+                            old_cost=state.cost if checked_today else 0, replaced=checked_today)
+        apply_keyword_state(session_db, keyword, checked_at, position, previous_position, None, cost, trend)
+        bump_project_version_sync(session_db, project_id=project.id)
         session_db.commit()
+        invalidate_client_view(project.client_link)
 
         logger.info(f"Обновлена позиция для ключевого слова '{keyword.keyword}' в проекте {project.id}")
         return True
@@ -280,6 +273,7 @@ async def process_single_project_async(session_db, session_http,
         elif result is False:  # неудачная обработка, но без исключения
             failed_keywords_local.append((project.id, keyword.id))
 
+    refresh_dashboard_snapshots_safe(session_db, [project.id])
     return failed_keywords_local
 
 
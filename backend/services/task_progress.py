@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from services.cache import get_async_redis, get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Сколько секунд хранится последний снимок прогресса задачи
+TASK_PROGRESS_TTL = int(os.getenv("TASK_PROGRESS_TTL", "86400"))
+
+TERMINAL_PHASES = ("completed", "failed")
+
+
+def progress_channel(task_id: str) -> str:
+    return f"task_progress:{task_id}"
+
+
+def progress_snapshot_key(task_id: str) -> str:
+    return f"task_progress:{task_id}:last"
+
+
+class TaskProgress:
+    """
+    Прогресс Celery-задачи снятия позиций. Каждое изменение публикуется в Redis pub/sub
+    и сохраняется как последний снимок, чтобы новый подписчик сразу получил текущее состояние.
+    Без task_id все методы ничего не делают.
+    """
+
+    def __init__(self, task_id: str = None):
+        self.task_id = task_id
+        self.phase = "queued"
+        self.groups_total = 0
+        self.groups_done = 0
+        self.keywords_done = 0
+        self.current_group = None
+
+    def start(self, groups_total: int):
+        self.groups_total = groups_total
+        self.set_phase("fetching")
+
+    def set_phase(self, phase: str, **extra):
+        self.phase = phase
+        self.publish(**extra)
+
+    def group_started(self, group_title: str):
+        self.current_group = group_title
+        self.publish()
+
+    def group_done(self):
+        self.groups_done += 1
+        self.publish()
+
+    def keyword_done(self):
+        # Отдельное событие на каждый ключ не публикуем — счётчик уйдёт со следующим событием группы
+        self.keywords_done += 1
+
+    def finish(self, status: str, **extra):
+        self.current_group = None
+        self.set_phase(status, **extra)
+
+    def publish(self, **extra):
+        if not self.task_id:
+            return
+        event = {
+            "task_id": self.task_id,
+            "phase": self.phase,
+            "groups_total": self.groups_total,
+            "groups_done": self.groups_done,
+            "keywords_done": self.keywords_done,
+            "current_group": self.current_group,
+            "ts": time.time(),
+            **extra,
+        }
+        payload = json.dumps(event, ensure_ascii=False, default=str)
+        try:
+            client = get_sync_redis()
+            client.set(progress_snapshot_key(self.task_id), payload, ex=TASK_PROGRESS_TTL)
+            client.publish(progress_channel(self.task_id), payload)
+        except Exception as e:
+            logger.error(f"Failed to publish task progress: {e}")
+
+
+async def get_progress_snapshot(task_id: str):
+    try:
+        return await get_async_redis().get(progress_snapshot_key(task_id))
+    except Exception as e:
+        logger.error(f"Failed to read task progress snapshot: {e}")
+        return None
+
+
+class ProgressBroadcaster:
+    """
+    Раздача событий прогресса в процессе API: на каждую задачу одна подписка Redis,
+    события копируются в очереди всех подключённых SSE-клиентов.
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self._subscribers = {}
+        self._listeners = {}
+        self._ready = {}
+
+    async def subscribe(self, task_id: str) -> asyncio.Queue:
+        """
+        Добавляет очередь клиента и возвращается, когда Redis подтвердил подписку на канал задачи:
+        всё, что опубликовано после этого, попадёт в очередь.
+        """
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        if task_id not in self._listeners:
+            self._ready[task_id] = asyncio.Event()
+            self._listeners[task_id] = asyncio.create_task(self._listen(task_id, self._ready[task_id]))
+        try:
+            await self._ready[task_id].wait()
+        except asyncio.CancelledError:
+            self.unsubscribe(task_id, queue)
+            raise
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(task_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+        if not subscribers:
+            self._subscribers.pop(task_id, None)
+            self._ready.pop(task_id, None)
+            listener = self._listeners.pop(task_id, None)
+            if listener:
+                listener.cancel()
+
+    async def _listen(self, task_id: str, ready: asyncio.Event):
+        pubsub = get_async_redis().pubsub()
+        try:
+            await pubsub.subscribe(progress_channel(task_id))
+            async for message in pubsub.listen():
+                if message["type"] == "subscribe":
+                    ready.set()
+                    continue
+                if message["type"] != "message":
+                    continue
+                for queue in list(self._subscribers.get(task_id, ())):
+                    if queue.full():
+                        # Медленный клиент получает только свежие события
+                        queue.get_nowait()
+                    queue.put_nowait(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Task progress listener for {task_id} failed: {e}")
+        finally:
+            # Подписчики не ждут подтверждения от оборвавшейся подписки
+            ready.set()
+            # Следующий подписчик запустит новую подписку, если эта оборвалась
+            if self._listeners.get(task_id) is asyncio.current_task():
+                self._listeners.pop(task_id, None)
+                self._ready.pop(task_id, None)
+            try:
+                await pubsub.reset()
+            except Exception:
+                pass
+
+
+_broadcaster = None
+
+
+def get_progress_broadcaster() -> ProgressBroadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = ProgressBroadcaster()
+    return _broadcaster
+
+
+def is_terminal_event(payload: bytes) -> bool:
+    try:
+        return json.loads(payload).get("phase") in TERMINAL_PHASES
+    except Exception:
+        return False
@@ -11,10 +11,17 @@ from typing import List
 import logging
 from uuid import UUID
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from database.loading import project_ingest
 from services.topvizor_utils import (retry_request,
                                      get_region_key_index_static,
                                      get_keyword_volumes)
+from services.check_planner import build_check_plan_sync
+from services.rollups import record_daily_rollup
+from services.cache import invalidate_client_view
+from services.project_version import bump_project_version_sync
+from services.task_progress import TaskProgress
+from services.dashboard import refresh_dashboard_snapshots_safe
+from services.keyword_state import calculate_cost, calculate_trend, get_previous_position, apply_keyword_state
 from database.models import TaskStatus
 
 logger = logging.getLogger(__name__)
@@ -114,7 +121,8 @@ def find_position_from_topvisor_result(result: list, keyword: str, domain: str)
 
 def process_single_keyword_position(session_db, position_data: list, frequency_map: dict,
                                     keyword: Keyword, domain: str,
-                                    project_id: int, region_index: int, date_today: datetime) -> bool:
+                                    project_id: int, region_index: int, date_today: datetime,
+                                    project_start=None) -> bool:
     try:
         date = date_today.strftime("%Y-%m-%d")
         logger.info(f"Обработка ключевого слова '{keyword.keyword}'")
@@ -156,44 +164,38 @@ def process_single_keyword_position(session_db, position_data: list, frequency_m
             logger.info(f"Нет позиции и частотности для ключа '{keyword.keyword}', запись не создаётся")
             return False
 
-        stmt = select(Position).filter(Position.keyword_id == keyword.id).order_by(Position.checked_at.desc()).limit(1)
-        result = session_db.execute(stmt)
-        last_pos = result.scalars().first()
-        previous_position = last_pos.position if last_pos else None
+        previous_position = get_previous_position(keyword, date_today)
         logger.info(f"Прошлая позиция для ключа '{keyword.keyword}': {previous_position}")
 
-        if position is None or position > 10:
-            cost = 0
-           
-        elif 1 <= position <= 3:
-            cost = keyword.price_top_1_3
-           
-        elif 4 <= position <= 5:
-            cost = keyword.price_top_4_5
-           
-        else:
-            cost = keyword.price_top_6_10
+        cost = calculate_cost(keyword, position)
         logger.info(f"Рассчитанная стоимость для ключа '{keyword.keyword}': {cost}")
 
-
-        if previous_position is None or position is None:
-            trend = TrendEnum.stable
-        elif position < previous_position:
-            trend = TrendEnum.up
-        elif position > previous_position:
-            trend = TrendEnum.down
-        else:
-            trend = TrendEnum.stable
+        trend = calculate_trend(previous_position, position)
         logger.info(f"Тренд для ключа '{keyword.keyword}': {trend}")
 
-        start_of_day = datetime.combine(date_today, datetime.min.time())
-        end_of_day = datetime.combine(date_today, datetime.max.time())
+        # Запись за сегодня ищем только если состояние говорит, что ключ уже снимался сегодня
+        state = keyword.state
+        checked_today = state is not None and state.checked_at is not None \
+            and state.checked_at.date() == date_today.date()
+        old_position = state.position if checked_today else None
+        old_cost = state.cost if checked_today else 0
+
+        if project_start is not None:
+            record_daily_rollup(session_db, keyword.id, project_start, date_today.date(), position, cost,
+                                old_position=old_position, old_cost=old_cost, replaced=checked_today)
+
+        apply_keyword_state(session_db, keyword, date_today, position, previous_position, frequency, cost, trend)
 
-        pos_record = session_db.query(Position).filter(
-            Position.keyword_id == keyword.id,
-            Position.checked_at >= start_of_day,
-            Position.checked_at <= end_of_day
-        ).first()
+        pos_record = None
+        if checked_today:
+            start_of_day = datetime.combine(date_today, datetime.min.time())
+            end_of_day = datetime.combine(date_today, datetime.max.time())
+
+            pos_record = session_db.query(Position).filter(
+                Position.keyword_id == keyword.id,
+                Position.checked_at >= start_of_day,
+                Position.checked_at <= end_of_day
+            ).first()
 
         if pos_record is not None:
             pos_record.position = position
@@ -247,8 +249,51 @@ def wait_for_positions(project_id, region_key, date_today: datetime, max_wait=90
     return None
 
 
-def main_task(project_ids: List[UUID], session_db):
+def wait_until(moment: datetime) -> float:
+    """Ждёт наступления момента (naive UTC); возвращает, сколько секунд пришлось ждать."""
+    delay = (moment - datetime.utcnow()).total_seconds()
+    if delay <= 0:
+        return 0.0
+    time.sleep(delay)
+    return delay
+
+
+def main_task(project_ids: List[UUID], session_db, plan_items: List[dict] = None, stats: dict = None,
+              progress: TaskProgress = None):
+    """
+    Снимает позиции групп проектов. Без plan_items — все группы в порядке базы; с plan_items
+    (элементы плана check_planner, без отложенных) — только группы плана в его порядке,
+    каждая не раньше своего planned_start.
+    """
     failed = []
+    started = time.monotonic()
+    idle = 0.0
+    progress = progress or TaskProgress()
+
+    projects = {}
+    for project_id in project_ids:
+        project = session_db.query(Project).options(
+            project_ingest()
+        ).filter(Project.id == project_id).first()
+
+        if not project:
+            logger.error(f"Project {project_id} not found")
+            continue
+        projects[project.id] = project
+
+    if plan_items is None:
+        work = [(project, group, None) for project in projects.values() for group in project.groups]
+    else:
+        groups = {group.id: (project, group) for project in projects.values() for group in project.groups}
+        work = []
+        for item in plan_items:
+            found = groups.get(UUID(item["group_id"]))
+            if found is None:
+                logger.error(f"Group {item['group_id']} from the check plan not found")
+                continue
+            planned_start = item.get("planned_start")
+            work.append((*found, datetime.fromisoformat(planned_start) if planned_start else None))
+    progress.start(len(work))
 
     # Нужная дата
     #date_today = datetime(2025, 11, 5, 0, 0, 0)
@@ -258,78 +303,89 @@ def main_task(project_ids: List[UUID], session_db):
 
     groups_to_wait = []  # Список групп, для которых запущен процесс снятия позиций
 
-    for project_id in project_ids:
-        project = session_db.query(Project).options(
-            selectinload(Project.groups).selectinload(Group.keywords)
-        ).filter(Project.id == project_id).first()
+    for project, group, planned_start in work:
+        # Запуски групп разнесены по окну проверки, чтобы не создавать пиков нагрузки на API
+        if planned_start is not None:
+            idle += wait_until(planned_start)
 
-        if not project:
-            logger.error(f"Project {project_id} not found")
+        progress.group_started(group.title)
+
+        if not group.topvisor_id or not group.keywords or group.is_archived:
+            if group.is_archived:
+                logger.info(f"Group {group.id} is archived, skipping")
+            failed.extend([(project.id, kw.id) for kw in group.keywords if kw.is_check])
+            progress.group_done()
             continue
 
-        for group in project.groups:
-            if not group.topvisor_id or not group.keywords or group.is_archived:
-                if group.is_archived:
-                    logger.info(f"Group {group.id} is archived, skipping")
-                failed.extend([(project.id, kw.id) for kw in group.keywords if kw.is_check])
-                continue
+        region_key, region_index = get_region_key_index_static(group.region)
 
-            region_key, region_index = get_region_key_index_static(group.region)
-
-            # Проверяем наличие позиций
-            positions = get_positions_topvisor(group.topvisor_id, region_index, date_today)
-
-            has_positions = positions and all(
-                isinstance(item.get("positionsData"), dict) and len(item["positionsData"]) > 0 for item in positions)
-
-            if has_positions:
-                # Получаем частотности
-                volumes_data = get_keyword_volumes(group.topvisor_id, region_key, searcher_key=0, type_volume=1)
-                frequency_map = {}
-                if volumes_data:
-                    volume_field_name = None
-                    first_volume_item = volumes_data[0] if volumes_data else {}
-                    for field in first_volume_item.keys():
-                        if field.startswith("volume:"):
-                            volume_field_name = field
-                            break
-                    if volume_field_name:
-                        for item in volumes_data:
-                            name = item.get("name", "").lower()
-                            val = item.get(volume_field_name)
-                            try:
-                                frequency_map[name] = int(val) if val is not None else None
-                            except Exception:
-                                frequency_map[name] = None
-
-                logger.info(f"Frequency map contents: {list(frequency_map.items())}")
-
-                # Обрабатываем ключевые слова, записываем в БД
-                for kw in [k for k in group.keywords if k.is_check]:
-                    try:
-                        # todo
-                        process_single_keyword_position(session_db, positions, frequency_map, kw,
-                                                        project.domain, group.topvisor_id, region_index, date_today)
-                    except Exception as e:
-                        logger.error(f"Error processing keyword {kw.keyword} in group {group.title}: {e}",
-                                     exc_info=True)
-                        failed.append((project.id, kw.id))
+        if stats is not None:
+            stats["groups"] = stats.get("groups", 0) + 1
+            stats["keywords"] = stats.get("keywords", 0) + len([k for k in group.keywords if k.is_check])
 
-                session_db.commit()
+        # Проверяем наличие позиций
+        positions = get_positions_topvisor(group.topvisor_id, region_index, date_today)
 
-            else:
-                # Если позиций нет, запускаем процесс и сохраняем группу для дальнейшего опроса
-                start_resp = start_topvisor_position_check(group.topvisor_id)
+        has_positions = positions and all(
+            isinstance(item.get("positionsData"), dict) and len(item["positionsData"]) > 0 for item in positions)
+
+        if has_positions:
+            # Получаем частотности
+            volumes_data = get_keyword_volumes(group.topvisor_id, region_key, searcher_key=0, type_volume=1)
+            frequency_map = {}
+            if volumes_data:
+                volume_field_name = None
+                first_volume_item = volumes_data[0] if volumes_data else {}
+                for field in first_volume_item.keys():
+                    if field.startswith("volume:"):
+                        volume_field_name = field
+                        break
+                if volume_field_name:
+                    for item in volumes_data:
+                        name = item.get("name", "").lower()
+                        val = item.get(volume_field_name)
+                        try:
+                            frequency_map[name] = int(val) if val is not None else None
+                        except Exception:
+                            frequency_map[name] = None
 
-                if not start_resp:
-                    logger.error(f"Failed to start position check for group {group.title}")
-                    failed.extend([(project.id, kw.id) for kw in group.keywords if kw.is_check])
-                    continue
+            logger.info(f"Frequency map contents: {list(frequency_map.items())}")
 
-                groups_to_wait.append((group.topvisor_id, region_index, project, group))
+            # Обрабатываем ключевые слова, записываем в БД
+            for kw in [k for k in group.keywords if k.is_check]:
+                try:
+                    # todo
+                    process_single_keyword_position(session_db, positions, frequency_map, kw,
+                                                    project.domain, group.topvisor_id, region_index, date_today,
+                                                    project_start=project.created_at.date())
+                    progress.keyword_done()
+                except Exception as e:
+                    logger.error(f"Error processing keyword {kw.keyword} in group {group.title}: {e}",
+                                 exc_info=True)
+                    failed.append((project.id, kw.id))
+
+            bump_project_version_sync(session_db, project_id=project.id)
+            session_db.commit()
+            invalidate_client_view(project.client_link)
+            progress.group_done()
+
+        else:
+            # Если позиций нет, запускаем процесс и сохраняем группу для дальнейшего опроса
+            start_resp = start_topvisor_position_check(group.topvisor_id)
+
+            if not start_resp:
+                logger.error(f"Failed to start position check for group {group.title}")
+                failed.extend([(project.id, kw.id) for kw in group.keywords if kw.is_check])
+                progress.group_done()
+                continue
+
+            groups_to_wait.append((group.topvisor_id, region_index, project, group))
 
     # Второй этап: запрос позиций для групп, где был запущен процесс снятия
+    if groups_to_wait:
+        progress.set_phase("waiting")
     for topvisor_id, region_index, project, group in groups_to_wait:
+        progress.group_started(group.title)
         positions = wait_for_positions(topvisor_id, region_index, date_today, max_wait=900, interval=30)
         if positions:
             volumes_data = get_keyword_volumes(topvisor_id, region_index, searcher_key=0, type_volume=1)
@@ -353,16 +409,28 @@ def main_task(project_ids: List[UUID], session_db):
             for kw in [k for k in group.keywords if k.is_check]:
                 try:
                     process_single_keyword_position(session_db, positions, frequency_map, kw,
-                                                    project.domain, group.topvisor_id, region_index, date_today)
+                                                    project.domain, group.topvisor_id, region_index, date_today,
+                                                    project_start=project.created_at.date())
+                    progress.keyword_done()
                 except Exception as e:
                     logger.error(f"Error processing keyword {kw.keyword} in group {group.title}: {e}",
                                  exc_info=True)
                     failed.append((project.id, kw.id))
 
+            bump_project_version_sync(session_db, project_id=project.id)
             session_db.commit()
+            invalidate_client_view(project.client_link)
         else:
             logger.warning(f"Positions not received for group {group.title} after waiting")
             failed.extend([(project.id, kw.id) for kw in group.keywords if kw.is_check])
+        progress.group_done()
+
+    progress.set_phase("dashboard")
+    refresh_dashboard_snapshots_safe(session_db, project_ids)
+
+    if stats is not None:
+        # Ожидание planned_start не входит в замер: по нему планировщик оценивает задержку на ключ
+        stats["seconds"] = stats.get("seconds", 0) + round(time.monotonic() - started - idle, 1)
 
     return True, None
 
@@ -371,13 +439,16 @@ def main_task(project_ids: List[UUID], session_db):
 def run_main_task_one_project(self, project_id_str):
     logger.info(f"start task for project with id: {project_id_str}")
     project_id = UUID(project_id_str)
+    progress = TaskProgress(self.request.id)
     try:
         with SyncSessionLocal() as session_db:
-            success, error = main_task([project_id], session_db)
+            success, error = main_task([project_id], session_db, progress=progress)
+            progress.finish("completed", success=success, error=error)
             # Обновляйте статус задачи в базе, логгируйте и т.д.
             return {"success": success, "error": error}
     except Exception as e:
         logger.error(f"run_main_task failed: {e}", exc_info=True)
+        progress.finish("failed", error=str(e))
         raise
 
 
@@ -385,8 +456,10 @@ def run_main_task_one_project(self, project_id_str):
 def run_main_task(self):
     logger.info(f"START run_main_task: TOPVIZOR_ID={TOPVIZOR_ID}, API_KEY set={bool(TOPVIZOR_API_KEY)}")
     task_id = self.request.id
+    progress = TaskProgress(task_id)
 
     try:
+        progress.set_phase("planning")
         with SyncSessionLocal() as session_db:
             # Создаём запись о начале задачи
             task_status = TaskStatus(
@@ -398,12 +471,12 @@ def run_main_task(self):
             session_db.add(task_status)
             session_db.commit()
 
-            # Загрузка проектов с группами и ключевыми словами (синхронно)
+            # Нужны только id проектов, группы и ключи загрузит main_task
             projects = (
-                session_db.query(Project)
+                session_db.query(Project.id)
                 .join(Project.groups)
                 .filter(Group.topvisor_id != None)
-                .options(selectinload(Project.groups).selectinload(Group.keywords))
+                .distinct()
                 .all()
             )
 
@@ -415,11 +488,21 @@ def run_main_task(self):
                 session_db.commit()
                 return {"message": "No projects found"}
 
-            project_ids = [project.id for project in projects]
+            # План на сегодня: порядок групп по приоритету, квоты API и окно выполнения
+            plan = build_check_plan_sync(session_db)
+            planned_items = [item for item in plan["items"] if not item["deferred"]]
+            deferred_groups = [item["group_id"] for item in plan["items"] if item["deferred"]]
+            if deferred_groups:
+                logger.warning(f"Check plan deferred {len(deferred_groups)} groups: {deferred_groups}")
+
+            project_ids = list(dict.fromkeys(UUID(item["project_id"]) for item in planned_items))
             logger.info(f"Found {len(project_ids)} projects to process.")
 
+            timings = {}
+
             # Вызываем синхронную функцию main_task
-            success, error = main_task(project_ids, session_db)
+            success, error = main_task(project_ids, session_db, plan_items=planned_items, stats=timings,
+                                       progress=progress)
 
             failed = []
             access_denied_domains = []
@@ -430,15 +513,18 @@ def run_main_task(self):
             else:
                 logger.info("All projects processed successfully.")
 
-            success, error = main_task(project_ids, session_db)
+            success, error = main_task(project_ids, session_db, plan_items=planned_items)
 
             task_status.status = "completed"
             task_status.finished_at = datetime.utcnow()
             task_status.result = {
                 "failed_projects": failed,
-                "access_denied_domains": access_denied_domains
+                "access_denied_domains": access_denied_domains,
+                "deferred_groups": deferred_groups,
+                "timings": timings
             }
             session_db.commit()
+            progress.finish("completed", failed_projects=failed)
 
             return {
                 "failed_projects": failed,
@@ -447,4 +533,5 @@ def run_main_task(self):
 
     except Exception as e:
         logger.error(f"run_main_task failed: {e}", exc_info=True)
+        progress.finish("failed", error=str(e))
         raise
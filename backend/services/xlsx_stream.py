@@ -0,0 +1,227 @@
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Сколько байт копить перед отправкой очередного куска клиенту
+XLSX_CHUNK_SIZE = 64 * 1024
+
+# Управляющие символы, недопустимые в XML
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+# Тонкая чёрная граница со всех сторон ячейки
+_THIN_SIDES = "".join(
+    f'<{side} style="thin"><color rgb="FF000000"/></{side}>' for side in ("left", "right", "top", "bottom")
+)
+
+
+class _ChunkBuffer:
+    """Несмещаемый (unseekable) приёмник для zipfile: копит байты, пока их не заберёт writer."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+class XlsxStreamWriter:
+    """
+    Потоковая запись XLSX с одним листом и постоянным расходом памяти: строки сразу сжимаются
+    в zip, готовые байты забираются через row()/close(). Строки пишутся как inline strings
+    (без общей таблицы строк), стили задаются один раз при создании.
+
+    styles — {имя: {"bold": bool, "fill": "RRGGBB", "border": bool}}, в row() стиль указывается
+    по имени для всей строки или списком имён по ячейкам. widths — ширины колонок по порядку,
+    freeze_cols — сколько первых колонок закрепить.
+    """
+
+    def __init__(self, sheet_name: str = "Sheet1", styles: dict = None, widths: list = None,
+                 freeze_cols: int = 0):
+        self._buffer = _ChunkBuffer()
+        self._zip = zipfile.ZipFile(self._buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
+        self._style_ids = {}
+        self._row_num = 0
+        self._letters = []
+
+        self._zip.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        self._zip.writestr("_rels/.rels", _ROOT_RELS)
+        self._zip.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        self._zip.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet_name[:31], {'"': "&quot;"})))
+        self._zip.writestr("xl/styles.xml", self._styles_xml(styles or {}))
+
+        # Лист — последний элемент архива: пока он открыт, другие файлы писать нельзя
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True)
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        )
+        if freeze_cols:
+            top_left = f"{get_column_letter(freeze_cols + 1)}1"
+            self._sheet.write(
+                f'<sheetViews><sheetView workbookViewId="0"><pane xSplit="{freeze_cols}" '
+                f'topLeftCell="{top_left}" activePane="topRight" state="frozen"/></sheetView></sheetViews>'.encode()
+            )
+        if widths:
+            cols = "".join(
+                f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>'
+                for i, width in enumerate(widths, start=1) if width
+            )
+            self._sheet.write(f"<cols>{cols}</cols>".encode())
+        self._sheet.write(b"<sheetData>")
+
+    def _styles_xml(self, styles: dict) -> str:
+        fonts = ['<font><sz val="11"/><name val="Calibri"/></font>',
+                 '<font><b/><sz val="11"/><name val="Calibri"/></font>']
+        # Первые две заливки зарезервированы форматом
+        fills = ['<fill><patternFill patternType="none"/></fill>',
+                 '<fill><patternFill patternType="gray125"/></fill>']
+        fill_ids = {}
+        xfs = ['<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>']
+
+        for name, spec in styles.items():
+            font_id = 1 if spec.get("bold") else 0
+            fill_id = 0
+            color = spec.get("fill")
+            if color:
+                if color not in fill_ids:
+                    fill_ids[color] = len(fills)
+                    fills.append(f'<fill><patternFill patternType="solid"><fgColor rgb="FF{color.upper()}"/>'
+                                 f'<bgColor rgb="FF{color.upper()}"/></patternFill></fill>')
+                fill_id = fill_ids[color]
+            border_id = 1 if spec.get("border") else 0
+            apply = (' applyFont="1"' if font_id else "") + (' applyFill="1"' if fill_id else "") \
+                + (' applyBorder="1"' if border_id else "")
+            self._style_ids[name] = len(xfs)
+            xfs.append(f'<xf numFmtId="0" fontId="{font_id}" fillId="{fill_id}" borderId="{border_id}" '
+                       f'xfId="0"{apply}/>')
+
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<fonts count="{len(fonts)}">{"".join(fonts)}</fonts>'
+            f'<fills count="{len(fills)}">{"".join(fills)}</fills>'
+            '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+            f'<border>{_THIN_SIDES}<diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            f'<cellXfs count="{len(xfs)}">{"".join(xfs)}</cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            '</styleSheet>'
+        )
+
+    def _letter(self, index: int) -> str:
+        while len(self._letters) <= index:
+            self._letters.append(get_column_letter(len(self._letters) + 1))
+        return self._letters[index]
+
+    def _cell(self, ref: str, value, style_id: int) -> str:
+        s = f' s="{style_id}"' if style_id else ""
+        if value is None or (isinstance(value, float) and value != value):
+            return f'<c r="{ref}"{s}/>' if style_id else ""
+        if isinstance(value, bool):
+            return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}"{s}><v>{value}</v></c>'
+        if isinstance(value, datetime):
+            value = value.strftime("%Y-%m-%d %H:%M:%S")
+        elif isinstance(value, date):
+            value = value.strftime("%Y-%m-%d")
+        text = _ILLEGAL_XML_CHARS.sub("", escape(str(value)))
+        return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def row(self, values, style=None) -> bytes:
+        """Добавляет строку; возвращает накопленные байты архива, если их набралось на кусок, иначе b""."""
+        self._row_num += 1
+        r = self._row_num
+        if isinstance(style, (list, tuple)):
+            style_ids = [self._style_ids.get(name, 0) if name else 0 for name in style]
+        else:
+            style_ids = [self._style_ids.get(style, 0) if style else 0] * len(values)
+        cells = "".join(
+            self._cell(f"{self._letter(i)}{r}", value, style_ids[i])
+            for i, value in enumerate(values)
+        )
+        self._sheet.write(f'<row r="{r}">{cells}</row>'.encode())
+        if self._buffer.size >= XLSX_CHUNK_SIZE:
+            return self._buffer.drain()
+        return b""
+
+    def close(self) -> bytes:
+        """Закрывает лист и архив (центральный каталог zip) и возвращает оставшиеся байты."""
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
+        return self._buffer.drain()
+
+
+async def stream_xlsx(rows, sheet_name: str = "Sheet1", styles: dict = None, widths: list = None,
+                      freeze_cols: int = 0):
+    """
+    Асинхронный генератор байтов XLSX для StreamingResponse.
+    rows — асинхронный итератор пар (значения, стиль), см. XlsxStreamWriter.row.
+    """
+    writer = XlsxStreamWriter(sheet_name, styles=styles, widths=widths, freeze_cols=freeze_cols)
+    async for values, style in rows:
+        chunk = writer.row(values, style)
+        if chunk:
+            yield chunk
+    yield writer.close()
@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+# Модули приложения читают настройки при импорте
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+# Тесты с базой идут только на отдельной тестовой БД: схема public в ней пересоздаётся.
+# Хост, пользователь и пароль берутся из обычных POSTGRES_*.
+TEST_POSTGRES_DB = os.getenv("TEST_POSTGRES_DB")
+if TEST_POSTGRES_DB:
+    os.environ["POSTGRES_DB"] = TEST_POSTGRES_DB
+
+RUN_BENCHMARKS = os.getenv("RUN_BENCHMARKS") == "1"
+
+
+def pytest_collection_modifyitems(config, items):
+    if RUN_BENCHMARKS:
+        return
+    skip = pytest.mark.skip(reason="замеры запускаются при RUN_BENCHMARKS=1")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+async def _trgm_available(conn) -> bool:
+    from sqlalchemy import text
+
+    return bool((await conn.execute(text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    ))).scalar())
+
+
+async def create_test_schema():
+    """Создаёт схему так же, как при старте приложения (create_tables)."""
+    from sqlalchemy import event
+
+    from database.db_init import create_tables, engine
+    from database.models import Project
+
+    async with engine.connect() as conn:
+        trgm = await _trgm_available(conn)
+    if trgm:
+        await create_tables()
+        return
+
+    # Сборки PostgreSQL без contrib: схема без триграммного индекса по домену
+    index = next(i for i in Project.__table__.indexes if i.name == "ix_projects_domain_trgm")
+
+    def skip_trgm(conn, cursor, statement, parameters, context, executemany):
+        if "pg_trgm" in statement:
+            statement = "SELECT 1"
+        return statement, parameters
+
+    Project.__table__.indexes.discard(index)
+    event.listen(engine.sync_engine, "before_cursor_execute", skip_trgm, retval=True)
+    try:
+        await create_tables()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", skip_trgm)
+        Project.__table__.indexes.add(index)
+
+
+@pytest.fixture
+async def empty_db():
+    """Пустая схема public в тестовой БД; тест пропускается, если TEST_POSTGRES_DB не задана."""
+    if not TEST_POSTGRES_DB:
+        pytest.skip("TEST_POSTGRES_DB не задана")
+
+    from sqlalchemy import text
+
+    from database.db_init import engine, engine_sync
+
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+    # Соединения из пула помнят OID пересозданных типов
+    await engine.dispose()
+    engine_sync.dispose()
+    yield engine
+    await engine.dispose()
+    engine_sync.dispose()
+
+
+@pytest.fixture
+async def db(empty_db):
+    """Тестовая БД со схемой приложения."""
+    await create_test_schema()
+    yield empty_db
+
+
+@pytest.fixture
+async def client(db):
+    """HTTP-клиент к приложению поверх тестовой БД (без запуска startup)."""
+    from httpx import ASGITransport, AsyncClient
+
+    from main import app
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as http_client:
+        yield http_client
+
+
+
+def seed_project(session_db, groups: int = 1, keywords: int = 3, domain: str = "example.com", owner: str = "re-spond"):
+    """Проект с группами и ключами (цены 300/200/100 за топ-3/5/10) через синхронную сессию."""
+    import uuid
+
+    from database.models import Group, Keyword, Project
+
+    project = Project(domain=domain, client_link=uuid.uuid4().hex, owner=owner)
+    for g in range(groups):
+        group = Group(title=f"group {g}", region="Москва")
+        group.keywords = [
+            Keyword(keyword=f"keyword {g}-{k}", price_top_1_3=300, price_top_4_5=200, price_top_6_10=100)
+            for k in range(keywords)
+        ]
+        project.groups.append(group)
+    session_db.add(project)
+    session_db.commit()
+    return project
+
+
+class StatementCounter:
+    """Контекстный менеджер: собирает SQL-запросы, отправленные через engine."""
+
+    def __init__(self, engine):
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        from sqlalchemy import event
+
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
@@ -0,0 +1,137 @@
+import csv
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from database.db_init import SyncSessionLocal, engine_sync
+from database.models import (DashboardSnapshot, KeywordDailyStat, KeywordIntervalStat, KeywordState, Position,
+                             Project)
+from services.bulk_loader import CSV_COLUMNS, load_positions_csv
+from tests.conftest import seed_project
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+
+
+async def test_load_positions_csv(db, tmp_path):
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=2)
+        project.created_at = datetime(2024, 1, 1)
+        session_db.commit()
+        first, second = sorted(project.groups[0].keywords, key=lambda k: k.keyword)
+        project_id, version = project.id, project.version
+
+    path = tmp_path / "positions.csv"
+    _write_csv(path, [
+        (first.id, "2024-01-01 09:00:00", 5, 100),
+        (first.id, "2024-01-02 09:00:00", 2, 100),
+        # Дубль строки внутри файла
+        (first.id, "2024-01-02 09:00:00", 2, 100),
+        (first.id, "2024-01-16 09:00:00", 12, ""),
+        (second.id, "2024-01-03 09:00:00", "", ""),
+        # Неизвестный ключ пропускается
+        (uuid.uuid4(), "2024-01-03 09:00:00", 1, 10),
+    ])
+
+    stats = load_positions_csv(str(path), engine=engine_sync)
+    assert (stats["rows"], stats["inserted"]) == (6, 4)
+
+    # Повторная загрузка того же файла ничего не добавляет
+    assert load_positions_csv(str(path), engine=engine_sync)["inserted"] == 0
+
+    with SyncSessionLocal() as session_db:
+        history = session_db.execute(
+            select(Position.checked_at, Position.position, Position.previous_position, Position.cost,
+                   Position.trend, Position.frequency)
+            .where(Position.keyword_id == first.id).order_by(Position.checked_at)
+        ).all()
+        assert [(p.position, p.previous_position, p.cost, p.trend.value, p.frequency) for p in history] == [
+            (5, None, 200, "stable", 100),
+            (2, 5, 300, "up", 100),
+            (12, 2, 0, "down", None),
+        ]
+
+        states = {s.keyword_id: s for s in session_db.execute(select(KeywordState)).scalars()}
+        assert (states[first.id].position, states[first.id].previous_position) == (12, 2)
+        assert states[first.id].checked_at == datetime(2024, 1, 16, 9)
+        assert states[second.id].position is None
+
+        daily = session_db.execute(
+            select(KeywordDailyStat.day, KeywordDailyStat.bucket, KeywordDailyStat.cost)
+            .where(KeywordDailyStat.keyword_id == first.id).order_by(KeywordDailyStat.day)
+        ).all()
+        assert daily == [(date(2024, 1, 1), 5, 200), (date(2024, 1, 2), 3, 300), (date(2024, 1, 16), None, 0)]
+
+        intervals = session_db.execute(
+            select(KeywordIntervalStat.interval_start, KeywordIntervalStat.days_top3,
+                   KeywordIntervalStat.days_top5, KeywordIntervalStat.days_top10, KeywordIntervalStat.cost)
+            .where(KeywordIntervalStat.keyword_id == first.id).order_by(KeywordIntervalStat.interval_start)
+        ).all()
+        assert intervals == [(date(2024, 1, 1), 1, 1, 0, 500), (date(2024, 1, 15), 0, 0, 0, 0)]
+
+        # Версия растёт только при загрузке, добавившей строки; снимок дашборда пересчитан
+        assert session_db.get(Project, project_id).version == version + 1
+        snapshot = session_db.get(DashboardSnapshot, project_id)
+        assert snapshot.data["keywords"] == 2
+
+
+async def test_load_continues_existing_history(db, tmp_path):
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=1)
+        keyword_id = project.groups[0].keywords[0].id
+
+    earlier = tmp_path / "earlier.csv"
+    _write_csv(earlier, [
+        (keyword_id, "2024-01-01 09:00:00", 8, ""),
+        # Проверка после загружаемого диапазона не должна стать предыдущей
+        (keyword_id, "2024-01-10 09:00:00", 1, ""),
+    ])
+    later = tmp_path / "later.csv"
+    _write_csv(later, [
+        (keyword_id, "2024-01-02 09:00:00", 5, ""),
+        (keyword_id, "2024-01-03 09:00:00", 6, ""),
+    ])
+    assert load_positions_csv(str(earlier), engine=engine_sync)["inserted"] == 2
+    assert load_positions_csv(str(later), engine=engine_sync)["inserted"] == 2
+
+    with SyncSessionLocal() as session_db:
+        history = session_db.execute(
+            select(Position.position, Position.previous_position, Position.trend)
+            .where(Position.keyword_id == keyword_id).order_by(Position.checked_at)
+        ).all()
+    assert [(p.position, p.previous_position, p.trend.value) for p in history[:3]] == [
+        (8, None, "stable"),
+        (5, 8, "up"),
+        (6, 5, "down"),
+    ]
+
+
+@pytest.mark.benchmark
+async def test_load_positions_csv_throughput(db, tmp_path):
+    keywords_count, days = 1000, 365
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=keywords_count)
+        keyword_ids = [k.id for k in project.groups[0].keywords]
+
+    start = datetime(2024, 1, 1, 9)
+    path = tmp_path / "positions.csv"
+    _write_csv(path, (
+        (keyword_id, start + timedelta(days=day), (day + n) % 30 + 1, 100)
+        for n, keyword_id in enumerate(keyword_ids)
+        for day in range(days)
+    ))
+
+    started = time.perf_counter()
+    stats = load_positions_csv(str(path), engine=engine_sync)
+    seconds = time.perf_counter() - started
+
+    assert stats["inserted"] == keywords_count * days
+    print(f"\nbulk load: {stats['rows']} rows in {seconds:.2f}s ({int(stats['rows'] / seconds)} rows/s), "
+          f"COPY {stats['copy_seconds']}s")
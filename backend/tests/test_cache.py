@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+from services import cache
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+def _freeze_utcnow(monkeypatch, moment: datetime):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return moment
+
+    monkeypatch.setattr(cache, "datetime", FrozenDatetime)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(cache, "get_async_redis", lambda: redis)
+    return redis
+
+
+async def test_client_view_cache_expires_at_midnight(fake_redis, monkeypatch):
+    _freeze_utcnow(monkeypatch, datetime(2026, 3, 1, 23, 50))
+    await cache.set_cached_client_view("link", "week", 7, b"payload")
+    assert await cache.get_cached_client_view("link", "week", 7) == b"payload"
+    assert await cache.get_cached_client_view("link", "week", 8) is None
+
+    # Окно week/month считается от текущего дня: вчерашняя запись не подходит
+    _freeze_utcnow(monkeypatch, datetime(2026, 3, 2, 0, 5))
+    assert await cache.get_cached_client_view("link", "week", 7) is None
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from services.check_planner import build_check_plan, check_window
+
+
+def test_window_is_converted_to_utc():
+    # 09:00 UTC — 12:00 по Москве, окно 11:30–14:00 MSK
+    plan_date, start, end = check_window(datetime(2026, 1, 10, 9, 0))
+    assert plan_date.isoformat() == "2026-01-10"
+    assert start == datetime(2026, 1, 10, 8, 30)
+    assert end == datetime(2026, 1, 10, 11, 0)
+
+
+def test_window_uses_local_date_after_midnight():
+    # 22:30 UTC — уже следующие сутки по Москве
+    plan_date, start, _ = check_window(datetime(2026, 1, 10, 22, 30))
+    assert plan_date.isoformat() == "2026-01-11"
+    assert start == datetime(2026, 1, 11, 8, 30)
+
+
+def test_plan_reports_utc_window():
+    plan = build_check_plan([], [], now=datetime(2026, 1, 10, 9, 0))
+    assert plan["date"] == "2026-01-10"
+    assert plan["window_start"] == "2026-01-10T08:30:00"
+    assert plan["window_end"] == "2026-01-10T11:00:00"
@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from database.backfill import backfill_keyword_rollups
+from database.db_init import SyncSessionLocal
+from services.rollups import INTERVAL_DAYS
+from tests.conftest import seed_project
+
+BUCKETS = (3, 5, 10, None)
+
+# Дневная сводка за days дней до сегодняшнего: корзина ключа чередуется по дням
+SEED_DAILY_SQL = """
+INSERT INTO keyword_daily_stats (keyword_id, day, bucket, cost)
+SELECT k.id, d.day::date, (ARRAY[3, 5, 10, NULL])[(k.n + d.i) % 4 + 1], 0
+FROM (SELECT id, (row_number() OVER (ORDER BY keyword) - 1)::int AS n FROM keywords) k
+CROSS JOIN (SELECT current_date - i AS day, i FROM generate_series(1, :days) i) d
+"""
+
+
+def _seed(keywords: int, days: int):
+    today = datetime.utcnow().date()
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=keywords)
+        project.created_at = datetime.combine(today - timedelta(days=days), datetime.min.time())
+        session_db.execute(text(SEED_DAILY_SQL), {"days": days})
+        session_db.commit()
+        # Двухнедельные агрегаты строятся из дневной сводки так же, как при старте приложения
+        backfill_keyword_rollups(session_db.connection())
+        session_db.commit()
+        keywords_order = sorted(project.groups[0].keywords, key=lambda k: k.keyword)
+        return project, project.groups[0].id, keywords_order
+
+
+def _expected_days(n: int, start, end, today):
+    counts = {3: 0, 5: 0, 10: 0}
+    day = start
+    while day <= end:
+        if day < today:
+            bucket = BUCKETS[(n + (today - day).days) % 4]
+            if bucket:
+                counts[bucket] += 1
+        day += timedelta(days=1)
+    return counts[3], counts[5], counts[10]
+
+
+@pytest.mark.parametrize("period,offset", [("custom", 0), ("month", 0), ("month", -1), ("week", -1)])
+async def test_intervals_match_daily_history(client, period, offset):
+    project, group_id, keywords = _seed(keywords=3, days=70)
+    today = datetime.utcnow().date()
+
+    response = await client.get(f"/api/groups/{group_id}/positions/intervals",
+                                params={"period": period, "offset": offset})
+    assert response.status_code == 200
+    assert response.headers["etag"]
+
+    by_keyword = {item["keyword_id"]: item["intervals"] for item in response.json()}
+    for n, keyword in enumerate(keywords):
+        assert by_keyword[str(keyword.id)]
+        for interval in by_keyword[str(keyword.id)]:
+            start = datetime.strptime(interval["start_date"], "%Y-%m-%d").date()
+            end = datetime.strptime(interval["end_date"], "%Y-%m-%d").date()
+            days = _expected_days(n, start, end, today)
+            assert (interval["days_top3"], interval["days_top5"], interval["days_top10"]) == days
+            assert interval["sum_cost"] == days[0] * 300 + days[1] * 200 + days[2] * 100
+
+
+@pytest.mark.benchmark
+async def test_intervals_timing_5k_keywords_year(client):
+    _, group_id, _ = _seed(keywords=5000, days=365)
+
+    timings = {}
+    for period in ("month", "custom"):
+        started = time.perf_counter()
+        response = await client.get(f"/api/groups/{group_id}/positions/intervals", params={"period": period})
+        timings[period] = time.perf_counter() - started
+        assert response.status_code == 200
+        assert len(response.json()) == 5000
+
+    print(f"\nintervals, 5000 keywords x 365 days: month {timings['month']:.2f}s, "
+          f"custom ({365 // INTERVAL_DAYS} intervals) {timings['custom']:.2f}s")
+    assert timings["month"] < 5
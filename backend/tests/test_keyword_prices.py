@@ -0,0 +1,41 @@
+from io import BytesIO
+
+import pandas as pd
+from sqlalchemy import select
+
+from database.db_init import SyncSessionLocal
+from database.models import Keyword, Project
+from tests.conftest import seed_project
+
+
+async def test_update_keywords_from_file(client):
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=3)
+        group_id, version = project.groups[0].id, project.version
+
+    frame = pd.DataFrame({
+        "Ключевое слово": ["keyword 0-0", " keyword 0-1 ", "keyword 0-0", "нет в группе"],
+        "Топ 3": [500, 400, 600, 1],
+        "Топ 5": [None, 300, None, 1],
+        "Топ 10": [100, "abc", 50, 1],
+    })
+    buffer = BytesIO()
+    frame.to_excel(buffer, index=False)
+
+    response = await client.post(
+        f"/api/groups/{group_id}/keywords/update_from_file",
+        files={"file": ("prices.xlsx", buffer.getvalue(),
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+    )
+    assert response.status_code == 200
+    # Дубль в файле схлопнут, неизвестный ключ пропущен
+    assert response.json() == {"updated_count": 2}
+
+    with SyncSessionLocal() as session_db:
+        prices = session_db.execute(
+            select(Keyword.keyword, Keyword.price_top_1_3, Keyword.price_top_4_5, Keyword.price_top_6_10)
+            .where(Keyword.group_id == group_id).order_by(Keyword.keyword)
+        ).all()
+        assert prices == [("keyword 0-0", 600, 200, 50), ("keyword 0-1", 400, 300, 100),
+                          ("keyword 0-2", 300, 200, 100)]
+        assert session_db.get(Project, project.id).version == version + 1
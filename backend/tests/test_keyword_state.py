@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from database.models import TrendEnum
+from services.keyword_state import calculate_cost, calculate_trend
+
+KEYWORD = SimpleNamespace(price_top_1_3=300, price_top_4_5=200, price_top_6_10=100)
+
+
+def test_cost_by_position():
+    assert calculate_cost(KEYWORD, 1) == 300
+    assert calculate_cost(KEYWORD, 5) == 200
+    assert calculate_cost(KEYWORD, 10) == 100
+    assert calculate_cost(KEYWORD, 11) == 0
+    assert calculate_cost(KEYWORD, None) == 0
+
+
+def test_trend():
+    assert calculate_trend(None, 5) == TrendEnum.stable
+    assert calculate_trend(5, None) == TrendEnum.stable
+    assert calculate_trend(5, 3) == TrendEnum.up
+    assert calculate_trend(3, 5) == TrendEnum.down
+    assert calculate_trend(4, 4) == TrendEnum.stable
+
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import select
+
+from database.db_init import SyncSessionLocal, async_session_maker
+from database.loading import group_detail, project_detail, project_ingest, project_summary
+from database.models import Group, KeywordState, Project
+from tests.conftest import StatementCounter, seed_project
+
+
+@pytest.fixture
+async def projects(db):
+    with SyncSessionLocal() as session_db:
+        for n in range(5):
+            project = seed_project(session_db, groups=3, keywords=4, domain=f"site{n}.ru")
+            for group in project.groups:
+                for keyword in group.keywords:
+                    session_db.add(KeywordState(keyword_id=keyword.id, position=n + 1))
+        session_db.commit()
+    return db
+
+
+def _touch_keywords(items):
+    return [(keyword.keyword, keyword.currentPosition) for project in items
+            for group in project.groups for keyword in group.keywords]
+
+
+@pytest.mark.parametrize("profile,statements,keywords", [
+    (project_summary, 2, 0),
+    (project_detail, 3, 60),
+    (project_ingest, 3, 60),
+])
+async def test_project_profiles_statement_count(projects, profile, statements, keywords):
+    async with async_session_maker() as db:
+        with StatementCounter(projects) as counter:
+            result = await db.execute(select(Project).options(profile()))
+            items = result.scalars().all()
+            # Обращение к группам, ключам и их состоянию не должно порождать ленивых запросов
+            loaded = await db.run_sync(lambda _: _touch_keywords(items))
+
+    assert len(items) == 5
+    assert len(loaded) == keywords
+    assert counter.count == statements, counter.statements
+
+
+async def test_group_detail_statement_count(projects):
+    async with async_session_maker() as db:
+        with StatementCounter(projects) as counter:
+            groups = (await db.execute(select(Group).options(group_detail()))).scalars().all()
+            positions = [keyword.currentPosition for group in groups for keyword in group.keywords]
+
+    assert len(positions) == 60 and None not in positions
+    assert counter.count == 2, counter.statements
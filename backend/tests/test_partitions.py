@@ -0,0 +1,112 @@
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from database.models import Keyword, Position
+from database.partitions import (add_months, convert_positions_to_partitioned, ensure_position_partitions,
+                                 month_start, partition_name, positions_relkind)
+from tests.conftest import create_test_schema
+
+# Таблица positions в том виде, в каком она была до партиционирования
+LEGACY_POSITIONS_DDL = """
+CREATE TABLE positions (
+    id UUID PRIMARY KEY,
+    keyword_id UUID REFERENCES keywords (id) ON DELETE SET NULL,
+    checked_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    position INTEGER,
+    frequency INTEGER,
+    previous_position INTEGER,
+    cost INTEGER NOT NULL,
+    trend trendenum NOT NULL
+)
+"""
+
+
+async def test_plain_positions_table_is_migrated(db):
+    today = datetime.utcnow().date()
+    months = [add_months(month_start(today), -i) for i in (14, 2, 0)]
+
+    async with db.begin() as conn:
+        await conn.execute(text("DROP TABLE positions"))
+        await conn.execute(text(LEGACY_POSITIONS_DDL))
+        for i, month in enumerate(months):
+            await conn.execute(text(
+                "INSERT INTO positions (id, checked_at, position, cost, trend) "
+                "VALUES (:id, :checked_at, :position, 0, 'stable')"
+            ), {"id": uuid.uuid4(), "checked_at": datetime(month.year, month.month, 5, 12), "position": i + 1})
+        assert await conn.run_sync(positions_relkind) == "r"
+
+    # Старт приложения: миграция выполняется внутри create_tables
+    await create_test_schema()
+
+    async with db.connect() as conn:
+        assert await conn.run_sync(positions_relkind) == "p"
+        rows = (await conn.execute(text(
+            "SELECT tableoid::regclass::text, position FROM positions ORDER BY checked_at"
+        ))).all()
+        legacy = (await conn.execute(text("SELECT to_regclass('positions_legacy')"))).scalar()
+
+    assert [row[0] for row in rows] == [partition_name(month) for month in months]
+    assert [row[1] for row in rows] == [1, 2, 3]
+    assert legacy is None
+
+
+async def test_convert_skips_partitioned_table(db):
+    async with db.begin() as conn:
+        await conn.run_sync(convert_positions_to_partitioned)
+        assert await conn.run_sync(positions_relkind) == "p"
+
+
+def _scanned_partitions(plan) -> set:
+    found = set()
+    if isinstance(plan, dict):
+        name = plan.get("Relation Name", "")
+        if name.startswith("positions_"):
+            found.add(name)
+        for value in plan.values():
+            found |= _scanned_partitions(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            found |= _scanned_partitions(item)
+    return found
+
+
+async def _explain(conn, stmt) -> set:
+    sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    return _scanned_partitions(plan)
+
+
+async def test_hot_queries_prune_partitions(db):
+    today = datetime.utcnow().date()
+    month = add_months(month_start(today), -2)
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(add_months(month, 1), datetime.min.time())
+
+    async with db.begin() as conn:
+        await conn.run_sync(ensure_position_partitions, add_months(month, -3))
+
+    group_period = (
+        select(Position)
+        .join(Position.keyword)
+        .where(Keyword.group_id == uuid.uuid4())
+        .where(Position.checked_at >= start, Position.checked_at < end)
+    )
+    keyword_week = (
+        select(Position.checked_at, Position.position)
+        .where(Position.keyword_id == uuid.uuid4())
+        .where(Position.checked_at >= start + timedelta(days=7), Position.checked_at < start + timedelta(days=14))
+        .order_by(Position.checked_at.desc())
+    )
+
+    async with db.connect() as conn:
+        all_partitions = await _explain(conn, select(Position.id))
+        assert len(all_partitions) > 2
+        assert await _explain(conn, group_period) == {partition_name(month)}
+        assert await _explain(conn, keyword_week) == {partition_name(month)}
+
+
+def test_partition_name():
+    assert partition_name(date(2024, 3, 1)) == "positions_y2024m03"
@@ -0,0 +1,230 @@
+import io
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from openpyxl.styles import Border, PatternFill, Side
+from openpyxl.utils import get_column_letter
+from sqlalchemy import select, text
+
+from database.db_init import SyncSessionLocal
+from database.models import Group, Keyword, Position
+from database.partitions import ensure_position_partitions
+from tests.conftest import seed_project
+
+INSERT_POSITION_SQL = """
+INSERT INTO positions (id, keyword_id, checked_at, position, frequency, previous_position, cost, trend)
+VALUES (gen_random_uuid(), :keyword_id, :checked_at, :position, 100, NULL, 0, 'stable')
+"""
+
+# По позиции на ключ в день; часть дней пропущена, позиции распределены по всем корзинам заливки
+SEED_BENCHMARK_SQL = """
+INSERT INTO positions (id, keyword_id, checked_at, position, frequency, previous_position, cost, trend)
+SELECT gen_random_uuid(), k.id, :start + d * interval '1 day' + interval '9 hours',
+       (d + k.n) % 50 + 1, 100, NULL, 0, 'stable'
+FROM (SELECT id, (row_number() OVER (ORDER BY keyword))::int AS n FROM keywords) k
+CROSS JOIN generate_series(0, :days - 1) d
+WHERE (d + k.n) % 7 <> 0
+"""
+
+# Позиции за день по ключам (по порядку сидирования): None — проверка без позиции
+DAY_POSITIONS = [1, 4, 7, 15, 45, None, 3, 0, 30, 11, 5, 10]
+
+
+def legacy_pivot_workbook(domain, keywords, positions, start_date, end_date) -> bytes:
+    """
+    Эталон: сводная таблица так, как её строила прежняя выгрузка (pandas pivot_table + openpyxl).
+    keywords — [(id, группа, ключ)], positions — [(keyword_id, checked_at, position)].
+    """
+    pos_dict = {}
+    for keyword_id, checked_at, position in sorted(positions, key=lambda p: p[1], reverse=True):
+        pos_dict.setdefault((keyword_id, checked_at.date()), position)
+
+    date_list = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    rows = [
+        {"Проект": domain, "Группа": group_title, "Ключевое слово": keyword, "Дата": dt,
+         "Позиция": pos_dict.get((keyword_id, dt), "--")}
+        for keyword_id, group_title, keyword in keywords
+        for dt in date_list
+    ]
+    pivot = pd.DataFrame(rows).pivot_table(
+        index=["Проект", "Группа", "Ключевое слово"], columns="Дата", values="Позиция", aggfunc="first"
+    )
+    pivot = pivot.fillna("--")
+    pivot = pivot.reindex(sorted(pivot.columns), axis=1)
+
+    fills = {name: PatternFill(start_color=color, end_color=color, fill_type="solid")
+             for name, color in (("green", "b7fbd5"), ("yellow", "fef5c5"), ("blue", "b4d2ff"),
+                                 ("grey", "f6f5f8"), ("white", "ffffff"))}
+
+    def get_fill(position):
+        if position == "--":
+            return fills["white"]
+        if 1 <= position <= 3:
+            return fills["green"]
+        if 4 <= position <= 5:
+            return fills["yellow"]
+        if 6 <= position <= 10:
+            return fills["blue"]
+        if 11 <= position <= 30:
+            return fills["grey"]
+        return fills["white"]
+
+    thin = Side(style="thin", color="000000")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        pivot.to_excel(writer, sheet_name="Positions")
+        ws = writer.sheets["Positions"]
+        for row in range(2, ws.max_row + 1):
+            for col in range(4, ws.max_column + 1):
+                cell = ws.cell(row=row, column=col)
+                cell.fill = get_fill(cell.value)
+        for row in ws.iter_rows():
+            for cell in row:
+                cell.border = border
+        for col in range(1, ws.max_column + 1):
+            values = [ws.cell(row=row, column=col).value for row in range(1, ws.max_row + 1)]
+            ws.column_dimensions[get_column_letter(col)].width = max(
+                len(str(value)) for value in values if value is not None
+            ) + 2
+        ws.freeze_panes = "D1"
+    return output.getvalue()
+
+
+def _unmerged(ws):
+    """
+    Значения листа построчно. Прежняя выгрузка объединяла повторяющиеся ячейки индекса
+    и писала даты заголовка как datetime: приводим к плоскому виду новой выгрузки.
+    """
+    values = [[cell.value for cell in row] for row in ws.iter_rows()]
+    for merged in ws.merged_cells.ranges:
+        top_left = values[merged.min_row - 1][merged.min_col - 1]
+        for row in range(merged.min_row, merged.max_row + 1):
+            for col in range(merged.min_col, merged.max_col + 1):
+                values[row - 1][col - 1] = top_left
+    values[0] = [value.strftime("%Y-%m-%d") if isinstance(value, datetime) else value for value in values[0]]
+    return values
+
+
+def _fill(cell):
+    if cell.fill.fill_type != "solid":
+        return None
+    return cell.fill.fgColor.rgb[-6:].lower()
+
+
+def _load_legacy_inputs(project_id, start, end):
+    period_end = end + timedelta(days=1)
+    with SyncSessionLocal() as session_db:
+        keywords = session_db.execute(
+            select(Keyword.id, Group.title, Keyword.keyword)
+            .join(Group, Group.id == Keyword.group_id)
+            .where(Group.project_id == project_id)
+        ).all()
+        positions = session_db.execute(
+            select(Position.keyword_id, Position.checked_at, Position.position)
+            .join(Keyword, Keyword.id == Position.keyword_id)
+            .join(Group, Group.id == Keyword.group_id)
+            .where(Group.project_id == project_id,
+                   Position.checked_at >= datetime.combine(start, datetime.min.time()),
+                   Position.checked_at < datetime.combine(period_end, datetime.min.time()))
+        ).all()
+    return keywords, positions
+
+
+@pytest.fixture
+async def pivot_project(db):
+    """Две группы по шесть ключей, неделя позиций с пропусками и повторными проверками за день."""
+    end = datetime.utcnow().date() - timedelta(days=2)
+    start = end - timedelta(days=6)
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, groups=2, keywords=6)
+        keywords = [kw for group in project.groups for kw in group.keywords]
+        for day in range(7):
+            checked_at = datetime.combine(start + timedelta(days=day), datetime.min.time())
+            for i, kw in enumerate(keywords):
+                if (day + i) % 5 == 4:
+                    continue
+                position = DAY_POSITIONS[(day + i) % len(DAY_POSITIONS)]
+                session_db.execute(text(INSERT_POSITION_SQL), {
+                    "keyword_id": kw.id, "checked_at": checked_at + timedelta(hours=12), "position": position,
+                })
+                if i % 3 == 0:
+                    # Более ранняя проверка того же дня не должна попасть в выгрузку
+                    session_db.execute(text(INSERT_POSITION_SQL), {
+                        "keyword_id": kw.id, "checked_at": checked_at + timedelta(hours=8), "position": 99,
+                    })
+        # Позиция вне периода
+        session_db.execute(text(INSERT_POSITION_SQL), {
+            "keyword_id": keywords[0].id, "checked_at": datetime.combine(end + timedelta(days=1),
+                                                                         datetime.min.time()), "position": 2,
+        })
+        session_db.commit()
+        return project.id, project.domain, start, end
+
+
+async def test_pivot_export_matches_legacy_workbook(client, pivot_project):
+    project_id, domain, start, end = pivot_project
+
+    response = await client.get(f"/api/projects/{project_id}/positions/export_pivot",
+                                params={"start_date": str(start), "end_date": str(end)})
+    assert response.status_code == 200
+    streamed = load_workbook(io.BytesIO(response.content))
+    legacy = load_workbook(io.BytesIO(legacy_pivot_workbook(domain, *_load_legacy_inputs(project_id, start, end),
+                                                            start, end)))
+    ws, legacy_ws = streamed["Positions"], legacy["Positions"]
+
+    assert streamed.sheetnames == legacy.sheetnames == ["Positions"]
+    assert (ws.max_row, ws.max_column) == (legacy_ws.max_row, legacy_ws.max_column) == (13, 10)
+    assert _unmerged(ws) == _unmerged(legacy_ws)
+    assert ws.freeze_panes == legacy_ws.freeze_panes == "D1"
+
+    for row, legacy_row in zip(ws.iter_rows(), legacy_ws.iter_rows()):
+        for cell, legacy_cell in zip(row, legacy_row):
+            assert _fill(cell) == _fill(legacy_cell), cell.coordinate
+            assert cell.font.b == legacy_cell.font.b, cell.coordinate
+            assert cell.border.left.style == legacy_cell.border.left.style == "thin", cell.coordinate
+
+    # Ширины колонок индекса совпадают; колонки дат у прежней выгрузки шире из-за заголовка-datetime
+    for col in "ABC":
+        assert ws.column_dimensions[col].width == legacy_ws.column_dimensions[col].width
+
+
+@pytest.mark.benchmark
+async def test_pivot_export_benchmark(client, db):
+    """
+    3000 ключей × 90 дней: потоковая выгрузка против прежней сборки через pandas.
+    Рядом проект того же размера — его позиции за период не должны замедлять выгрузку.
+    """
+    days = 90
+    end = datetime.utcnow().date() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    async with db.begin() as conn:
+        await conn.run_sync(ensure_position_partitions, start)
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, groups=3, keywords=1000)
+        seed_project(session_db, groups=3, keywords=1000, domain="other.com")
+        session_db.execute(text(SEED_BENCHMARK_SQL), {"start": datetime.combine(start, datetime.min.time()),
+                                                      "days": days})
+        session_db.commit()
+        project_id, domain = project.id, project.domain
+    async with db.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+
+    began = time.perf_counter()
+    response = await client.get(f"/api/projects/{project_id}/positions/export_pivot",
+                                params={"start_date": str(start), "end_date": str(end)})
+    streamed_seconds = time.perf_counter() - began
+    assert response.status_code == 200
+
+    began = time.perf_counter()
+    legacy = legacy_pivot_workbook(domain, *_load_legacy_inputs(project_id, start, end), start, end)
+    legacy_seconds = time.perf_counter() - began
+
+    rows = list(load_workbook(io.BytesIO(response.content), read_only=True)["Positions"].iter_rows(values_only=True))
+    assert (len(rows), len(rows[0])) == (3001, 93)
+    print(f"pivot export 3000x{days}: streamed {streamed_seconds:.2f}s, {len(response.content)} bytes; "
+          f"legacy {legacy_seconds:.2f}s, {len(legacy)} bytes")
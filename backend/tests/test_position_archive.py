@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from database.db_init import SyncSessionLocal
+from database.partitions import add_months, ensure_position_partitions, month_start, partition_name
+from services.position_archive import archive_cutoff, archive_month
+from tests.conftest import seed_project
+
+INSERT_POSITION_SQL = """
+INSERT INTO positions (id, keyword_id, checked_at, position, frequency, previous_position, cost, trend)
+VALUES (gen_random_uuid(), :keyword_id, :checked_at, :position, 100, :previous_position, :cost, :trend)
+"""
+
+POSITION_KEYS = {"keyword_id", "checked_at", "position", "frequency", "previous_position", "cost", "trend"}
+
+
+def _month_offset(month) -> int:
+    today = datetime.utcnow().date()
+    return (month.year - today.year) * 12 + month.month - today.month
+
+
+@pytest.fixture
+async def archived_group(db):
+    """
+    Группа из двух ключей: месяц старше горизонта хранения уже в архиве,
+    плюс позиции текущего месяца в горячей таблице.
+    """
+    old_month = add_months(archive_cutoff().date(), -1)
+    async with db.begin() as conn:
+        await conn.run_sync(ensure_position_partitions, old_month)
+
+    old_start = datetime.combine(old_month, datetime.min.time())
+    recent = datetime.combine(month_start(datetime.utcnow().date()), datetime.min.time())
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=2)
+        first, second = project.groups[0].keywords
+        # Вставка не по порядку: архив и выдача должны упорядочить проверки по времени
+        for keyword, checked_at, position, previous, trend in (
+            (first, old_start + timedelta(days=3, hours=9), 7, 5, "down"),
+            (second, old_start + timedelta(days=1, hours=12), None, 12, "down"),
+            (first, old_start + timedelta(days=1, hours=9), 5, None, "stable"),
+            (second, old_start + timedelta(days=2, hours=9), 3, None, "up"),
+            (first, recent + timedelta(hours=9), 2, 7, "up"),
+        ):
+            session_db.execute(text(INSERT_POSITION_SQL), {
+                "keyword_id": keyword.id, "checked_at": checked_at, "position": position,
+                "previous_position": previous, "cost": position or 0, "trend": trend,
+            })
+        # Строка удалённого ключа не архивируется
+        session_db.execute(text(INSERT_POSITION_SQL), {
+            "keyword_id": None, "checked_at": old_start + timedelta(days=5), "position": 1,
+            "previous_position": None, "cost": 0, "trend": "stable",
+        })
+        session_db.commit()
+        group_id, first_id, second_id = project.groups[0].id, first.id, second.id
+
+    async with db.begin() as conn:
+        await conn.run_sync(archive_month, old_month)
+    return group_id, first_id, second_id, old_month
+
+
+async def test_archive_month_packs_and_drops_month(db, archived_group):
+    _, first_id, second_id, old_month = archived_group
+
+    async with db.connect() as conn:
+        archived = (await conn.execute(text(
+            "SELECT keyword_id, month, checked_at, positions, previous_positions, costs, trends "
+            "FROM position_archives ORDER BY month, keyword_id"
+        ))).all()
+        remaining = (await conn.execute(text(
+            "SELECT count(*) FROM positions WHERE checked_at < :end"
+        ), {"end": add_months(old_month, 1)})).scalar()
+        partition = (await conn.execute(text("SELECT to_regclass(:name)"),
+                                        {"name": partition_name(old_month)})).scalar()
+
+    assert remaining == 0
+    assert partition is None
+    by_keyword = {row.keyword_id: row for row in archived}
+    assert set(by_keyword) == {first_id, second_id}
+    first = by_keyword[first_id]
+    assert first.month == old_month
+    assert [checked_at.day for checked_at in first.checked_at] == [2, 4]
+    assert first.positions == [5, 7]
+    assert first.previous_positions == [None, 5]
+    assert first.costs == [5, 7]
+    assert first.trends == ["stable", "down"]
+    assert by_keyword[second_id].positions == [None, 3]
+
+
+async def test_archived_month_is_served_from_archive(client, archived_group):
+    group_id, first_id, second_id, old_month = archived_group
+
+    response = await client.get(f"/api/groups/{group_id}/positions",
+                                params={"period": "month", "offset": _month_offset(old_month)})
+    assert response.status_code == 200
+    rows = response.json()
+
+    assert [set(row) for row in rows] == [POSITION_KEYS] * 4
+    assert [(row["keyword_id"], row["position"], row["trend"]) for row in rows] == [
+        (str(first_id), 5, "stable"),
+        (str(second_id), None, "down"),
+        (str(second_id), 3, "up"),
+        (str(first_id), 7, "down"),
+    ]
+    assert rows[3]["previous_position"] == 5
+
+
+async def test_custom_period_merges_hot_and_archived_rows(client, archived_group):
+    group_id, first_id, _, _ = archived_group
+
+    response = await client.get(f"/api/groups/{group_id}/positions", params={"period": "custom"})
+    assert response.status_code == 200
+    rows = response.json()
+
+    # Одна форма строк для обоих источников, история по порядку проверок
+    assert [set(row) for row in rows] == [POSITION_KEYS] * 5
+    assert [row["checked_at"] for row in rows] == sorted(row["checked_at"] for row in rows)
+    assert (rows[-1]["keyword_id"], rows[-1]["position"]) == (str(first_id), 2)
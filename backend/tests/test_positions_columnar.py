@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from database.db_init import SyncSessionLocal
+from database.partitions import add_months, month_start
+from tests.conftest import seed_project
+
+SEED_POSITIONS_SQL = """
+INSERT INTO positions (id, keyword_id, checked_at, position, frequency, previous_position, cost, trend)
+SELECT gen_random_uuid(), k.id, :start + d * interval '1 day' + interval '9 hours',
+       (d + k.n) % 15 + 1, 100 + d, NULL, 0, 'stable'
+FROM (SELECT id, (row_number() OVER (ORDER BY keyword))::int AS n FROM keywords) k
+CROSS JOIN generate_series(0, :days - 1) d
+"""
+
+
+@pytest.fixture
+async def group_positions(db):
+    """Группа с позициями за каждый день прошлого месяца."""
+    month = add_months(month_start(datetime.utcnow().date()), -1)
+    days = (add_months(month, 1) - month).days
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=100)
+        session_db.execute(text(SEED_POSITIONS_SQL), {"start": datetime.combine(month, datetime.min.time()),
+                                                      "days": days})
+        session_db.commit()
+        return project.groups[0].id, days
+
+
+async def test_columnar_matches_rows(client, group_positions):
+    group_id, days = group_positions
+    params = {"period": "month", "offset": -1}
+
+    rows = await client.get(f"/api/groups/{group_id}/positions", params=params)
+    columnar = await client.get(f"/api/groups/{group_id}/positions", params={**params, "format": "columnar"})
+    assert rows.status_code == columnar.status_code == 200
+    assert columnar.headers["etag"] and columnar.headers["etag"] != rows.headers["etag"]
+
+    data = columnar.json()
+    assert set(data) == {"keyword_ids", "dates", "positions", "frequencies", "costs"}
+    assert len(data["keyword_ids"]) == 100
+    assert all(len(data[column][i]) == days
+               for column in ("dates", "positions", "frequencies", "costs") for i in range(100))
+
+    # Те же проверки, что и в построчном формате
+    expected = {}
+    for row in rows.json():
+        expected.setdefault(row["keyword_id"], []).append((row["checked_at"], row["position"], row["frequency"]))
+    unpacked = {
+        keyword_id: list(zip(data["dates"][i], data["positions"][i], data["frequencies"][i]))
+        for i, keyword_id in enumerate(data["keyword_ids"])
+    }
+    assert unpacked == {keyword_id: sorted(checks) for keyword_id, checks in expected.items()}
+
+    print(f"\npositions payload, 100 keywords x {days} days: rows {len(rows.content)} bytes, "
+          f"columnar {len(columnar.content)} bytes ({len(columnar.content) / len(rows.content):.0%})")
+    assert len(columnar.content) < len(rows.content) / 2
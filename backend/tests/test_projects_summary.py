@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.db_init import SyncSessionLocal
+from database.models import KeywordState, User, UserRole
+from services.auth_utils import get_current_user
+from tests.conftest import StatementCounter, seed_project
+
+
+@pytest.fixture
+async def summary_client(client, db):
+    """30 проектов по 2 группы x 5 ключей; менеджеру назначены первые 10."""
+    from main import app
+
+    with SyncSessionLocal() as session_db:
+        manager = User(username="manager", hashed_password="x", role=UserRole.manager)
+        session_db.add(manager)
+        for n in range(30):
+            project = seed_project(session_db, groups=2, keywords=5, domain=f"site{n:02d}.ru")
+            project.created_at = datetime(2024, 1, 1) + timedelta(days=n)
+            first = project.groups[0].keywords
+            for keyword in first[:n % 6]:
+                session_db.add(KeywordState(keyword_id=keyword.id, position=3, checked_at=datetime.utcnow()))
+            if n < 10:
+                manager.projects.append(project)
+        session_db.commit()
+        users = {
+            "admin": User(id=0, username="admin", hashed_password="x", role=UserRole.admin),
+            "manager": User(id=manager.id, username="manager", hashed_password="x", role=UserRole.manager),
+        }
+
+    def as_user(role):
+        app.dependency_overrides[get_current_user] = lambda: users[role]
+
+    yield client, as_user
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+async def _pages(client, engine, **params):
+    """Проходит все страницы; возвращает элементы и число SQL-запросов на каждую страницу."""
+    items, counts, cursor = [], [], None
+    while True:
+        with StatementCounter(engine) as counter:
+            response = await client.get("/api/projects/summary",
+                                        params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        counts.append(counter.count)
+        page = response.json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items, counts
+
+
+async def test_summary_is_one_statement_per_page(summary_client, db):
+    client, as_user = summary_client
+    as_user("admin")
+
+    items, counts = await _pages(client, db, limit=7, sort="created_at", order="asc")
+
+    assert counts == [1] * 5
+    assert [item["domain"] for item in items] == [f"site{n:02d}.ru" for n in range(30)]
+    assert [item["active_keywords"] for item in items] == [10] * 30
+    assert [item["top10_share"] for item in items[:6]] == [0, 0.1, 0.2, 0.3, 0.4, 0.5]
+    assert items[0]["last_checked"] is None and items[1]["last_checked"] is not None
+
+
+async def test_summary_for_manager_and_search(summary_client, db):
+    client, as_user = summary_client
+    as_user("manager")
+
+    items, counts = await _pages(client, db, limit=50)
+    assert counts == [1]
+    assert sorted(item["domain"] for item in items) == [f"site{n:02d}.ru" for n in range(10)]
+
+    as_user("admin")
+    items, counts = await _pages(client, db, limit=50, q="te2")
+    assert counts == [1]
+    assert sorted(item["domain"] for item in items) == [f"site{n}.ru" for n in range(20, 30)]
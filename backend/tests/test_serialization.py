@@ -0,0 +1,56 @@
+import gzip
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from typing import List
+
+import brotli
+import pytest
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from database.models import TrendEnum
+from routers.schemas import KeywordOut
+
+
+def _keywords(count: int):
+    checked_at = datetime(2024, 5, 1, 9, 30)
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(), group_id=uuid.uuid4(), keyword=f"купить пластиковые окна {n}", priority=n % 7 == 0,
+            price_top_1_3=300, price_top_4_5=200, price_top_6_10=100, is_check=True,
+            currentPosition=n % 30 + 1, previousPosition=n % 30 + 2, lastChecked=checked_at,
+            cost=300, trend=TrendEnum.up,
+        )
+        for n in range(count)
+    ]
+
+
+def _best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@pytest.mark.benchmark
+def test_keywords_serialization_10k():
+    adapter = TypeAdapter(List[KeywordOut])
+    keywords = _keywords(10_000)
+    # То же, что FastAPI делает с response_model до вызова класса ответа
+    models = adapter.validate_python(keywords)
+    content = adapter.dump_python(models, mode="json")
+
+    validate = _best_of(lambda: adapter.dump_python(adapter.validate_python(keywords), mode="json"))
+    stdlib = _best_of(lambda: JSONResponse(content))
+    fast = _best_of(lambda: ORJSONResponse(content))
+    body = ORJSONResponse(content).body
+
+    # brotli-asgi по умолчанию сжимает с quality=4
+    print(f"\n10k KeywordOut: validate+dump {validate * 1000:.1f}ms, render json {stdlib * 1000:.1f}ms, "
+          f"orjson {fast * 1000:.1f}ms; body {len(body)} bytes, gzip {len(gzip.compress(body, 6))}, "
+          f"brotli {len(brotli.compress(body, quality=4))}")
+    assert fast < stdlib
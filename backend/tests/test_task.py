@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from database.db_init import SyncSessionLocal
+from database.models import KeywordDailyStat, KeywordIntervalStat, Position, Project
+from services import task
+from tests.conftest import seed_project
+
+
+async def test_parse_and_save_position_updates_rollups_and_version(db, monkeypatch):
+    positions = iter([2, 8])
+
+    async def find_position(*args, **kwargs):
+        return next(positions)
+
+    monkeypatch.setattr(task, "find_position_async", find_position)
+
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, keywords=1)
+        keyword = project.groups[0].keywords[0]
+        version = project.version
+
+        # Повторное снятие в тот же день заменяет вклад первого в сводки
+        for _ in range(2):
+            assert await task.parse_and_save_position_async(session_db, None, project, keyword, None)
+
+        session_db.expire_all()
+        today = datetime.utcnow().date()
+        daily = session_db.execute(select(KeywordDailyStat)).scalars().all()
+        interval = session_db.execute(select(KeywordIntervalStat)).scalar_one()
+        history = session_db.execute(select(Position.position).order_by(Position.checked_at)).scalars().all()
+
+        assert [(row.day, row.bucket, row.cost) for row in daily] == [(today, 10, 100)]
+        assert (interval.days_top3, interval.days_top10, interval.cost) == (0, 1, 100)
+        assert history == [2, 8]
+        assert keyword.state.position == 8 and keyword.state.previous_position is None
+        assert session_db.get(Project, project.id).version == version + 2
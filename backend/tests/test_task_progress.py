@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+from routers import task_status_router
+from services import task_progress
+
+
+def _event(phase: str) -> bytes:
+    return json.dumps({"task_id": "t1", "phase": phase}).encode()
+
+
+class FakePubSub:
+    """Подписка как в redis.asyncio: подтверждение subscribe приходит первым сообщением listen()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channel = channel
+
+    async def listen(self):
+        await self.redis.confirm.wait()
+        self.redis.subscribed.append(self)
+        yield {"type": "subscribe", "channel": self.channel.encode(), "data": 1}
+        if self.redis.drop_subscription:
+            raise ConnectionError("connection lost")
+        while True:
+            yield {"type": "message", "channel": self.channel.encode(), "data": await self.messages.get()}
+
+    async def reset(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self, snapshots=()):
+        self.snapshots = list(snapshots)
+        self.subscribed = []
+        self.confirm = asyncio.Event()
+        self.drop_subscription = False
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def get(self, key):
+        # Последний снимок повторяется при следующих чтениях
+        return self.snapshots.pop(0) if len(self.snapshots) > 1 else (self.snapshots or [None])[0]
+
+    def publish(self, payload: bytes):
+        # Как в Redis: сообщение получают только уже подтверждённые подписки
+        for pubsub in self.subscribed:
+            pubsub.messages.put_nowait(payload)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(task_progress, "get_async_redis", lambda: redis)
+    monkeypatch.setattr(task_progress, "_broadcaster", None)
+    return redis
+
+
+async def test_subscribe_returns_after_confirmation(fake_redis):
+    broadcaster = task_progress.ProgressBroadcaster()
+    subscribing = asyncio.create_task(broadcaster.subscribe("t1"))
+    await asyncio.sleep(0.01)
+    assert not subscribing.done()
+
+    fake_redis.confirm.set()
+    queue = await asyncio.wait_for(subscribing, timeout=1)
+    # Событие сразу после возврата subscribe уже не теряется
+    fake_redis.publish(_event("completed"))
+    assert await asyncio.wait_for(queue.get(), timeout=1) == _event("completed")
+
+    broadcaster.unsubscribe("t1", queue)
+    assert not broadcaster._listeners and not broadcaster._ready
+
+
+async def test_stream_closes_on_terminal_snapshot_after_lost_subscription(fake_redis, monkeypatch):
+    from httpx import ASGITransport, AsyncClient
+
+    from main import app
+
+    monkeypatch.setattr(task_status_router, "SSE_HEARTBEAT_SECONDS", 0.05)
+    fake_redis.snapshots = [_event("fetching"), _event("completed")]
+    fake_redis.confirm.set()
+    # Подписка обрывается сразу после подтверждения: завершение видно только по снимку
+    fake_redis.drop_subscription = True
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as http_client:
+        response = await asyncio.wait_for(http_client.get("/api/task-status/t1/stream"), timeout=5)
+
+    assert response.status_code == 200
+    events = [line[len("data: "):] for line in response.text.split("\n\n") if line.startswith("data: ")]
+    assert [json.loads(event)["phase"] for event in events] == ["fetching", "completed"]
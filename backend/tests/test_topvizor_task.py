@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.db_init import SyncSessionLocal
+from services import topvizor_task
+from services.check_planner import build_check_plan_sync
+from tests.conftest import seed_project
+
+
+@pytest.fixture
+def task_calls(monkeypatch):
+    """Вызовы Topvisor и ожидания main_task по порядку; позиций нет, запуск проверки не удаётся."""
+    calls = []
+
+    def get_positions(topvisor_id, *args, **kwargs):
+        calls.append(("check", topvisor_id))
+        return None
+
+    monkeypatch.setattr(topvizor_task, "get_positions_topvisor", get_positions)
+    monkeypatch.setattr(topvizor_task, "start_topvisor_position_check", lambda topvisor_id: None)
+    monkeypatch.setattr(topvizor_task.time, "sleep", lambda seconds: calls.append(("sleep", seconds)))
+    return calls
+
+
+async def test_main_task_follows_plan_order_and_start_times(db, task_calls):
+    with SyncSessionLocal() as session_db:
+        first = seed_project(session_db, groups=2, keywords=2, domain="a.com")
+        second = seed_project(session_db, groups=1, keywords=3, domain="b.com")
+        for topvisor_id, group in enumerate(first.groups + second.groups, start=1):
+            group.topvisor_id = topvisor_id
+        # Группа с приоритетным ключом идёт первой, хотя её проект обрабатывался бы последним
+        second.groups[0].keywords[0].priority = True
+        session_db.commit()
+
+        plan = build_check_plan_sync(session_db)
+        items = plan["items"]
+        assert [item["topvisor_id"] for item in items] == [3, 1, 2]
+
+        now = datetime.utcnow()
+        for item, delay in zip(items, (-60, 120, 240)):
+            item["planned_start"] = (now + timedelta(seconds=delay)).isoformat()
+
+        stats = {}
+        success, _ = topvizor_task.main_task([first.id, second.id], session_db, plan_items=items, stats=stats)
+
+    assert success
+    assert [call[0] for call in task_calls] == ["check", "sleep", "check", "sleep", "check"]
+    assert [call[1] for call in task_calls if call[0] == "check"] == [3, 1, 2]
+    sleeps = [call[1] for call in task_calls if call[0] == "sleep"]
+    assert sleeps[0] == pytest.approx(120, abs=5)
+    assert sleeps[1] == pytest.approx(240, abs=5)
+    # Ожидание старта не попадает в замер, по которому планировщик оценивает задержку на ключ
+    assert stats["groups"] == 3 and stats["seconds"] < 60
+
+
+async def test_main_task_without_plan_checks_all_groups_at_once(db, task_calls):
+    with SyncSessionLocal() as session_db:
+        project = seed_project(session_db, groups=2, keywords=1)
+        for topvisor_id, group in enumerate(project.groups, start=1):
+            group.topvisor_id = topvisor_id
+        session_db.commit()
+
+        topvizor_task.main_task([project.id], session_db)
+
+    assert sorted(task_calls) == [("check", 1), ("check", 2)]